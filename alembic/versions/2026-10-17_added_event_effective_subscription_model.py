@@ -0,0 +1,118 @@
+"""added event effective subscription model
+
+Revision ID: f10fb07dc9bd
+Revises: 4311f4c7d7ba
+Create Date: 2026-10-17 06:59:37.635754
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f10fb07dc9bd'
+down_revision = '4311f4c7d7ba'
+branch_labels = None
+depends_on = None
+
+SYNC_EVENT_SUBSCRIPTION_FUNCTION = """
+CREATE OR REPLACE FUNCTION sync_effective_subscriptions_on_event_subscription() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM eventeffectivesubscription
+        WHERE event_uuid = OLD.event_uuid AND user_id = OLD.user_id AND source = 'event';
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO eventeffectivesubscription (event_uuid, user_id, source)
+        VALUES (NEW.event_uuid, NEW.user_id, 'event')
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+SYNC_GOV_STRUCTURE_SUBSCRIPTION_FUNCTION = """
+CREATE OR REPLACE FUNCTION sync_effective_subscriptions_on_gov_structure_subscription() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM eventeffectivesubscription
+        USING event
+        WHERE eventeffectivesubscription.event_uuid = event.uuid
+            AND event.gov_structure_uuid = OLD.gov_structure_uuid
+            AND eventeffectivesubscription.user_id = OLD.user_id
+            AND eventeffectivesubscription.source = 'gov_structure';
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO eventeffectivesubscription (event_uuid, user_id, source)
+        SELECT event.uuid, NEW.user_id, 'gov_structure' FROM event
+        WHERE event.gov_structure_uuid = NEW.gov_structure_uuid
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+SYNC_EVENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION sync_effective_subscriptions_on_event() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM eventeffectivesubscription
+        WHERE event_uuid = OLD.uuid AND source = 'gov_structure';
+    END IF;
+    INSERT INTO eventeffectivesubscription (event_uuid, user_id, source)
+    SELECT NEW.uuid, govstructuresubscription.user_id, 'gov_structure' FROM govstructuresubscription
+    WHERE govstructuresubscription.gov_structure_uuid = NEW.gov_structure_uuid
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('eventeffectivesubscription',
+    sa.Column('event_uuid', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['event_uuid'], ['event.uuid'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('event_uuid', 'user_id', 'source')
+    )
+    op.create_index(op.f('ix_event_gov_structure_uuid'), 'event', ['gov_structure_uuid'], unique=False)
+    # ### end Alembic commands ###
+
+    op.execute(SYNC_EVENT_SUBSCRIPTION_FUNCTION)
+    op.execute('CREATE TRIGGER sync_effective_subscriptions AFTER INSERT OR UPDATE OR DELETE ON eventsubscription '
+               'FOR EACH ROW EXECUTE FUNCTION sync_effective_subscriptions_on_event_subscription()')
+    op.execute(SYNC_GOV_STRUCTURE_SUBSCRIPTION_FUNCTION)
+    op.execute('CREATE TRIGGER sync_effective_subscriptions AFTER INSERT OR UPDATE OR DELETE '
+               'ON govstructuresubscription '
+               'FOR EACH ROW EXECUTE FUNCTION sync_effective_subscriptions_on_gov_structure_subscription()')
+    op.execute(SYNC_EVENT_FUNCTION)
+    op.execute('CREATE TRIGGER sync_effective_subscriptions AFTER INSERT OR UPDATE OF gov_structure_uuid ON event '
+               'FOR EACH ROW EXECUTE FUNCTION sync_effective_subscriptions_on_event()')
+
+    op.execute("INSERT INTO eventeffectivesubscription (event_uuid, user_id, source) "
+               "SELECT event_uuid, user_id, 'event' FROM eventsubscription")
+    op.execute("INSERT INTO eventeffectivesubscription (event_uuid, user_id, source) "
+               "SELECT event.uuid, govstructuresubscription.user_id, 'gov_structure' FROM event "
+               "JOIN govstructuresubscription ON govstructuresubscription.gov_structure_uuid = event.gov_structure_uuid")
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER sync_effective_subscriptions ON event')
+    op.execute('DROP FUNCTION sync_effective_subscriptions_on_event()')
+    op.execute('DROP TRIGGER sync_effective_subscriptions ON govstructuresubscription')
+    op.execute('DROP FUNCTION sync_effective_subscriptions_on_gov_structure_subscription()')
+    op.execute('DROP TRIGGER sync_effective_subscriptions ON eventsubscription')
+    op.execute('DROP FUNCTION sync_effective_subscriptions_on_event_subscription()')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index(op.f('ix_event_gov_structure_uuid'), table_name='event')
+    op.drop_table('eventeffectivesubscription')
+    # ### end Alembic commands ###
@@ -0,0 +1,181 @@
+"""
+The benchmark of sending notifications about one event to many subscribers
+
+The users are seeded into the database defined by the environment variables of the project
+and removed after the run. Messages are sent to the in-process stand-in of the SMTP relay,
+so the benchmark shows whether the fan-out is limited by SMTP or by the database.
+
+Usage:
+    python -m benchmarks.notifications --users 100000 --latency 0.05 --error-rate 0.01 --rate 500 --burst 1000
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import resource
+import statistics
+import time
+import uuid as uuid_pkg
+from email.message import Message
+from typing import Any, Sequence
+from unittest.mock import patch
+
+import aiosmtplib
+from sqlalchemy import insert, delete
+
+from src import database, smtp_, config
+from src.database import db_start_up, db_shut_down
+from src.events.models import Event, EventSubscription
+from src.gov_structures.models import GovStructure, GovStructureSubscription
+from src.notifications.email_messages import FiveHoursBeforeEmailMessage
+from src.notifications.tasks import EmailNotificationsSender
+from src.service import send_email
+from src.smtp_ import SMTPConnectionPool, smtp_shut_down
+from src.users.models import User
+
+INSERT_BATCH_SIZE = 5000
+
+
+class SMTPStandIn:
+    """The class that imitates the client of the SMTP relay with the given latency and error rate"""
+
+    latency = 0.0
+    error_rate = 0.0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.is_connected = False
+
+    async def connect(self) -> None:
+        await asyncio.sleep(self.latency)
+        self.is_connected = True
+
+    async def login(self, *args: Any) -> None:
+        await asyncio.sleep(self.latency)
+
+    async def noop(self) -> None:
+        await asyncio.sleep(self.latency)
+
+    async def quit(self) -> None:
+        self.is_connected = False
+
+    def close(self) -> None:
+        self.is_connected = False
+
+    async def send_message(self, message: Message, recipients: Sequence[str] | None = None) -> None:
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise aiosmtplib.SMTPResponseException(451, 'temporary failure')
+
+
+class LatencyRecorder:
+    """The class that measures the time of sending each message"""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+
+    async def send_email(self, message: Message) -> None:
+        start = time.perf_counter()
+        try:
+            await send_email(message)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+async def seed(users_count: int, first_user_id: int) -> Event:
+    """
+    The function that creates the event and the users subscribed to it
+
+    Every second user is subscribed to the event, every third one to its government structure,
+    so some users are subscribed in both ways
+    """
+
+    gov_structure_uuid = uuid_pkg.uuid4()
+    event = Event(uuid=uuid_pkg.uuid4(), name='benchmark', gov_structure_uuid=gov_structure_uuid,
+                  datetime=datetime.datetime.now() + datetime.timedelta(hours=5))
+
+    async with database.Session() as session, session.begin():
+        await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='benchmark',
+                                                          email='benchmark@example.com'))
+        await session.execute(insert(Event).values(uuid=event.uuid, name=event.name,
+                                                   gov_structure_uuid=gov_structure_uuid, datetime=event.datetime))
+
+        for batch_start in range(first_user_id, first_user_id + users_count, INSERT_BATCH_SIZE):
+            ids = range(batch_start, min(batch_start + INSERT_BATCH_SIZE, first_user_id + users_count))
+            await session.execute(insert(User), [{'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                  'patronymic': 'Отчество', 'email': f'user{id_}@example.com',
+                                                  'password': 'Password123'} for id_ in ids])
+            event_subs = [{'event_uuid': event.uuid, 'user_id': id_} for id_ in ids if id_ % 2 == 0]
+            gov_structure_subs = [{'gov_structure_uuid': gov_structure_uuid, 'user_id': id_}
+                                  for id_ in ids if id_ % 2 != 0 or id_ % 3 == 0]
+            if event_subs:
+                await session.execute(insert(EventSubscription), event_subs)
+            if gov_structure_subs:
+                await session.execute(insert(GovStructureSubscription), gov_structure_subs)
+
+    return event
+
+
+async def clean_up(event: Event, users_count: int, first_user_id: int) -> None:
+    """The function that removes the seeded data, subscriptions are removed by cascade"""
+
+    async with database.Session() as session, session.begin():
+        await session.execute(delete(Event).where(Event.uuid == event.uuid))
+        await session.execute(delete(GovStructure).where(GovStructure.uuid == event.gov_structure_uuid))
+        await session.execute(delete(User).where(User.id >= first_user_id,  # type: ignore
+                                                 User.id < first_user_id + users_count))  # type: ignore
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """The function that returns the given percentile of the values"""
+
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+async def run(arguments: argparse.Namespace) -> None:
+    """The function that seeds the data, sends notifications and reports the results"""
+
+    SMTPStandIn.latency = arguments.latency
+    SMTPStandIn.error_rate = arguments.error_rate
+    recorder = LatencyRecorder()
+
+    db_start_up()
+    with patch.object(config, 'SMTP_RATE', arguments.rate), patch.object(config, 'SMTP_BURST', arguments.burst):
+        smtp_.smtp_pool = SMTPConnectionPool([('benchmark', 25)], config.SMTP_POOL_SIZE)
+    event = await seed(arguments.users, arguments.first_user_id)
+    try:
+        with patch.object(smtp_.aiosmtplib, 'SMTP', SMTPStandIn), \
+                patch('src.notifications.tasks.send_email', recorder.send_email), \
+                patch('src.notifications.tasks.schedule_retry'):
+            start = time.perf_counter()
+            results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage)
+            duration = time.perf_counter() - start
+    finally:
+        await clean_up(event, arguments.users, arguments.first_user_id)
+        await smtp_shut_down()
+        await db_shut_down()
+
+    failed_count = sum(result.error is not None for result in results)
+    print(f'recipients:      {len(results)}')
+    print(f'failed:          {failed_count}')
+    print(f'duration:        {duration:.2f} s')
+    print(f'throughput:      {len(results) / duration:.1f} msgs/s')
+    print(f'send p50:        {percentile(recorder.latencies, 50) * 1000:.1f} ms')
+    print(f'send p99:        {percentile(recorder.latencies, 99) * 1000:.1f} ms')
+    print(f'peak RSS:        {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB')
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='The benchmark of sending notifications about one event')
+    parser.add_argument('--users', type=int, default=10000, help='number of seeded subscribers')
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds of each SMTP command')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of failed sends')
+    parser.add_argument('--rate', type=float, default=1_000_000, help='messages per second allowed by the relay')
+    parser.add_argument('--burst', type=int, default=1_000_000, help='messages allowed by the relay at once')
+    parser.add_argument('--first-user-id', type=int, default=10_000_000, help='id of the first seeded user')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_arguments()))
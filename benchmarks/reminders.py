@@ -0,0 +1,103 @@
+"""
+The benchmark of scheduling reminders about many upcoming events
+
+The events are seeded into the database defined by the environment variables of the project
+and removed after the run. Reminders are added to the separate timeline in redis,
+which is also removed after the run, so the benchmark doesn't affect scheduled reminders.
+
+Usage:
+    python -m benchmarks.reminders --events 50000
+"""
+import argparse
+import asyncio
+import datetime
+import time
+import uuid as uuid_pkg
+from unittest.mock import patch
+
+from sqlalchemy import insert, delete
+
+from src import database
+from src.database import db_start_up, db_shut_down
+from src.events.models import Event
+from src.gov_structures.models import GovStructure
+from src.notifications import config
+from src.notifications.celery_ import reconcile_reminders
+from src.notifications.timeline import RedisTimeline
+from src.redis_ import redis_engine
+
+INSERT_BATCH_SIZE = 5000
+TIMELINE_NAME = 'benchmark_reminders_timeline'
+RECONCILED_AT_NAME = 'benchmark_reminders_reconciled_at'
+
+
+async def seed(events_count: int) -> uuid_pkg.UUID:
+    """
+    The function that creates the government structure and the events that will occur
+    during the next month and returns the uuid of the government structure
+    """
+
+    gov_structure_uuid = uuid_pkg.uuid4()
+    now = datetime.datetime.now()
+
+    async with database.Session() as session, session.begin():
+        await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='benchmark',
+                                                          email='benchmark@example.com'))
+        for batch_start in range(0, events_count, INSERT_BATCH_SIZE):
+            numbers = range(batch_start, min(batch_start + INSERT_BATCH_SIZE, events_count))
+            await session.execute(insert(Event), [{'uuid': uuid_pkg.uuid4(), 'name': 'benchmark',
+                                                   'gov_structure_uuid': gov_structure_uuid,
+                                                   'datetime': now + datetime.timedelta(minutes=number % 43200 + 1)}
+                                                  for number in numbers])
+
+    return gov_structure_uuid
+
+
+async def clean_up(gov_structure_uuid: uuid_pkg.UUID, timeline: RedisTimeline) -> None:
+    """The function that removes the seeded data and the reminders about it"""
+
+    async with database.Session() as session, session.begin():
+        await session.execute(delete(Event).where(Event.gov_structure_uuid == gov_structure_uuid))
+        await session.execute(delete(GovStructure).where(GovStructure.uuid == gov_structure_uuid))
+
+    with redis_engine.pipeline(transaction=False) as pipeline:
+        for key in redis_engine.scan_iter(timeline.create_ledger_key('*'), count=10000):
+            pipeline.delete(key)
+        pipeline.delete(timeline.name, timeline.load_name, timeline.weights_name, RECONCILED_AT_NAME)
+        pipeline.execute()
+
+
+async def run(arguments: argparse.Namespace) -> None:
+    """The function that seeds the events, schedules reminders about them and reports the results"""
+
+    timeline = RedisTimeline(TIMELINE_NAME)
+
+    db_start_up()
+    gov_structure_uuid = await seed(arguments.events)
+    try:
+        with patch('src.notifications.service.reminders_timeline', timeline), \
+                patch.object(config, 'REMINDERS_RECONCILED_AT_NAME', RECONCILED_AT_NAME), \
+                patch.object(config, 'REMINDERS_SCHEDULING_BATCH_SIZE', arguments.batch_size):
+            start = time.perf_counter()
+            count = await reconcile_reminders(datetime.datetime.now())
+            duration = time.perf_counter() - start
+    finally:
+        await clean_up(gov_structure_uuid, timeline)
+        await db_shut_down()
+
+    print(f'events:          {arguments.events}')
+    print(f'reminders:       {count}')
+    print(f'duration:        {duration:.2f} s')
+    print(f'throughput:      {count / duration:.1f} reminders/s')
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='The benchmark of scheduling reminders about many events')
+    parser.add_argument('--events', type=int, default=10000, help='number of seeded upcoming events')
+    parser.add_argument('--batch-size', type=int, default=config.REMINDERS_SCHEDULING_BATCH_SIZE,
+                        help='events whose reminders are added to the timeline in one round trip')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_arguments()))
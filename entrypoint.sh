@@ -4,7 +4,10 @@ sleep 10
 
 alembic upgrade head
 
-celery -A src.notifications.celery_ worker --loglevel=INFO -B --pool=solo &
+celery -A src.notifications.celery_ worker --loglevel=INFO -B --pool=threads --concurrency=8 -Q celery &
+
+celery -A src.notifications.celery_ worker --loglevel=INFO --pool=threads --concurrency=4 \
+    -Q transactional -n transactional@%h &
 
 gunicorn src.main:app --workers 7 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:80
 
@@ -15,5 +15,13 @@ EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
 EMAIL_LOCAL_ADDRESS = os.getenv('EMAIL_LOCAL_ADDRESS')
 EMAIL_HOST = os.getenv('EMAIL_HOST')
 EMAIL_PORT = os.getenv('EMAIL_PORT')
+EMAIL_HOSTS = os.getenv('EMAIL_HOSTS')  # comma-separated 'host:port' relays, EMAIL_HOST and EMAIL_PORT by default
+
+SMTP_POOL_SIZE = 10
+SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+SMTP_HEALTH_CHECK_INTERVAL = 30  # seconds
+SMTP_RATE = float(os.getenv('SMTP_RATE', 20))  # sustained number of messages per second through one relay
+SMTP_BURST = int(os.getenv('SMTP_BURST', 100))  # number of messages that can be sent through one relay at once
+SMTP_RATE_LIMIT_NAME = 'smtp_rate_limit'
 
 TIMEZONE = 'Europe/Moscow'
@@ -2,7 +2,7 @@ import datetime as datetime_pkg
 import uuid as uuid_pkg
 
 from pydantic import BaseModel
-from sqlalchemy import Column, TEXT, ForeignKey, Integer
+from sqlalchemy import Column, TEXT, ForeignKey, Integer, Index, text, String, DateTime, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlmodel import SQLModel, Field, Relationship
 
@@ -23,7 +23,8 @@ class EventBaseWithGovStructureUUID(EventBase):
     """The model that represents basic event fields and the government structure uuid field"""
 
     gov_structure_uuid: uuid_pkg.UUID = Field(
-        sa_column=Column(UUID(as_uuid=True), ForeignKey('govstructure.uuid', ondelete='CASCADE'), nullable=False))
+        sa_column=Column(UUID(as_uuid=True), ForeignKey('govstructure.uuid', ondelete='CASCADE'), nullable=False,
+                         index=True))
 
 
 class EventBaseWithUUID(EventBase):
@@ -35,10 +36,18 @@ class EventBaseWithUUID(EventBase):
 class Event(EventBaseWithUUID, EventBaseWithGovStructureUUID, table=True):
     """The model that represents the event in the database"""
 
+    __table_args__ = (
+        Index('ix_event_datetime_is_active', 'datetime', postgresql_where=text('is_active')),
+    )
+
     gov_structure: GovStructure = Relationship(
         sa_relationship_kwargs={'primaryjoin': 'Event.gov_structure_uuid == GovStructure.uuid',
                                 'lazy': 'joined'})
     is_active: bool = True
+    updated_at: datetime_pkg.datetime = Field(
+        default_factory=datetime_pkg.datetime.now,
+        sa_column=Column(DateTime, nullable=False, index=True, server_default=func.now(),
+                         onupdate=datetime_pkg.datetime.now))
 
 
 class EventCreate(EventBaseWithGovStructureUUID):
@@ -72,3 +81,19 @@ class EventSubscription(SQLModel, table=True):
         sa_column=Column(UUID(as_uuid=True), ForeignKey('event.uuid', ondelete='CASCADE'), primary_key=True))
     user_id: int = Field(
         sa_column=Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True))
+
+
+class EventEffectiveSubscription(SQLModel, table=True):
+    """
+    The model that represents the fact that the user is notified of the event in the database
+
+    The user is subscribed either to the event itself or to the government structure that hosts it,
+    which is shown by the source. The rows are maintained by the triggers of the database
+    on subscriptions and events, so the subscribers to the event are received by one index range scan
+    """
+
+    event_uuid: uuid_pkg.UUID = Field(
+        sa_column=Column(UUID(as_uuid=True), ForeignKey('event.uuid', ondelete='CASCADE'), primary_key=True))
+    user_id: int = Field(
+        sa_column=Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True))
+    source: str = Field(sa_column=Column(String, primary_key=True))
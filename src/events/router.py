@@ -1,6 +1,10 @@
+import contextlib
+import datetime
+import logging
 import uuid as uuid_pkg
-from typing import Annotated
+from typing import Annotated, Iterator
 
+import redis  # type: ignore
 from asyncpg import ForeignKeyViolationError, UniqueViolationError
 from fastapi import APIRouter, status, Depends, HTTPException
 
@@ -10,22 +14,42 @@ from src.events.service import does_user_is_sub_to_event_by_sub_to_gov_structure
 from src.events.sfp import EventsSFP
 from src.gov_structures.models import GovStructure
 from src.notifications.celery_ import EmailNotificationsSender
-from src.notifications.email_messages import EventChangedEmailMessage, EventCanceledEmailMessage, \
-    HostingEventEmailMessage
+from src.notifications.email_messages import EventCanceledEmailMessage, HostingEventEmailMessage
+from src.notifications.payloads import dump_event
+from src.notifications.service import debounce_event_changes, schedule_reminders_for_event, \
+    cancel_reminders_for_event
 from src.service import create_model, receive_model, update_models, delete_models, receive_models_by_sfp_or_filter
 from src.sfp import UsersSFP
 from src.users.models import UserRead
 
+logger = logging.getLogger(__name__)
+
 events_router = APIRouter(
     prefix='/events',
     tags=['events']
 )
 
 
+@contextlib.contextmanager
+def logging_scheduling_errors(event_uuid: uuid_pkg.UUID) -> Iterator[None]:
+    """
+    The context manager that logs the errors of redis while scheduling notifications about the written event
+    instead of failing the request
+
+    The event is already written, so the missed reminders are scheduled by the reconciliation,
+    and the outdated ones aren't sent because the event is checked before sending
+    """
+
+    try:
+        yield
+    except redis.RedisError:
+        logger.exception('Failed to schedule notifications about the event %s', event_uuid)
+
+
 @events_router.post('/', status_code=status.HTTP_201_CREATED,
                     dependencies=[Depends(authorize_user(is_government_worker=True))])
 async def create_event(event_data: EventCreate) -> EventRead:
-    """The view that processes creation the event"""
+    """The view that processes creation the event and schedules reminders about it"""
 
     event = Event.from_orm(event_data)
 
@@ -37,6 +61,8 @@ async def create_event(event_data: EventCreate) -> EventRead:
                                      'msg': 'there is no government structure with such a uuid',
                                      'type': 'value_error'}])
 
+    with logging_scheduling_errors(event.uuid):
+        await schedule_reminders_for_event(event, datetime.datetime.now())
     event.gov_structure = await receive_model(GovStructure,  # type: ignore
                                               GovStructure.uuid == event.gov_structure_uuid)  # type: ignore
     return EventRead.from_orm(event)
@@ -62,7 +88,12 @@ async def receive_event(uuid: uuid_pkg.UUID) -> EventRead:
 
 @events_router.patch('/{uuid}/', dependencies=[Depends(authorize_user(is_government_worker=True))])
 async def update_event(uuid: uuid_pkg.UUID, event_changes: EventUpdate) -> EventRead:
-    """The view that processes updating the event"""
+    """
+    The view that processes updating the event
+
+    Subscribers are notified about the changes of the address or datetime
+    once the event hasn't been changed for a while. Reminders are moved to the new datetime
+    """
 
     event_without_changes = await receive_model(Event, Event.uuid == uuid)  # type: ignore
     if event_without_changes is None:
@@ -75,10 +106,13 @@ async def update_event(uuid: uuid_pkg.UUID, event_changes: EventUpdate) -> Event
     event_with_changes.gov_structure = event_without_changes.gov_structure
 
     event_changes_dict = {k: v for k, v in event_changes_dict.items() if getattr(event_without_changes, k) != v}
-    if 'address' in event_changes_dict or 'datetime' in event_changes_dict:
-        EmailNotificationsSender.apply_async(
-            args=(event_without_changes.json(), EventChangedEmailMessage.__name__),
-            kwargs={'is_json': True, 'event_changes': event_changes_dict})
+    with logging_scheduling_errors(uuid):
+        if 'address' in event_changes_dict or 'datetime' in event_changes_dict:
+            debounce_event_changes(event_without_changes)
+
+        if 'datetime' in event_changes_dict and event_without_changes.is_active:
+            cancel_reminders_for_event(event_without_changes)
+            await schedule_reminders_for_event(event_with_changes, datetime.datetime.now())
 
     return EventRead.from_orm(event_with_changes)
 
@@ -86,22 +120,27 @@ async def update_event(uuid: uuid_pkg.UUID, event_changes: EventUpdate) -> Event
 @events_router.post('/{uuid}/activity-change/', status_code=status.HTTP_204_NO_CONTENT,
                     dependencies=[Depends(authorize_user(is_government_worker=True))])
 async def change_event_activity(uuid: uuid_pkg.UUID, activity_changing: EventActivityChangeScheme) -> None:
-    """The view that processes the event activity change"""
+    """The view that processes the event activity change and cancels or schedules reminders about it"""
 
     event = await receive_model(Event, Event.uuid == uuid)  # type: ignore
     if event is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     if event.is_active and not activity_changing.is_active:
-        EmailNotificationsSender.apply_async(args=(event.json(), EventCanceledEmailMessage.__name__,),
-                                             kwargs={'is_json': True})
+        EmailNotificationsSender.apply_async(args=(dump_event(event), EventCanceledEmailMessage.__name__))
 
     elif not event.is_active and activity_changing.is_active:
-        EmailNotificationsSender.apply_async(args=(event.json(), HostingEventEmailMessage.__name__,),
-                                             kwargs={'is_json': True})
+        EmailNotificationsSender.apply_async(args=(dump_event(event), HostingEventEmailMessage.__name__))
+
+    if event.is_active == activity_changing.is_active:
+        return
 
-    if event.is_active != activity_changing.is_active:
-        await update_models(Event, activity_changing, Event.uuid == uuid)  # type: ignore
+    await update_models(Event, activity_changing, Event.uuid == uuid)  # type: ignore
+    with logging_scheduling_errors(uuid):
+        if activity_changing.is_active:
+            await schedule_reminders_for_event(event, datetime.datetime.now())
+        else:
+            cancel_reminders_for_event(event)
 
 
 @events_router.delete('/{uuid}/', status_code=status.HTTP_204_NO_CONTENT,
@@ -157,5 +196,5 @@ async def receive_subscribers_to_event(uuid: uuid_pkg.UUID,
     if event is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    users = await receive_subs_to_event_from_db(uuid, event.gov_structure_uuid, users_sfp)
+    users = await receive_subs_to_event_from_db(uuid, users_sfp)
     return [UserRead.from_orm(user) for user in users]
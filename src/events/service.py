@@ -1,10 +1,13 @@
+import datetime
 import uuid as uuid_pkg
 
-from sqlalchemy import select, union
+from sqlalchemy import select, func, distinct, Column
 from sqlalchemy.orm import noload
-from sqlalchemy.sql import CompoundSelect
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.selectable import ScalarSelect
+from sqlalchemy.sql.elements import BinaryExpression
 
-from src.events.models import Event, EventSubscription
+from src.events.models import Event, EventEffectiveSubscription
 from src.gov_structures.models import GovStructureSubscription
 from src.service import execute_db_query
 from src.sfp import SortingFilteringPaging
@@ -33,37 +36,109 @@ async def does_user_is_sub_to_event_by_sub_to_gov_structure(event_uuid: uuid_pkg
     return gov_structure_sub is not None
 
 
-def create_receiving_subs_to_event_union_query_from_db(event_uuid: uuid_pkg.UUID,
-                                                       gov_structure_uuid: uuid_pkg.UUID) -> CompoundSelect:
+def create_receiving_subs_to_event_query_from_db(event_uuid: uuid_pkg.UUID,
+                                                 *conditions: BinaryExpression) -> Select:
     """
     The function that returns the request to receive users who are subscribed to the event,
     including those who are subscribed to the government structure that hosts this event
+
+    The subscribers are received from the effective subscriptions by the range of its primary key,
+    and the users subscribed in both ways are received once
     """
 
-    event_subs_query = select(User) \
-        .join(EventSubscription, EventSubscription.user_id == User.id) \
-        .where(EventSubscription.event_uuid == event_uuid)
+    subs_ids_query = select(EventEffectiveSubscription.user_id) \
+        .where(EventEffectiveSubscription.event_uuid == event_uuid)
+
+    return select(User).where(User.id.in_(subs_ids_query), *conditions)  # type: ignore
 
-    gov_structure_subs_query = select(User) \
-        .join(GovStructureSubscription, GovStructureSubscription.user_id == User.id) \
-        .where(GovStructureSubscription.gov_structure_uuid == gov_structure_uuid)
 
-    return union(event_subs_query, gov_structure_subs_query)
+def create_receiving_subs_to_event_recipients_query_from_db(event_uuid: uuid_pkg.UUID,
+                                                            *conditions: BinaryExpression) -> Select:
+    """
+    The function that returns the request to receive only the id, email, first name and patronymic
+    of the users who are subscribed to the event in the order of their ids
+
+    The rows of this request aren't tracked by the session, so they are cheap to stream to the senders,
+    and the order allows to resume streaming after the id of the last processed user
+    """
+
+    return create_receiving_subs_to_event_query_from_db(event_uuid, *conditions) \
+        .with_only_columns(User.id, User.email, User.first_name, User.patronymic) \
+        .order_by(User.id)
+
+
+def create_counting_subs_to_event_query_from_db(event_uuid: uuid_pkg.UUID | Column) -> ScalarSelect:
+    """
+    The function that returns the request to count the users who are subscribed to the event,
+    including those who are subscribed to the government structure that hosts this event
+
+    The uuid of the event may be given by the column of the outer request, then the count is received for each row
+    """
+
+    return select(func.count(distinct(EventEffectiveSubscription.user_id))) \
+        .where(EventEffectiveSubscription.event_uuid == event_uuid) \
+        .scalar_subquery()
+
+
+async def receive_subs_to_event_count_from_db(event_uuid: uuid_pkg.UUID) -> int:
+    """The function that returns the number of users who are subscribed to the event"""
+
+    query = select(create_counting_subs_to_event_query_from_db(event_uuid))
+    return (await execute_db_query(query)).scalar()  # type: ignore
+
+
+async def receive_subs_to_event_ids_boundaries_from_db(event_uuid: uuid_pkg.UUID, chunk_size: int) -> list[int]:
+    """
+    The function that splits the subscribers to the event into chunks of the given size
+    and returns the ids of the first subscribers of the chunks in ascending order
+
+    The chunk is the range of ids from its boundary to the boundary of the next chunk
+    """
+
+    subs_ids_query = select(EventEffectiveSubscription.user_id) \
+        .where(EventEffectiveSubscription.event_uuid == event_uuid) \
+        .distinct() \
+        .subquery()
+    numbered_subs_query = select(subs_ids_query.c.user_id,
+                                 func.row_number().over(order_by=subs_ids_query.c.user_id).label('number')).subquery()
+    query = select(numbered_subs_query.c.user_id) \
+        .where((numbered_subs_query.c.number - 1) % chunk_size == 0) \
+        .order_by(numbered_subs_query.c.user_id)
+
+    return (await execute_db_query(query)).scalars().fetchall()
 
 
 async def receive_subs_to_event_from_db(event_uuid: uuid_pkg.UUID,
-                                        gov_structure_uuid: uuid_pkg.UUID,
                                         users_sfp: SortingFilteringPaging | None = None) -> list[UserRead]:
     """
     The function that returns the list of all users who are subscribed to the event,
     including those who are subscribed to the government structure that hosts this event
+
+    The users with the same values of the sorting fields are sorted by their ids, so the pages don't overlap
     """
 
-    query = create_receiving_subs_to_event_union_query_from_db(event_uuid, gov_structure_uuid)
+    query = create_receiving_subs_to_event_query_from_db(event_uuid)
 
     if users_sfp is not None:
         query = users_sfp.paginate(query)
-        query = users_sfp.sort(users_sfp.filter(query))  # type: ignore
+        query = users_sfp.sort(users_sfp.filter(query)).order_by(User.id)
 
-    query = select(User).from_statement(query)
     return (await execute_db_query(query)).scalars().fetchall()
+
+
+async def receive_event_for_notifications_from_db(uuid: uuid_pkg.UUID) -> Event | None:
+    """
+    The function that returns the event with only the fields that are needed to notify about it,
+    without the description and the government structure
+    """
+
+    query = select(Event.uuid, Event.name, Event.datetime, Event.address, Event.is_active, Event.updated_at) \
+        .where(Event.uuid == uuid)
+    row = (await execute_db_query(query)).first()
+    return None if row is None else Event(**row._asdict())
+
+
+async def receive_event_version_from_db(uuid: uuid_pkg.UUID) -> datetime.datetime | None:
+    """The function that returns the time of the last update of the event, which is its version"""
+
+    return (await execute_db_query(select(Event.updated_at).where(Event.uuid == uuid))).scalar()
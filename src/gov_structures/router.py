@@ -2,15 +2,16 @@ import uuid as uuid_pkg
 from typing import Annotated
 
 from asyncpg import UniqueViolationError, ForeignKeyViolationError
-from fastapi import APIRouter, Depends, HTTPException, status, Body, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Body
 
 from src.dependencies import authorize_user
 from src.gov_structures.email_messages import ConfirmGovStructureEmailEmailMessage
 from src.gov_structures.models import GovStructure, GovStructureCreate, GovStructureUpdate, GovStructureSubscription
 from src.gov_structures.service import receive_subs_to_gov_structure_from_db
 from src.gov_structures.sfp import GovStructureSFP
+from src.notifications.celery_ import TransactionalEmailSender
 from src.service import create_model, receive_model, delete_models, update_models, receive_models_by_sfp_or_filter, \
-    receive_unconfirmed_email_data, set_unconfirmed_email_data, send_email, delete_unconfirmed_email_data
+    receive_unconfirmed_email_data, set_unconfirmed_email_data, delete_unconfirmed_email_data
 from src.sfp import UsersSFP
 from src.users.models import UserRead
 
@@ -22,8 +23,7 @@ gov_structures_router = APIRouter(
 
 @gov_structures_router.post('/', status_code=status.HTTP_204_NO_CONTENT,
                             dependencies=[Depends(authorize_user(is_government_worker=True))])
-async def create_gov_structure(gov_structure_data: GovStructureCreate,
-                               background_task: BackgroundTasks) -> None:
+async def create_gov_structure(gov_structure_data: GovStructureCreate) -> None:
     """
     The view that processes creation the government structure
 
@@ -34,7 +34,8 @@ async def create_gov_structure(gov_structure_data: GovStructureCreate,
 
     confirmation_uuid = uuid_pkg.uuid4()
     set_unconfirmed_email_data(confirmation_uuid, gov_structure)
-    background_task.add_task(send_email, ConfirmGovStructureEmailEmailMessage(gov_structure, confirmation_uuid))
+    message = ConfirmGovStructureEmailEmailMessage(gov_structure, confirmation_uuid)
+    TransactionalEmailSender.apply_async(args=(message.create().as_string(),))
 
 
 @gov_structures_router.get('/', dependencies=[Depends(authorize_user())])
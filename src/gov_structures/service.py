@@ -10,14 +10,18 @@ from src.users.models import User
 
 async def receive_subs_to_gov_structure_from_db(gov_structure_uuid: uuid_pkg.UUID,
                                                 users_sfp: SortingFilteringPaging | None = None) -> list[User]:
-    """The function that executes the query to get subscribers to the government structure"""
+    """
+    The function that executes the query to get subscribers to the government structure
+
+    The users with the same values of the sorting fields are sorted by their ids, so the pages don't overlap
+    """
 
     query = select(User) \
         .join(GovStructureSubscription, GovStructureSubscription.user_id == User.id) \
         .where(GovStructureSubscription.gov_structure_uuid == gov_structure_uuid)
 
     if users_sfp is not None:
-        query = users_sfp.sort(users_sfp.filter(query))
+        query = users_sfp.sort(users_sfp.filter(query)).order_by(User.id)
         query = users_sfp.paginate(query)
 
     return (await execute_db_query(query)).scalars().fetchall()
@@ -0,0 +1,34 @@
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+emails_sent = Counter('emails_sent', 'Number of emails passed to the SMTP relay', ['status'])
+smtp_send_duration = Histogram('smtp_send_duration_seconds', 'Time of sending one email to the SMTP relay',
+                               buckets=LATENCY_BUCKETS)
+smtp_rate_limit_tokens = Gauge('smtp_rate_limit_tokens',
+                               'Number of tokens left in the bucket of the SMTP relay, negative if messages wait',
+                               ['relay'])
+
+notifications_sent = Counter('notifications_sent', 'Number of sent notifications about the events',
+                             ['message_class', 'status'])
+notifications_fan_out_duration = Histogram('notifications_fan_out_duration_seconds',
+                                           'Time of sending notifications about the event to all subscribers',
+                                           ['message_class'], buckets=DURATION_BUCKETS)
+notifications_lag = Histogram('notifications_lag_seconds',
+                              'Time between the planned and the actual start of sending notifications',
+                              ['message_class'], buckets=DURATION_BUCKETS)
+notifications_retries = Counter('notifications_retries',
+                                'Number of scheduled, sent, outdated and dead retries of failed notifications',
+                                ['status'])
+
+reminders_scheduled = Counter('reminders_scheduled', 'Number of scheduled reminders', ['message_class'])
+reminders_scheduling_duration = Histogram('reminders_scheduling_duration_seconds',
+                                          'Time of scheduling reminders for all upcoming events',
+                                          buckets=DURATION_BUCKETS)
+
+
+def metrics_start_up(port: int) -> None:
+    """The function that starts exposing the metrics of the process in the Prometheus text format"""
+
+    start_http_server(port)
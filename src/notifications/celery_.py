@@ -1,76 +1,196 @@
-import asyncio
 import datetime
 from typing import Any
 
+import redis  # type: ignore
 from celery import Celery
+from celery.beat import PersistentScheduler, ScheduleEntry
 from celery.schedules import crontab
 from celery.signals import worker_shutdown, worker_init
+from celery.utils.log import get_task_logger
 
 import src.config
+from src.metrics import metrics_start_up
 from src.database import db_start_up, db_shut_down
+from src.smtp_ import smtp_start_up, smtp_shut_down
 from src.notifications import tasks, config
-from src.notifications.email_messages import FiveHoursBeforeEmailMessage, OneWeekBeforeEmailMessage, \
-    OneDayBeforeEmailMessage
-from src.notifications.service import receive_events_that_in_few_days_time, receive_events_for_this_and_next_day, \
-    schedule_notifications_for_event
+from src.notifications.service import reconcile_reminders, dispatch_notifications, send_digests, flush_event_changes
+from src.notifications.lease import RedisLease
+from src.notifications.retries import retry_sending
+from src.notifications.utils import event_loop_thread
+from src.redis_ import redis_engine
 
-app = Celery(broker=config.BROKER_URL, include=['src.notifications.tasks'])
+logger = get_task_logger(__name__)
+
+app = Celery(broker=config.BROKER_URL, backend=config.RESULT_BACKEND_URL, include=['src.notifications.tasks'])
 
 app.conf.enable_utc = False
 app.conf.timezone = src.config.TIMEZONE
+app.conf.task_ignore_result = True
+app.conf.accept_content = ['json', config.TASK_SERIALIZER]
+app.conf.broker_transport_options = {'visibility_timeout': config.BROKER_VISIBILITY_TIMEOUT}
+app.conf.beat_scheduler = f'{__name__}:LeaderScheduler'
+app.conf.task_routes = {
+    f'{tasks.__name__}.{tasks.TransactionalEmailSender.__name__}': {'queue': config.TRANSACTIONAL_QUEUE}
+}
 
 
 @app.task
-def schedule_notifications() -> None:
-    """The main function of scheduling notifications"""
+def reconcile_notifications() -> None:
+    """
+    The function that schedules reminders about the events whose reminders haven't been scheduled on writing
+
+    The reminders are normally scheduled on writing, so the reminders caught up by the pass are reported
+    """
 
-    loop = asyncio.get_event_loop()
-    now = datetime.datetime.now()
+    count = event_loop_thread.run(reconcile_reminders(datetime.datetime.now()))
+    if count:
+        logger.warning('Scheduled %s reminders that had not been scheduled on writing of the events', count)
 
-    events_in_week = loop.run_until_complete(receive_events_that_in_few_days_time(7, now))
-    events_in_one_day = loop.run_until_complete(receive_events_that_in_few_days_time(1, now))
 
-    for event in events_in_week:
-        schedule_notifications_for_event(event, OneWeekBeforeEmailMessage, now, datetime.timedelta(days=7))
+@app.task
+def dispatch_due_notifications() -> None:
+    """The function that sends the scheduled notifications, whose time has come, to the workers"""
+
+    dispatch_notifications(datetime.datetime.now())
 
-    for event in events_in_one_day:
-        schedule_notifications_for_event(event, OneDayBeforeEmailMessage, now, datetime.timedelta(days=1))
-        schedule_notifications_for_event(event, FiveHoursBeforeEmailMessage, now, datetime.timedelta(hours=5))
+
+@app.task
+def notify_about_events_changes() -> None:
+    """The function that notifies about the changes of the events that haven't been changed for a while"""
+
+    event_loop_thread.run(flush_event_changes(datetime.datetime.now()))
+
+
+@app.task
+def retry_failed_notifications() -> None:
+    """The function that sends again the notifications whose time of the next attempt has come"""
+
+    event_loop_thread.run(retry_sending(datetime.datetime.now()))
+
+
+@app.task
+def send_digests_of_reminders() -> None:
+    """The function that sends the users with enabled digest reminders about their upcoming events in one email"""
+
+    results = event_loop_thread.run(send_digests(config.DIGESTS_DAYS_COUNTS, datetime.datetime.now()))
+    failed_results = [result for result in results if result.error is not None]
+    if failed_results:
+        logger.warning('Failed to send %s of %s digests', len(failed_results), len(results))
 
 
 @app.on_after_configure.connect
 def start_up(sender: Celery, **kwargs: Any) -> None:
-    """
-    The function that schedules notifications at application startup for events
-    that the main scheduling function won't process
-    """
+    """The function that processes the start of the celery app and registers the periodic tasks"""
 
     db_start_up()
-    sender.add_periodic_task(crontab(hour=0, minute=0), schedule_notifications.s())
+    smtp_start_up()
+    sender.add_periodic_task(config.REMINDERS_RECONCILIATION_INTERVAL, reconcile_notifications.s())
+    sender.add_periodic_task(config.TIMELINE_DISPATCH_INTERVAL, dispatch_due_notifications.s())
+    sender.add_periodic_task(config.TIMELINE_DISPATCH_INTERVAL, notify_about_events_changes.s())
+    sender.add_periodic_task(config.RETRIES_INTERVAL, retry_failed_notifications.s())
+    sender.add_periodic_task(crontab(hour=config.DIGESTS_HOUR, minute=0), send_digests_of_reminders.s())
+
+
+def is_transactional_worker(worker: Any) -> bool:
+    """The function that checks whether the worker consumes only the queue of the transactional emails"""
+
+    return set(worker.app.amqp.queues.consume_from or ()) == {config.TRANSACTIONAL_QUEUE}
 
 
 @worker_init.connect
-def schedule_notifications_on_start_up(**kwargs: Any) -> None:
-    """The function that schedules tasks when the application starts"""
+def start_up_worker(sender: Any, **kwargs: Any) -> None:
+    """
+    The function that starts the event loop in which the coroutines of all tasks of the worker are executed
+
+    The event loop is started before the metrics server, so the server never sees the worker without the loop.
+    With the threads pool the tasks overlap their I/O in this loop, the children of the prefork pool
+    restart the loop in their own process when they run the first task.
+    The metrics of notifications are exposed on the separate port only by the notifications worker,
+    the transactional worker only needs the loop to send emails through the pool of SMTP connections
+    """
+
+    event_loop_thread.start()
+    if not is_transactional_worker(sender):
+        metrics_start_up(config.METRICS_PORT)
 
-    loop = asyncio.get_event_loop()
-    now = datetime.datetime.now()
-    events = loop.run_until_complete(receive_events_for_this_and_next_day(now))
 
-    for event in events:
-        if event.datetime - datetime.datetime.now() > datetime.timedelta(hours=15):
-            schedule_notifications_for_event(event, OneDayBeforeEmailMessage, now, datetime.timedelta(days=1))
+class LeaderScheduler(PersistentScheduler):
+    """
+    The scheduler of beat that sends the periodic tasks only while it holds the lease of the leader,
+    so beat can be started on each node but the scheduling passes are run by one of them
+
+    The lease is renewed by each tick. If the leader dies, another node takes the lease over
+    when it expires and reconciles the reminders at once. The time of the last run of each periodic task
+    is shared through redis, so the new leader continues the schedule of the previous one
+    """
 
-        if event.datetime - datetime.datetime.now() > datetime.timedelta(hours=2):
-            schedule_notifications_for_event(event, FiveHoursBeforeEmailMessage, now, datetime.timedelta(hours=5))
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.lease = RedisLease(config.SCHEDULER_LEASE_NAME, config.SCHEDULER_LEASE_TTL)
+        self.is_leader = False
+        super().__init__(*args, **kwargs)
+
+    def become_leader(self) -> None:
+        """
+        The method that processes taking the lease over
+
+        The periodic tasks continue from their last runs by the previous leader, so the tasks
+        that have fallen due during the takeover, such as the digests, are run at once.
+        The tasks that have never been run start from now, and the reminders are reconciled at once
+        """
+
+        logger.info('The node %s has become the leader of scheduling', self.lease.holder)
+        try:
+            last_runs = redis_engine.hgetall(config.SCHEDULER_LAST_RUNS_NAME)
+        except redis.RedisError:
+            logger.exception('Failed to receive the last runs of the periodic tasks')
+            last_runs = {}
+
+        for name, entry in self.schedule.items():
+            last_run_at = last_runs.get(name)
+            entry.last_run_at = self.app.now() if last_run_at is None else datetime.datetime.fromisoformat(last_run_at)
+        reconcile_notifications.delay()
+
+    def reserve(self, entry: ScheduleEntry) -> ScheduleEntry:
+        new_entry = super().reserve(entry)
+        try:
+            redis_engine.hset(config.SCHEDULER_LAST_RUNS_NAME, entry.name, new_entry.last_run_at.isoformat())
+        except redis.RedisError:
+            logger.exception('Failed to share the last run of the periodic task %s', entry.name)
+        return new_entry
+
+    def tick(self, *args: Any, **kwargs: Any) -> float:
+        try:
+            is_leader = self.lease.acquire()
+        except redis.RedisError:
+            logger.exception('Failed to renew the lease of the leader of scheduling')
+            is_leader = False
+
+        if is_leader and not self.is_leader:
+            self.become_leader()
+        elif not is_leader and self.is_leader:
+            logger.warning('The node %s has lost the leadership of scheduling', self.lease.holder)
+        self.is_leader = is_leader
+
+        if not is_leader:
+            return config.SCHEDULER_LEASE_RENEW_INTERVAL
+        return min(super().tick(*args, **kwargs), config.SCHEDULER_LEASE_RENEW_INTERVAL)
+
+    def close(self) -> None:
+        if self.is_leader:
+            self.lease.release()
+        super().close()
 
 
 @worker_shutdown.connect
 def shut_down(**kwargs: Any) -> None:
     """The function that processes the stop of the celery app"""
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(db_shut_down())
+    event_loop_thread.run(db_shut_down())
+    event_loop_thread.run(smtp_shut_down())
+    event_loop_thread.stop()
 
 
 EmailNotificationsSender = app.register_task(tasks.EmailNotificationsSender())
+EmailNotificationsChunkSender = app.register_task(tasks.EmailNotificationsChunkSender())
+NotificationsResultsCombiner = app.register_task(tasks.NotificationsResultsCombiner())
+TransactionalEmailSender = app.register_task(tasks.TransactionalEmailSender())
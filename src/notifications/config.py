@@ -1,5 +1,70 @@
+import os
+
 from src.config import REDIS_HOST
 
 BROKER = 'redis'
 BROKER_HOST = REDIS_HOST
 BROKER_URL = f'{BROKER}://{BROKER_HOST}//'
+RESULT_BACKEND_URL = f'{BROKER}://{BROKER_HOST}/1'
+# the tasks are acknowledged after they are processed, so the task of the lost worker is delivered again
+# only after this timeout, since the threads pool doesn't reject the tasks of the lost worker. The timeout
+# should be longer than the sending of one chunk of subscribers, about 500 seconds at the default rate of one relay,
+# and much shorter than the nearest reminder, which is sent 5 hours before the event
+BROKER_VISIBILITY_TIMEOUT = int(os.getenv('BROKER_VISIBILITY_TIMEOUT', 3600))  # seconds
+
+# only the node that holds the lease runs the scheduling passes, the lease is renewed by each tick of its beat
+SCHEDULER_LEASE_NAME = 'scheduler_leader'
+SCHEDULER_LEASE_TTL = 10  # seconds
+SCHEDULER_LEASE_RENEW_INTERVAL = 3  # seconds
+# the time of the last run of each periodic task is shared, so the new leader doesn't repeat or skip the runs
+SCHEDULER_LAST_RUNS_NAME = 'scheduler_last_runs'
+
+# transactional emails are consumed from the separate queue by their own workers
+TRANSACTIONAL_QUEUE = 'transactional'
+TRANSACTIONAL_MAX_RETRIES = 5
+
+# the payloads of the tasks that send notifications are serialized by msgpack
+TASK_SERIALIZER = 'msgpack'
+EVENT_PAYLOAD_SCHEMA_VERSION = 1
+
+NOTIFICATIONS_CONCURRENCY = 50
+NOTIFICATIONS_CHUNK_SIZE = 10000
+
+# the progress of each run of the task that sends notifications is kept in redis, so the restarted run resumes it
+DELIVERY_LOG_NAME = 'notifications_delivery_log'
+DELIVERY_LOG_TTL = 172800  # seconds
+# the processed users are written to the log by batches of this size or after this interval
+DELIVERY_LOG_FLUSH_SIZE = 500
+DELIVERY_LOG_FLUSH_INTERVAL = 5  # seconds
+
+# notifications that are the same for everyone are sent with the generic greeting to the batches of blind copies
+NOTIFICATIONS_BROADCAST = os.getenv('NOTIFICATIONS_BROADCAST', 'false').lower() == 'true'
+BROADCAST_BATCH_SIZE = 100
+
+DIGESTS_DAYS_COUNTS = (1, 7)  # numbers of days before the events for which digests are sent
+DIGESTS_HOUR = 9
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
+
+REMINDERS_TIMELINE_NAME = 'reminders_timeline'
+TIMELINE_DISPATCH_INTERVAL = 10  # seconds
+TIMELINE_DISPATCH_BATCH_SIZE = 1000
+REMINDERS_SCHEDULING_BATCH_SIZE = 1000  # events whose reminders are added to the timeline in one round trip
+REMINDERS_LEDGER_TTL_MARGIN = 86400  # seconds after the event during which its reminders are remembered
+# reminders are spread around their time to the least loaded slots weighted by the numbers of recipients
+REMINDERS_SPREAD_TOLERANCE = int(os.getenv('REMINDERS_SPREAD_TOLERANCE', 600))  # seconds, 0 disables spreading
+REMINDERS_SPREAD_SLOT = 30  # seconds
+REMINDERS_RECONCILED_AT_NAME = 'reminders_reconciled_at'
+REMINDERS_RECONCILIATION_INTERVAL = 300  # seconds
+REMINDERS_RECONCILIATION_MARGIN = 60  # seconds before the last reconciliation from which changed events are received
+
+CHANGES_TIMELINE_NAME = 'event_changes_timeline'
+CHANGES_DEBOUNCE_WINDOW = 60  # seconds without changes of the event after which subscribers are notified
+CHANGES_ORIGINAL_EVENT_TTL = 86400  # seconds
+CHANGES_NOTIFIED_FIELDS = ('address', 'datetime')
+
+RETRIES_TIMELINE_NAME = 'retries_timeline'
+RETRIES_DEAD_LETTERS_NAME = 'retries_dead_letters'
+RETRIES_MAX_ATTEMPTS = 5
+RETRIES_BASE_DELAY = 60  # seconds before the first retry, doubled after each attempt
+RETRIES_INTERVAL = 30  # seconds
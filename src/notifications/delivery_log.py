@@ -0,0 +1,125 @@
+import collections
+import time
+import uuid as uuid_pkg
+from typing import AsyncIterable, AsyncIterator
+
+from sqlalchemy.engine import Row
+
+from src.notifications import config
+from src.redis_ import redis_engine
+
+
+class DeliveryLog:
+    """
+    The class that records the progress of sending notifications about the event by one run of the task,
+    so the run that is restarted after the failure of the worker resumes where it has stopped
+
+    The users that are processed are marked in the bitmap by their ids relative to the id of the first streamed user,
+    and the keyset checkpoint is the id of the user before which all streamed users are processed.
+    The users are streamed in the order of their ids, so the restarted run receives only the users after the checkpoint
+    and skips those of them that are marked. The processed users are kept in memory and written to redis by batches,
+    so sending doesn't wait for redis after each notification. The log is removed from redis when it expires
+    """
+
+    def __init__(self, event_uuid: uuid_pkg.UUID, message_class_name: str, run_id: str) -> None:
+        self.name = f'{config.DELIVERY_LOG_NAME}:{event_uuid}:{message_class_name}:{run_id}'
+        self.checkpoint_name = f'{self.name}:checkpoint'
+        self.first_user_id_name = f'{self.name}:first_user_id'
+        self.sharded_name = f'{self.name}:sharded'
+        self.first_user_id: int | None = None
+        self.delivered = b''
+        self.delivered_offset = 0
+        self.pending_users_ids: collections.deque[int] = collections.deque()
+        self.processed_users_ids: set[int] = set()
+        self.unflushed_users_ids: list[int] = []
+        self.flushed_at = time.monotonic()
+        self.is_flushed = False
+
+    def resume(self) -> int | None:
+        """
+        The method that returns the checkpoint of the previous attempt of the run, if there is one,
+        and receives the part of the bitmap after it
+        """
+
+        first_user_id, checkpoint = redis_engine.mget(self.first_user_id_name, self.checkpoint_name)
+        if first_user_id is None:
+            return None
+
+        self.first_user_id = int(first_user_id)
+        first_byte = (int(checkpoint) - self.first_user_id) // 8 if checkpoint is not None else 0
+        self.delivered = redis_engine.execute_command('GETRANGE', self.name, first_byte, -1, NEVER_DECODE=True)
+        self.delivered_offset = self.first_user_id + first_byte * 8
+        return None if checkpoint is None else int(checkpoint)
+
+    def is_delivered(self, user_id: int) -> bool:
+        """The method that checks that the user has been processed by the previous attempt of the run"""
+
+        index = user_id - self.delivered_offset
+        if index < 0 or index // 8 >= len(self.delivered):
+            return False
+        return bool(self.delivered[index // 8] >> (7 - index % 8) & 1)
+
+    async def skip_delivered(self, users: AsyncIterable[Row]) -> AsyncIterator[Row]:
+        """The method that skips the processed users and remembers the streamed ones as pending"""
+
+        async for user in users:
+            if self.first_user_id is None:
+                self.first_user_id = user.id
+            if not self.is_delivered(user.id):
+                self.pending_users_ids.append(user.id)
+                yield user
+
+    def mark_delivered(self, users_ids: list[int]) -> None:
+        """
+        The method that marks the users as processed
+
+        The marks are written to redis when enough of them are collected or enough time has passed since the last write
+        """
+
+        self.unflushed_users_ids.extend(users_ids)
+        if len(self.unflushed_users_ids) >= config.DELIVERY_LOG_FLUSH_SIZE \
+                or time.monotonic() - self.flushed_at >= config.DELIVERY_LOG_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        The method that writes the collected marks to redis by one round trip and moves the checkpoint
+        to the last of the pending users before which all users are processed
+
+        The log is set to expire by the first write of the run
+        """
+
+        self.flushed_at = time.monotonic()
+        if not self.unflushed_users_ids:
+            return
+
+        users_ids, self.unflushed_users_ids = self.unflushed_users_ids, []
+        if self.first_user_id is None:
+            self.first_user_id = min(users_ids + list(self.pending_users_ids)[:1])
+
+        self.processed_users_ids.update(users_ids)
+        checkpoint = None
+        while self.pending_users_ids and self.pending_users_ids[0] in self.processed_users_ids:
+            checkpoint = self.pending_users_ids.popleft()
+            self.processed_users_ids.discard(checkpoint)
+
+        with redis_engine.pipeline(transaction=False) as pipeline:
+            for user_id in users_ids:
+                pipeline.setbit(self.name, user_id - self.first_user_id, 1)
+            if not self.is_flushed:
+                pipeline.set(self.first_user_id_name, self.first_user_id, nx=True, ex=config.DELIVERY_LOG_TTL)
+                pipeline.expire(self.name, config.DELIVERY_LOG_TTL)
+            if checkpoint is not None:
+                pipeline.set(self.checkpoint_name, checkpoint, ex=config.DELIVERY_LOG_TTL)
+            pipeline.execute()
+        self.is_flushed = True
+
+    def is_sharded(self) -> bool:
+        """The method that checks that the run has been split into chunks"""
+
+        return bool(redis_engine.exists(self.sharded_name))
+
+    def mark_sharded(self) -> None:
+        """The method that marks the run as split into chunks"""
+
+        redis_engine.set(self.sharded_name, 1, ex=config.DELIVERY_LOG_TTL)
@@ -8,11 +8,21 @@ from src.utils import EmailMessage
 
 
 class EventNotificationEmailMessage(EmailMessage, ABC):
-    """The base class for email notifications"""
+    """
+    The base class for email notifications
+
+    Notifications of the digested classes aren't sent separately to the users with enabled digest.
+    Notifications of the broadcastable classes can be sent to many users at once with the generic greeting.
+    Notifications of the classes with the reminder offset are sent this time before the event
+    to the users who haven't refused them
+    """
 
     messages_classes: dict[str, type['EventNotificationEmailMessage']] = {}
+    is_digested = False
+    is_broadcastable = False
+    reminder_offset: datetime.timedelta | None = None
 
-    def __init__(self, event: 'Event', user: 'User') -> None:
+    def __init__(self, event: 'Event', user: User | None) -> None:
         super().__init__(user, 'Уведомление o событии!')
         self.event = event
 
@@ -23,6 +33,8 @@ class EventNotificationEmailMessage(EmailMessage, ABC):
 class FiveHoursBeforeEmailMessage(EventNotificationEmailMessage):
     """The message that is sent five hours before the event"""
 
+    reminder_offset = datetime.timedelta(hours=5)
+
     def create_payload(self) -> str:
         return f'Сообщаем Вам, что менее, чем через пять часов ' \
                f'({self.event.datetime.strftime("%d-%m-%Y, %H:%M")}), ' \
@@ -32,6 +44,9 @@ class FiveHoursBeforeEmailMessage(EventNotificationEmailMessage):
 class OneDayBeforeEmailMessage(EventNotificationEmailMessage):
     """The message that is sent the day before the event"""
 
+    is_digested = True
+    reminder_offset = datetime.timedelta(days=1)
+
     def create_payload(self) -> str:
         return f'Сообщаем Вам, что менее, чем через одни сутки ' \
                f'({self.event.datetime.strftime("%d-%m-%Y, %H:%M")}), ' \
@@ -41,6 +56,9 @@ class OneDayBeforeEmailMessage(EventNotificationEmailMessage):
 class OneWeekBeforeEmailMessage(EventNotificationEmailMessage):
     """The message that is sent the week before the event"""
 
+    is_digested = True
+    reminder_offset = datetime.timedelta(days=7)
+
     def create_payload(self) -> str:
         return f'Сообщаем Вам, что уже через неделю ' \
                f'({self.event.datetime.strftime("%d-%m-%Y, %H:%M")}), ' \
@@ -50,7 +68,7 @@ class OneWeekBeforeEmailMessage(EventNotificationEmailMessage):
 class EventChangedEmailMessage(EventNotificationEmailMessage):
     """The message that is sent when the address or datetime of the event change"""
 
-    def __init__(self, event: Event, user: User, event_changes: dict[str, Any]) -> None:
+    def __init__(self, event: Event, user: User | None, event_changes: dict[str, Any]) -> None:
         super().__init__(event, user)
         self.event_changes = event_changes
 
@@ -80,6 +98,8 @@ class EventChangedEmailMessage(EventNotificationEmailMessage):
 class EventCanceledEmailMessage(EventNotificationEmailMessage):
     """The message that is sent when the event is canceled"""
 
+    is_broadcastable = True
+
     def create_payload(self) -> str:
         return f'Сообщаем Вам, что событие "{self.event.name}" ' \
                f'({self.event.datetime.strftime("%d-%m-%Y, %H:%M")}) ' \
@@ -90,6 +110,20 @@ class EventCanceledEmailMessage(EventNotificationEmailMessage):
 class HostingEventEmailMessage(EventNotificationEmailMessage):
     """The message that is sent when the canceled event is held"""
 
+    is_broadcastable = True
+
     def create_payload(self) -> str:
         return f'Сообщаем Вам, что отмененное событие "{self.event.name}" ' \
                f'будет проведено {self.event.datetime.strftime("%d-%m-%Y в %H:%M")}.'
+
+
+class EventsDigestEmailMessage(EmailMessage):
+    """The message that gathers reminders about the upcoming events of the user"""
+
+    def __init__(self, user: User, events: list[tuple[str, datetime.datetime]]) -> None:
+        super().__init__(user, 'Дайджест событий!')
+        self.events = events
+
+    def create_payload(self) -> str:
+        return 'Сообщаем Вам о предстоящих событиях:\n' + \
+            '\n'.join(f'{datetime_.strftime("%d-%m-%Y, %H:%M")} - "{name}"' for name, datetime_ in self.events)
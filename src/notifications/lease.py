@@ -0,0 +1,47 @@
+import os
+import socket
+import uuid as uuid_pkg
+
+from src.redis_ import redis_engine
+
+ACQUIRE_LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    The class that represents the lease in redis that can be held only by one process at the same time
+
+    The lease expires if the holder doesn't renew it in time, so another process
+    can take it over when the holder has died
+    """
+
+    def __init__(self, name: str, ttl: float) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid_pkg.uuid4().hex}'
+        self.acquire_lease_script = redis_engine.register_script(ACQUIRE_LEASE_SCRIPT)
+        self.release_lease_script = redis_engine.register_script(RELEASE_LEASE_SCRIPT)
+
+    def acquire(self) -> bool:
+        """The method that acquires the free lease or renews the held one, returns True if the lease is held"""
+
+        return bool(self.acquire_lease_script(keys=[self.name], args=[self.holder, int(self.ttl * 1000)]))
+
+    def release(self) -> None:
+        """The method that releases the lease if it is held, so another process can take it over at once"""
+
+        self.release_lease_script(keys=[self.name], args=[self.holder])
@@ -0,0 +1,50 @@
+import datetime
+import uuid as uuid_pkg
+from typing import Any
+
+from src.events.models import Event
+from src.notifications import config
+
+EPOCH = datetime.datetime(year=1970, month=1, day=1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def dump_datetime(datetime_: datetime.datetime) -> int:
+    """
+    The function that represents the naive datetime by the number of microseconds since the naive epoch
+
+    The local time zone isn't involved, so the datetimes that are ambiguous or skipped
+    by the daylight saving time transitions are restored exactly
+    """
+
+    return (datetime_ - EPOCH) // MICROSECOND
+
+
+def load_datetime(microseconds: int) -> datetime.datetime:
+    """The function that restores the naive datetime from the number of microseconds since the naive epoch"""
+
+    return EPOCH + microseconds * MICROSECOND
+
+
+def dump_event(event: Event) -> list[Any]:
+    """
+    The function that creates the compact payload of the task with only the fields of the event
+    that are needed to notify about it
+
+    The payload is the list of the version of its schema, the uuid, name, datetime and address of the event
+    and the version of the event, which is the time of its last update
+    """
+
+    return [config.EVENT_PAYLOAD_SCHEMA_VERSION, event.uuid.bytes, event.name, dump_datetime(event.datetime),
+            event.address, dump_datetime(event.updated_at)]
+
+
+def load_event(payload: list[Any]) -> Event:
+    """The function that creates the event from the payload of the task of the current version of the schema"""
+
+    schema_version, uuid, name, datetime_, address, updated_at = payload
+    if schema_version != config.EVENT_PAYLOAD_SCHEMA_VERSION:
+        raise ValueError(f'unsupported schema version of the event payload: {schema_version}')
+
+    return Event(uuid=uuid_pkg.UUID(bytes=uuid), name=name, datetime=load_datetime(datetime_),
+                 address=address, updated_at=load_datetime(updated_at))
@@ -0,0 +1,117 @@
+import datetime
+import email
+import json
+import uuid as uuid_pkg
+from email.message import Message
+from typing import Any, AsyncIterator
+
+from sqlalchemy import select
+
+from src import database, metrics
+from src.events.models import Event
+from src.notifications import config
+from src.notifications.payloads import dump_datetime
+from src.notifications.timeline import RedisTimeline
+from src.notifications.utils import fan_out
+from src.redis_ import redis_engine
+from src.service import send_email
+
+retries_timeline = RedisTimeline(config.RETRIES_TIMELINE_NAME)
+
+
+def create_retry(message: str, attempt: int, recipients: list[str] | None = None, event: Event | None = None) -> str:
+    """
+    The function that creates the member of the retries timeline
+
+    The recipients are given only if they differ from the recipients in the headers of the message.
+    The event is given only if the message is about the single event, its uuid and datetime are stored
+    to check before the next attempt that the message is still relevant
+    """
+
+    event_data = None if event is None else [str(event.uuid), dump_datetime(event.datetime)]
+    return json.dumps([message, attempt, recipients, event_data])
+
+
+def schedule_retry(message: Message | str, attempt: int, error: Exception,
+                   recipients: list[str] | None = None, event: Event | None = None) -> bool:
+    """
+    The function that schedules the next attempt to send the message that hasn't been sent
+    and returns True if it is scheduled
+
+    The delay doubles after each attempt. When the attempts are over,
+    the message is moved to the dead letters together with the last error
+    """
+
+    if isinstance(message, Message):
+        message = message.as_string()
+
+    if attempt > config.RETRIES_MAX_ATTEMPTS:
+        redis_engine.lpush(config.RETRIES_DEAD_LETTERS_NAME,
+                           json.dumps([message, attempt - 1, repr(error), recipients]))
+        metrics.notifications_retries.labels('dead').inc()
+        return False
+
+    delay = datetime.timedelta(seconds=config.RETRIES_BASE_DELAY * 2 ** (attempt - 1))
+    retries_timeline.add(create_retry(message, attempt, recipients, event), datetime.datetime.now() + delay)
+    metrics.notifications_retries.labels('scheduled').inc()
+    return True
+
+
+async def receive_due_retries(datetime_: datetime.datetime) -> AsyncIterator[str]:
+    """The function that streams the retries whose time has come by batches"""
+
+    while retries := retries_timeline.pop_due(datetime_, config.TIMELINE_DISPATCH_BATCH_SIZE):
+        for retry in retries:
+            yield retry
+
+
+async def receive_relevant_event(event_data: list[Any]) -> Event | None:
+    """
+    The function that receives the event of the retry if it is still active and its datetime hasn't changed,
+    otherwise the message about the event is outdated
+    """
+
+    uuid, datetime_ = event_data
+    query = select(Event).where(Event.uuid == uuid_pkg.UUID(uuid), Event.is_active.is_(True))  # type: ignore
+    async with database.Session() as session:
+        event = await session.scalar(query)
+
+    if event is None or dump_datetime(event.datetime) != datetime_:
+        return None
+    return event
+
+
+async def send_retry(retry: str) -> bool:
+    """
+    The function that makes the attempt to send the message again and returns True if it is sent
+
+    The message about the event that has been deactivated or rescheduled since the failure is dropped.
+    The retries scheduled before the event was stored have no event and are always sent
+    """
+
+    message, attempt, recipients, *rest = json.loads(retry)
+    event = None
+    if rest and rest[0] is not None and (event := await receive_relevant_event(rest[0])) is None:
+        metrics.notifications_retries.labels('outdated').inc()
+        return False
+
+    try:
+        await send_email(email.message_from_string(message), recipients)
+    except Exception as e:
+        schedule_retry(message, attempt + 1, e, recipients, event)
+        return False
+
+    metrics.notifications_retries.labels('sent').inc()
+    return True
+
+
+async def retry_sending(datetime_: datetime.datetime) -> int:
+    """
+    The function that sends again the messages whose time of the next attempt has come
+    and returns the number of sent messages
+
+    Only the recipients whose messages haven't been sent are processed
+    """
+
+    results = await fan_out(receive_due_retries(datetime_), send_retry, config.NOTIFICATIONS_CONCURRENCY)
+    return sum(results)
@@ -1,49 +1,326 @@
-import asyncio
 import datetime
+import json
+import uuid as uuid_pkg
+from typing import AsyncIterator, Iterable, Sequence
 
-from sqlalchemy import select, func
+from sqlalchemy import select, and_, or_, func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import BooleanClauseList
 
+import src.config
 import src.notifications.celery_
-from src.events.models import Event
-from src.service import execute_db_query
+from src import database, metrics
+from src.events.models import Event, EventEffectiveSubscription
+from src.events.service import create_counting_subs_to_event_query_from_db, receive_subs_to_event_count_from_db
+from src.notifications import config
+from src.notifications.email_messages import EventsDigestEmailMessage, EventChangedEmailMessage, \
+    EventNotificationEmailMessage, OneWeekBeforeEmailMessage, OneDayBeforeEmailMessage, FiveHoursBeforeEmailMessage
+from src.notifications.payloads import dump_event
+from src.notifications.retries import schedule_retry
+from src.notifications.tasks import NotificationResult
+from src.notifications.timeline import RedisTimeline
+from src.notifications.utils import fan_out, batch
+from src.redis_ import redis_engine
+from src.service import send_email, receive_model
+from src.users.models import User
 from src.utils import EmailMessage
 
+reminders_timeline = RedisTimeline(config.REMINDERS_TIMELINE_NAME)
+REMINDERS: tuple[tuple[type[EventNotificationEmailMessage], datetime.timedelta], ...] = tuple(
+    (message_class, message_class.reminder_offset)
+    for message_class in (OneWeekBeforeEmailMessage, OneDayBeforeEmailMessage, FiveHoursBeforeEmailMessage)
+    if message_class.reminder_offset is not None
+)
+changes_timeline = RedisTimeline(config.CHANGES_TIMELINE_NAME)
 
-async def receive_events_that_in_few_days_time(day_count: int, datetime_: datetime.datetime) -> list[Event]:
+
+def create_days_ranges_condition(days_counts: Iterable[int], datetime_: datetime.datetime) -> BooleanClauseList:
+    """
+    The function that creates the condition that the event will occur in any of the given numbers of days
+
+    The days are represented by half-open datetime ranges, so the index on the datetime of active events is used
+    """
+
+    today = datetime_.replace(hour=0, minute=0, second=0, microsecond=0)
+    days_ranges = [and_(Event.datetime >= today + datetime.timedelta(days=day_count),  # type: ignore
+                        Event.datetime < today + datetime.timedelta(days=day_count + 1))
+                   for day_count in days_counts]
+    return or_(*days_ranges)
+
+
+def create_reminder(event_uuid: uuid_pkg.UUID, message_class: type[EmailMessage],
+                    event_datetime: datetime.datetime) -> str:
     """
-    The function that schedules notifications at application startup for events
-    that the main scheduling function won't process
+    The function that creates the member of the reminders timeline
+
+    It consists of the arguments of the task that sends notifications. The member is also the identity
+    of the reminder by which it is deduplicated by the ledger, weighted in its slot and removed on cancellation,
+    so it holds only the uuid and the datetime of the event, and not its payload, which changes with every update
+    of the event. The task of the reminder therefore receives the event from the database once,
+    and its chunks receive the compact payload
     """
 
-    in_day_count = (datetime_ + datetime.timedelta(days=day_count)).date()
-    query = select(Event).where(func.date(Event.datetime) == in_day_count)
-    return (await execute_db_query(query)).scalars().fetchall()
+    return json.dumps([str(event_uuid), message_class.__name__, event_datetime.isoformat()])
 
 
-async def receive_events_for_this_and_next_day(datetime_: datetime.datetime) -> list[Event]:
-    """The function that returns the events that will occur on the given day and the next"""
+def create_timeline_entry(event: Event | Row, message_class: type[EmailMessage],
+                          timedelta: datetime.timedelta) -> tuple[str, datetime.datetime, int]:
+    """
+    The function that creates the reminder about the event together with the time when it should be delivered
+    and the number of seconds during which it is remembered as already scheduled
+    """
 
-    edge = (datetime_ + datetime.timedelta(days=2)).replace(hour=0, minute=0)
-    query = select(Event).where(Event.datetime >= datetime_, Event.datetime < edge)
-    return (await execute_db_query(query)).scalars().fetchall()
+    ttl = int((event.datetime - datetime.datetime.now()).total_seconds()) + config.REMINDERS_LEDGER_TTL_MARGIN
+    return create_reminder(event.uuid, message_class, event.datetime), event.datetime - timedelta, ttl
 
 
-def get_countdown(start: datetime.datetime, end: datetime.datetime) -> int:
-    """The function that returns the delay in seconds"""
+def schedule_notifications_for_event(event: Event | Row, message_class: type[EmailMessage],
+                                     timedelta: datetime.timedelta) -> bool:
+    """
+    The function that schedules notifications for the event and returns True if they are scheduled
 
-    if start > end:
+    Notifications of the same class about the same event with the same datetime are scheduled only once,
+    no matter how many times and by how many workers this function is called
+    """
+
+    return reminders_timeline.add_once(*create_timeline_entry(event, message_class, timedelta))
+
+
+def cancel_notifications_for_event(event: Event, message_class: type[EmailMessage]) -> None:
+    """The function that cancels scheduled notifications for the event"""
+
+    reminders_timeline.remove(create_reminder(event.uuid, message_class, event.datetime))
+
+
+def schedule_reminders_for_events(events: Sequence[Event | Row], recipients_counts: Sequence[int],
+                                  datetime_: datetime.datetime) -> int:
+    """
+    The function that schedules the reminders about the events whose time hasn't come by the given time
+    and returns the number of scheduled reminders
+
+    The reminders that have already been scheduled aren't scheduled again.
+    The reminders are spread within the tolerance around their time by the numbers of recipients of the events,
+    so the reminders about the events that start at the same time aren't sent at once.
+    The reminders about all events are added to the timeline in one round trip to redis.
+    The number of recipients is taken when the reminder is scheduled, and the reminder isn't moved
+    when the event gains subscribers later, so the spreading may rely on the outdated number
+    """
+
+    reminders = [(message_class, (*create_timeline_entry(event, message_class, timedelta), max(recipients_count, 1)))
+                 for event, recipients_count in zip(events, recipients_counts)
+                 for message_class, timedelta in REMINDERS
+                 if event.datetime - timedelta > datetime_]
+    if not reminders:
         return 0
-    return int((end - start).total_seconds())
+
+    added = reminders_timeline.add_many_once([entry for _, entry in reminders],
+                                             config.REMINDERS_SPREAD_TOLERANCE, config.REMINDERS_SPREAD_SLOT)
+    for (message_class, _), is_added in zip(reminders, added):
+        if is_added:
+            metrics.reminders_scheduled.labels(message_class.__name__).inc()
+
+    return sum(added)
+
+
+async def schedule_reminders_for_event(event: Event, datetime_: datetime.datetime) -> int:
+    """
+    The function that schedules the reminders about the event, weighted by the number of its current subscribers,
+    and returns the number of scheduled reminders
+    """
+
+    recipients_count = await receive_subs_to_event_count_from_db(event.uuid)
+    return schedule_reminders_for_events([event], [recipients_count], datetime_)
+
+
+def cancel_reminders_for_event(event: Event) -> None:
+    """The function that cancels all reminders about the event with its current datetime"""
+
+    for message_class, _ in REMINDERS:
+        cancel_notifications_for_event(event, message_class)
+
+
+async def reconcile_reminders(datetime_: datetime.datetime) -> int:
+    """
+    The function that schedules the reminders about the upcoming active events that have changed
+    since the last reconciliation and returns the number of scheduled reminders
+
+    The reminders are scheduled when the events are written, so this pass only catches up the events
+    whose reminders haven't been scheduled because of a failure. All upcoming events are processed
+    by the first reconciliation. The events are streamed from the database and their reminders are added
+    to the timeline by batches, so the number of round trips to redis doesn't depend on the number of events
+    """
+
+    conditions = [Event.is_active, Event.datetime > datetime_]
+    reconciled_at = redis_engine.get(config.REMINDERS_RECONCILED_AT_NAME)
+    if reconciled_at is not None:
+        margin = datetime.timedelta(seconds=config.REMINDERS_RECONCILIATION_MARGIN)
+        conditions.append(Event.updated_at >= datetime.datetime.fromisoformat(reconciled_at) - margin)
+
+    query = select(Event.uuid, Event.datetime,
+                   create_counting_subs_to_event_query_from_db(Event.uuid).label('recipients_count')) \
+        .where(*conditions) \
+        .execution_options(yield_per=src.config.DATABASE_CURSOR_SIZE)
+
+    count = 0
+    with metrics.reminders_scheduling_duration.time():
+        async with database.Session() as session:
+            events = await session.stream(query)
+            async for events_batch in batch(events, config.REMINDERS_SCHEDULING_BATCH_SIZE):
+                count += schedule_reminders_for_events(events_batch,
+                                                       [event.recipients_count for event in events_batch], datetime_)
+
+    redis_engine.set(config.REMINDERS_RECONCILED_AT_NAME, datetime_.isoformat())
+    return count
+
+
+def dispatch_notifications(datetime_: datetime.datetime) -> int:
+    """
+    The function that sends the notifications, whose time has come, to the workers
+    and returns the number of sent notifications
+
+    All tasks are published by one producer acquired for the whole pass,
+    so the connection to the broker isn't taken from the pool for each of them.
+    If publishing fails, the popped notifications that haven't been published are returned to the timeline
+    at their time, so the next pass sends them
+    """
+
+    count = 0
+    with src.notifications.celery_.app.producer_or_acquire() as producer:
+        while reminders := reminders_timeline.pop_due_with_datetimes(datetime_, config.TIMELINE_DISPATCH_BATCH_SIZE):
+            published_count = 0
+            try:
+                for reminder, planned_at in reminders:
+                    src.notifications.celery_.EmailNotificationsSender.apply_async(
+                        args=json.loads(reminder), kwargs={'planned_at': planned_at.isoformat()}, producer=producer)
+                    published_count += 1
+            except Exception:
+                reminders_timeline.add_many(reminders[published_count:])
+                raise
+            count += len(reminders)
+
+    return count
+
+
+async def receive_digests(days_counts: Iterable[int], datetime_: datetime.datetime) -> AsyncIterator[Row]:
+    """
+    The function that streams the users with enabled digest together with the names and datetimes
+    of the active events, that will occur in any of the given numbers of days, which they are subscribed to
+
+    The effective subscriptions to the events are grouped by the users in one query
+    """
+
+    subs_query = select(EventEffectiveSubscription.user_id, Event.uuid, Event.name, Event.datetime) \
+        .join(Event, Event.uuid == EventEffectiveSubscription.event_uuid) \
+        .where(Event.is_active, create_days_ranges_condition(days_counts, datetime_)) \
+        .distinct() \
+        .subquery()
+
+    query = select(User,
+                   func.array_agg(aggregate_order_by(subs_query.c.name, subs_query.c.datetime)),
+                   func.array_agg(aggregate_order_by(subs_query.c.datetime, subs_query.c.datetime))) \
+        .join(subs_query, subs_query.c.user_id == User.id) \
+        .where(User.notifications_digest) \
+        .group_by(User.id) \
+        .execution_options(yield_per=src.config.DATABASE_CURSOR_SIZE)
+
+    async with database.Session() as session:
+        async for digest in await session.stream(query):
+            yield digest
+
+
+async def send_digest(digest: Row) -> NotificationResult:
+    """
+    The function that sends the digest to the user and returns the result of sending
+
+    The digest that hasn't been sent is scheduled for retry
+    """
+
+    user, events_names, events_datetimes = digest
+    message = EventsDigestEmailMessage(user, list(zip(events_names, events_datetimes))).create()
+    try:
+        await send_email(message)
+    except Exception as e:
+        schedule_retry(message, 1, e)
+        return NotificationResult(user.email, e)
+
+    return NotificationResult(user.email)
+
+
+async def send_digests(days_counts: Iterable[int], datetime_: datetime.datetime) -> list[NotificationResult]:
+    """
+    The function that sends each user with enabled digest one email with reminders about all events,
+    that will occur in any of the given numbers of days, and returns the results of sending
+    """
+
+    return await fan_out(receive_digests(days_counts, datetime_), send_digest, config.NOTIFICATIONS_CONCURRENCY)
 
 
-def schedule_notifications_for_event(event: Event, message_class: type[EmailMessage],
-                                     datetime_: datetime.datetime,
-                                     timedelta: datetime.timedelta) -> None:
-    """The function that schedules notifications for the event"""
+def create_original_event_key(event_uuid: uuid_pkg.UUID | str) -> str:
+    """The function that creates the key of the event as it was before the first of the debounced changes"""
 
-    notifications_datetime = event.datetime - timedelta
-    countdown = get_countdown(datetime_, notifications_datetime)
+    return f'{config.CHANGES_TIMELINE_NAME}_original:{event_uuid}'
+
+
+def debounce_event_changes(event_without_changes: Event) -> None:
+    """
+    The function that postpones notifying about the changes of the event
+    until it hasn't been changed during the debounce window
+
+    Only the event before the first change is remembered, so consecutive changes are merged into one
+    """
+
+    with redis_engine.pipeline() as pipeline:
+        pipeline.set(create_original_event_key(event_without_changes.uuid), event_without_changes.json(),
+                     nx=True, ex=config.CHANGES_ORIGINAL_EVENT_TTL)
+        pipeline.zadd(changes_timeline.name, {str(event_without_changes.uuid): (
+            datetime.datetime.now() + datetime.timedelta(seconds=config.CHANGES_DEBOUNCE_WINDOW)).timestamp()})
+        pipeline.execute()
+
+
+async def notify_about_event_changes(event_uuid: str, original_event_data: str | None) -> bool:
+    """
+    The function that sends the notifications about the net changes of the event
+    since the first of the debounced changes and returns True if they are sent
+
+    Notifications aren't sent if the values are the same as before, the event doesn't exist or isn't active
+    """
+
+    if original_event_data is None:
+        return False
+
+    event = await receive_model(Event, Event.uuid == event_uuid)  # type: ignore
+    if event is None or not event.is_active:
+        return False
+
+    original_event = Event(**json.loads(original_event_data))
+    event_changes = {field: getattr(event, field) for field in config.CHANGES_NOTIFIED_FIELDS
+                     if getattr(event, field) != getattr(original_event, field)}
+    if not event_changes:
+        return False
+
+    if 'datetime' in event_changes:
+        event_changes['datetime'] = event_changes['datetime'].isoformat()
     src.notifications.celery_.EmailNotificationsSender.apply_async(
-        args=(event.uuid, message_class.__name__, event.datetime),
-        countdown=countdown
-    )
+        args=(dump_event(original_event), EventChangedEmailMessage.__name__),
+        kwargs={'event_changes': event_changes})
+    return True
+
+
+async def flush_event_changes(datetime_: datetime.datetime) -> int:
+    """
+    The function that notifies about the changes of the events whose debounce window has passed
+    and returns the number of events whose subscribers are notified
+
+    The events are popped together with their original versions, so the change that is made meanwhile
+    remembers its own original version and is notified by the next debounce window
+    """
+
+    count = 0
+    original_event_key_prefix = create_original_event_key('')
+    while events := changes_timeline.pop_due_with_values(datetime_, config.TIMELINE_DISPATCH_BATCH_SIZE,
+                                                         original_event_key_prefix):
+        for event_uuid, original_event_data in events:
+            count += await notify_about_event_changes(event_uuid, original_event_data)
+
+    return count
@@ -1,61 +1,347 @@
-import asyncio
-import json
-from datetime import datetime
-from typing import Any
+import functools
+import itertools
+import uuid as uuid_pkg
+from datetime import datetime, timedelta
+from email import message_from_string
+from typing import Any, AsyncIterable, NamedTuple, Protocol
 
-from celery import Task
+from celery import Task, chord
+from celery.utils.log import get_task_logger
 from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import BinaryExpression, ColumnElement
 
 import src.config
-from src import database
+from src import database, metrics
 from src.events.models import Event
-from src.events.service import create_receiving_subs_to_event_union_query_from_db
+from src.events.service import create_receiving_subs_to_event_recipients_query_from_db, \
+    receive_subs_to_event_ids_boundaries_from_db, receive_event_for_notifications_from_db, \
+    receive_event_version_from_db
+from src.notifications import config
+from src.notifications.delivery_log import DeliveryLog
 from src.notifications.email_messages import EventNotificationEmailMessage
-from src.service import receive_model, send_email
-from src.users.models import User
+from src.notifications.payloads import dump_event, load_event
+from src.notifications.retries import schedule_retry
+from src.notifications.utils import fan_out, event_loop_thread, batch
+from src.service import send_email
+from src.users.models import User, UserReminderOptOut
+from src.utils import EmailMessageTemplate, Recipient
+
+logger = get_task_logger(__name__)
+
+
+class Subscriber(Recipient, Protocol):
+    """The protocol of the notified subscriber, such as the row of the user streamed to the senders"""
+
+    @property
+    def id(self) -> int: ...
+
+
+class NotificationResult(NamedTuple):
+    """The result of sending the notification to one subscriber"""
+
+    email: str
+    error: Exception | None = None
+
+
+def create_users_range_conditions(users_range: tuple[int, int | None] | None) -> list[BinaryExpression]:
+    """
+    The function that creates the conditions on the ids of the users from the range
+    in the form of (the id of the first user, the id of the first user of the next range)
+    """
+
+    if users_range is None:
+        return []
+
+    first_user_id, next_first_user_id = users_range
+    conditions: list[BinaryExpression] = [User.id >= first_user_id]  # type: ignore
+    if next_first_user_id is not None:
+        conditions.append(User.id < next_first_user_id)  # type: ignore
+
+    return conditions
+
+
+def create_reminder_opt_outs_condition(reminder_offset: timedelta) -> ColumnElement:
+    """
+    The function that creates the condition that the user hasn't refused the reminders with the offset
+
+    The refusals are looked up in the range of the offset in the primary key of the refusals,
+    so the refused users are filtered out by the database
+    """
+
+    return ~select(UserReminderOptOut.user_id) \
+        .where(UserReminderOptOut.reminder_offset == int(reminder_offset.total_seconds()),
+               UserReminderOptOut.user_id == User.id) \
+        .exists()
+
+
+def summarize_results(results: list[NotificationResult]) -> dict[str, int]:
+    """The function that counts sent and failed notifications"""
+
+    failed_count = sum(result.error is not None for result in results)
+    return {'sent': len(results) - failed_count, 'failed': failed_count}
 
 
 class EmailNotificationsSender(Task):
-    """The class that processes sending notifications in the form of email messages"""
+    """
+    The class that processes sending notifications in the form of email messages
 
-    def __init__(self, event: Event | None = None) -> None:
-        self.event = event
+    The instance of the task is shared by all threads of the worker,
+    so the data of the processed event is passed through arguments.
+    The task is acknowledged after it is processed, so the task of the failed worker is delivered again
+    and resumes sending by the delivery log of its run. With the threads pool the task of the lost worker
+    isn't rejected, so it is delivered again only after the visibility timeout of the broker,
+    and the reminders of the events that have started by then are dropped
+    """
 
-    async def send_notification(self, user: User, message_class: type[EventNotificationEmailMessage],
-                                **kwargs: Any) -> None:
-        """The method that sends one notification"""
+    serializer = config.TASK_SERIALIZER
+    acks_late = True
+    reject_on_worker_lost = True
 
-        message = message_class(event=self.event, user=user, **kwargs)  # type: ignore
-        await send_email(message)
+    async def send_notification(self, user: Subscriber, template: EmailMessageTemplate, event: Event | None = None,
+                                delivery_log: DeliveryLog | None = None) -> NotificationResult:
+        """
+        The method that sends one notification and returns the result of sending
 
-    async def send_notifications(self, message_class: type[EventNotificationEmailMessage], **kwargs: Any) -> None:
-        """The method that sends notifications to all subscribers"""
+        The notification that hasn't been sent is scheduled for retry together with the event it is about.
+        In both cases the user is marked as processed
+        """
 
-        query = create_receiving_subs_to_event_union_query_from_db(self.event.uuid,  # type: ignore
-                                                                   self.event.gov_structure_uuid)  # type: ignore
-        query = select(User).from_statement(query)
+        message = template.create(user)
+        try:
+            await send_email(message)
+        except Exception as e:
+            schedule_retry(message, 1, e, event=event)
+            result = NotificationResult(user.email, e)
+        else:
+            result = NotificationResult(user.email)
 
-        async with database.Session() as session:
-            result = await session.stream_scalars(query)
-            async for partition in result.partitions(src.config.DATABASE_CURSOR_SIZE):
-                coroutines = [self.send_notification(user, message_class, **kwargs) for user in partition]
-                await asyncio.gather(*coroutines, return_exceptions=True)
+        if delivery_log is not None:
+            delivery_log.mark_delivered([user.id])
+        return result
 
-    def run(self, event: str, message_class_name: str,
-            datetime_: str | None = None, is_json: bool = False,
-            **kwargs: Any) -> None:
-        """The method that starts when the event is processed"""
+    async def send_broadcast(self, users: list[Subscriber], template: EmailMessageTemplate, event: Event | None = None,
+                             delivery_log: DeliveryLog | None = None) -> list[NotificationResult]:
+        """
+        The method that sends one notification with the generic greeting to the batch of users in blind copy
+        and returns the results of sending for each of them
 
-        loop = asyncio.get_event_loop()
-        if is_json:
-            self.event = Event(**json.loads(event))
+        The notification that hasn't been sent is scheduled for retry to the whole batch
+        together with the event it is about. In both cases the users are marked as processed
+        """
 
+        message = template.create(None)
+        message['To'] = src.config.EMAIL_LOCAL_ADDRESS
+        recipients: list[str] = [user.email for user in users]
+        try:
+            await send_email(message, recipients)
+        except Exception as e:
+            schedule_retry(message, 1, e, recipients, event)
+            results = [NotificationResult(email, e) for email in recipients]
         else:
-            self.event = loop.run_until_complete(receive_model(Event, Event.uuid == event))  # type: ignore
-            if (datetime_ and self.event.datetime != datetime.fromisoformat(datetime_)) \
-                    or self.event is None \
-                    or not self.event.is_active:
-                return
+            results = [NotificationResult(email) for email in recipients]
+
+        if delivery_log is not None:
+            delivery_log.mark_delivered([user.id for user in users])
+        return results
+
+    async def send_notifications(self, event: Event, message_class: type[EventNotificationEmailMessage],
+                                 users_range: tuple[int, int | None] | None = None,
+                                 delivery_log: DeliveryLog | None = None, **kwargs: Any) -> list[NotificationResult]:
+        """
+        The method that sends notifications to all subscribers or to subscribers from the range of ids
+        and returns the results of sending
+
+        Only the columns needed to create the message are streamed from the server-side cursor
+        to the fixed number of concurrent senders without tracking by the session,
+        so the memory consumption does not depend on the number of subscribers.
+        The payload of the message is rendered once, only the greeting is created for each subscriber.
+        The users with enabled digest are skipped if the message is included in the digest,
+        the users who have refused the reminder are skipped if the message is the reminder.
+        In the broadcast mode the broadcastable message is sent to the batches of subscribers in blind copy.
+        If the delivery log is given, sending is resumed after its checkpoint and the processed users are skipped,
+        the rest of the processed users are written to the log when sending is finished
+        """
+
+        conditions = create_users_range_conditions(users_range)
+        if message_class.is_digested:
+            conditions.append(User.notifications_digest.is_(False))  # type: ignore
+        if message_class.reminder_offset is not None:
+            conditions.append(create_reminder_opt_outs_condition(message_class.reminder_offset))  # type: ignore
+        if delivery_log is not None and (checkpoint := delivery_log.resume()) is not None:
+            conditions.append(User.id > checkpoint)  # type: ignore
+
+        query = create_receiving_subs_to_event_recipients_query_from_db(event.uuid, *conditions) \
+            .execution_options(yield_per=src.config.DATABASE_CURSOR_SIZE)
+        template = message_class(event=event, user=None, **kwargs).create_template()
+
+        with metrics.notifications_fan_out_duration.labels(message_class.__name__).time():
+            async with database.Session() as session:
+                users: AsyncIterable[Row] = await session.stream(query)
+                if delivery_log is not None:
+                    users = delivery_log.skip_delivered(users)
+                if config.NOTIFICATIONS_BROADCAST and message_class.is_broadcastable:
+                    send_broadcast = functools.partial(self.send_broadcast, template=template, event=event,
+                                                       delivery_log=delivery_log)
+                    batches_results = await fan_out(batch(users, config.BROADCAST_BATCH_SIZE), send_broadcast,
+                                                    config.NOTIFICATIONS_CONCURRENCY)
+                    results = list(itertools.chain.from_iterable(batches_results))
+                else:
+                    send_notification = functools.partial(self.send_notification, template=template, event=event,
+                                                          delivery_log=delivery_log)
+                    results = await fan_out(users, send_notification, config.NOTIFICATIONS_CONCURRENCY)
+                if delivery_log is not None:
+                    delivery_log.flush()
+
+        failed_results = [result for result in results if result.error is not None]
+        metrics.notifications_sent.labels(message_class.__name__, 'sent').inc(len(results) - len(failed_results))
+        metrics.notifications_sent.labels(message_class.__name__, 'failed').inc(len(failed_results))
+        if failed_results:
+            logger.warning('Failed to send %s of %s notifications %s about the event %s, they are scheduled for retry',
+                           len(failed_results), len(results), message_class.__name__, event.uuid)
+
+        return results
+
+    def shard(self, event: Event, message_class_name: str, boundaries: list[int],
+              datetime_: str | None = None, task_id: str | None = None, **kwargs: Any) -> None:
+        """
+        The method that splits sending notifications into the chunks of subscribers
+        that can be processed by any worker and combines their results at the end
+
+        If the id of the task is given, the ids of the chunks are derived from it, so the chunks
+        that are sent again by the task delivered again resume the delivery logs of the same runs
+        """
+
+        users_ranges = zip(boundaries, boundaries[1:] + [None])
+        chunks = [self.app.signature(f'{__name__}.{EmailNotificationsChunkSender.__name__}',
+                                     args=(dump_event(event), message_class_name, datetime_),
+                                     kwargs={'users_range': users_range, **kwargs})
+                  for users_range in users_ranges]
+        combiner = self.app.signature(f'{__name__}.{NotificationsResultsCombiner.__name__}',
+                                      args=(str(event.uuid), message_class_name))
+        if task_id is not None:
+            for index, chunk in enumerate(chunks):
+                chunk.set(task_id=f'{task_id}:{index}')
+            combiner.set(task_id=f'{task_id}:combiner')
+        chord(chunks)(combiner)
+
+    async def receive_event(self, event_data: str | list[Any], datetime_: str | None) -> Event | None:
+        """
+        The method that returns the event from the payload of the task or from the database
+        if only the uuid of the event is given
+
+        The reminder from the timeline gives only the uuid of the event, because the event may change
+        during the days between scheduling and sending, so the event is received from the database once per reminder.
+        The chunks of the reminder get the payload, which is used only if the version of the event hasn't changed
+        since it was created, otherwise the event is received from the database again.
+        The reminder isn't sent if the event doesn't exist, isn't active, its datetime has changed
+        or it has already started, which may happen to the task that is delivered again after the worker is lost
+        """
+
+        if isinstance(event_data, list):
+            event = load_event(event_data)
+            if datetime_ is None:
+                return event
+            if await receive_event_version_from_db(event.uuid) == event.updated_at:
+                return event if event.datetime > datetime.now() else None
+            event_uuid = event.uuid
+        else:
+            event_uuid = uuid_pkg.UUID(event_data)
+
+        current_event = await receive_event_for_notifications_from_db(event_uuid)
+        if current_event is None \
+                or (datetime_ and current_event.datetime != datetime.fromisoformat(datetime_)) \
+                or (datetime_ and current_event.datetime <= datetime.now()) \
+                or not current_event.is_active:
+            return None
+
+        return current_event
+
+    async def process(self, event_data: str | list[Any], message_class_name: str,
+                      datetime_: str | None = None,
+                      users_range: tuple[int, int | None] | None = None, planned_at: str | None = None,
+                      task_id: str | None = None, **kwargs: Any) -> dict[str, int] | None:
+        """
+        The method that receives the event, sends notifications about it and returns the numbers
+        of sent and failed notifications or None if sending is split into chunks
+
+        The event is given by the compact payload or by the uuid and the datetime of the reminder.
+        If the time when sending was planned is given, the delay of the start of sending is measured.
+        If the id of the task is given, the progress of sending is kept in the delivery log of this run,
+        and the run that is delivered again doesn't split sending into chunks twice once the chunks are sent
+        """
+
+        if planned_at is not None:
+            lag = (datetime.now() - datetime.fromisoformat(planned_at)).total_seconds()
+            metrics.notifications_lag.labels(message_class_name).observe(lag)
+
+        event = await self.receive_event(event_data, datetime_)
+        if event is None:
+            return None
+
+        delivery_log = None if task_id is None else DeliveryLog(event.uuid, message_class_name, task_id)
+        if users_range is None:
+            boundaries = await receive_subs_to_event_ids_boundaries_from_db(event.uuid,
+                                                                            config.NOTIFICATIONS_CHUNK_SIZE)
+            if len(boundaries) > 1:
+                if delivery_log is None or not delivery_log.is_sharded():
+                    self.shard(event, message_class_name, boundaries, datetime_, task_id, **kwargs)
+                    if delivery_log is not None:
+                        delivery_log.mark_sharded()
+                return None
 
         message_class = EventNotificationEmailMessage.messages_classes[message_class_name]
-        loop.run_until_complete(self.send_notifications(message_class, **kwargs))
+        results = await self.send_notifications(event, message_class, users_range=users_range,
+                                                delivery_log=delivery_log, **kwargs)
+        return summarize_results(results)
+
+    def run(self, event: str | list[Any], message_class_name: str,
+            datetime_: str | None = None, **kwargs: Any) -> dict[str, int] | None:
+        """The method that starts when the event is processed"""
+
+        return event_loop_thread.run(self.process(event, message_class_name, datetime_, task_id=self.request.id,
+                                                  **kwargs))
+
+
+class EmailNotificationsChunkSender(EmailNotificationsSender):
+    """The class that processes sending notifications to the chunk of subscribers to the event"""
+
+    ignore_result = False
+
+
+class NotificationsResultsCombiner(Task):
+    """The class that combines the results of sending notifications by chunks"""
+
+    def run(self, summaries: list[dict[str, int]], event_uuid: str, message_class_name: str) -> dict[str, int]:
+        """The method that starts when all chunks are processed"""
+
+        summary = {'sent': sum(summary['sent'] for summary in summaries),
+                   'failed': sum(summary['failed'] for summary in summaries)}
+        logger.info('Sent %s and failed %s notifications %s about the event %s in %s chunks',
+                    summary['sent'], summary['failed'], message_class_name, event_uuid, len(summaries))
+        return summary
+
+
+class TransactionalEmailSender(Task):
+    """
+    The class that represents the task of sending the transactional email,
+    such as the confirmation of the email or the recovery of the password
+
+    The task is consumed from the separate queue by its own workers, so the transactional emails
+    aren't delayed by notifications and the API processes don't wait for the SMTP relay.
+    The email that hasn't been sent is retried with the growing delay
+    """
+
+    autoretry_for = (Exception,)
+    max_retries = config.TRANSACTIONAL_MAX_RETRIES
+    retry_backoff = True
+
+    async def process(self, message: str) -> None:
+        """The method that sends the serialized email"""
+
+        await send_email(message_from_string(message))
+
+    def run(self, message: str) -> None:
+        """The method that starts when the transactional email is sent"""
+
+        event_loop_thread.run(self.process(message))
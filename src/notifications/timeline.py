@@ -0,0 +1,201 @@
+import datetime
+
+from src.redis_ import redis_engine
+
+POP_DUE_MEMBERS_SCRIPT = """
+local members_with_scores = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+if #members_with_scores > 0 then
+    local members = {}
+    local scores = {}
+    for i = 1, #members_with_scores, 2 do
+        members[#members + 1] = members_with_scores[i]
+        scores[#scores + 1] = members_with_scores[i + 1]
+    end
+    redis.call('ZREM', KEYS[1], unpack(members))
+    redis.call('HDEL', KEYS[2], unpack(scores))
+    redis.call('HDEL', KEYS[3], unpack(members))
+end
+return members_with_scores
+"""
+
+POP_DUE_MEMBERS_WITH_VALUES_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local values = {}
+for i, member in ipairs(members) do
+    values[i] = redis.call('GET', ARGV[3] .. member)
+    redis.call('DEL', ARGV[3] .. member)
+end
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return {members, values}
+"""
+
+ADD_MEMBERS_ONCE_SCRIPT = """
+local tolerance = tonumber(ARGV[1])
+local slot = tonumber(ARGV[2])
+local added = {}
+for i = 4, #KEYS do
+    local j = 2 + (i - 4) * 4
+    if redis.call('SET', KEYS[i], 1, 'NX', 'EX', ARGV[j + 3]) then
+        local target = tonumber(ARGV[j + 2])
+        local score = target
+        if tolerance > 0 then
+            local candidates = {}
+            for candidate = math.ceil((target - tolerance) / slot) * slot, target + tolerance, slot do
+                candidates[#candidates + 1] = candidate
+            end
+            local loads = redis.call('HMGET', KEYS[2], unpack(candidates))
+            local best_load = nil
+            for k, candidate in ipairs(candidates) do
+                local load = tonumber(loads[k]) or 0
+                if best_load == nil or load < best_load
+                        or (load == best_load and math.abs(candidate - target) < math.abs(score - target)) then
+                    best_load, score = load, candidate
+                end
+            end
+            redis.call('HINCRBY', KEYS[2], score, ARGV[j + 4])
+            redis.call('HSET', KEYS[3], ARGV[j + 1], ARGV[j + 4])
+        end
+        redis.call('ZADD', KEYS[1], score, ARGV[j + 1])
+        added[#added + 1] = 1
+    else
+        added[#added + 1] = 0
+    end
+end
+return added
+"""
+
+REMOVE_MEMBER_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local weight = redis.call('HGET', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('DEL', KEYS[4])
+if score then
+    if redis.call('ZCOUNT', KEYS[1], score, score) == 0 then
+        redis.call('HDEL', KEYS[2], score)
+    elseif weight then
+        redis.call('HINCRBY', KEYS[2], score, -tonumber(weight))
+    end
+end
+"""
+
+
+class RedisTimeline:
+    """
+    The class that represents the delayed delivery queue in the form of the sorted set in redis
+
+    Members are sorted by the time when they should be delivered,
+    so adding, moving and removing the member take O(log n).
+    The members that are added once may be spread around their time to the least loaded slots,
+    the load of the slots and the weights of the spread members are kept in the hashes until they are delivered
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.load_name = f'{name}_load'
+        self.weights_name = f'{name}_weights'
+        self.pop_due_members_script = redis_engine.register_script(POP_DUE_MEMBERS_SCRIPT)
+        self.pop_due_members_with_values_script = redis_engine.register_script(POP_DUE_MEMBERS_WITH_VALUES_SCRIPT)
+        self.add_members_once_script = redis_engine.register_script(ADD_MEMBERS_ONCE_SCRIPT)
+        self.remove_member_script = redis_engine.register_script(REMOVE_MEMBER_SCRIPT)
+
+    def create_ledger_key(self, member: str) -> str:
+        """The method that creates the key that marks the member as already added"""
+
+        return f'{self.name}_ledger:{member}'
+
+    def add(self, member: str, datetime_: datetime.datetime) -> None:
+        """The method that adds the member or moves it if it is already in the timeline"""
+
+        redis_engine.zadd(self.name, {member: datetime_.timestamp()})
+
+    def add_many(self, members: list[tuple[str, datetime.datetime]]) -> None:
+        """The method that adds each of the members in the form of (member, datetime) like add in one round trip"""
+
+        redis_engine.zadd(self.name, {member: datetime_.timestamp() for member, datetime_ in members})
+
+    def add_once(self, member: str, datetime_: datetime.datetime, ttl: int) -> bool:
+        """
+        The method that adds the member only if it hasn't been added during the last ttl seconds,
+        returns True if the member is added
+
+        The check and the addition are performed atomically, so the member is added only once
+        even if many processes try to add it at the same time, and even after it has been popped
+        """
+
+        return self.add_many_once([(member, datetime_, ttl, 1)])[0]
+
+    def add_many_once(self, members: list[tuple[str, datetime.datetime, int, int]],
+                      tolerance: int = 0, slot: int = 1) -> list[bool]:
+        """
+        The method that adds each of the members in the form of (member, datetime, ttl, weight)
+        like add_once and returns for each of them True if it is added
+
+        If the tolerance in seconds is given, the member is added to the least loaded of the slots
+        of the given size within the tolerance around its datetime, the nearest one in case of a tie,
+        and the load of this slot grows by the weight of the member.
+        All members are added by one call of the script, so the whole batch takes one round trip to redis
+        """
+
+        if not members:
+            return []
+
+        keys = [self.name, self.load_name, self.weights_name] \
+            + [self.create_ledger_key(member) for member, *_ in members]
+        args = [tolerance, slot] + [arg for member, datetime_, ttl, weight in members
+                                    for arg in (member, datetime_.timestamp(), max(ttl, 1), weight)]
+        return [bool(is_added) for is_added in self.add_members_once_script(keys=keys, args=args)]
+
+    def remove(self, member: str) -> None:
+        """
+        The method that removes the member from the timeline and forgets that it has been added
+
+        The weight of the member is subtracted from the load of its slot,
+        the load is forgotten if there are no other members in it
+        """
+
+        self.remove_member_script(keys=[self.name, self.load_name, self.weights_name, self.create_ledger_key(member)],
+                                  args=[member])
+
+    def receive_datetime(self, member: str) -> datetime.datetime | None:
+        """The method that returns the time when the member should be delivered"""
+
+        timestamp = redis_engine.zscore(self.name, member)
+        if timestamp is None:
+            return None
+
+        return datetime.datetime.fromtimestamp(timestamp)
+
+    def pop_due_with_datetimes(self, datetime_: datetime.datetime, count: int) -> list[tuple[str, datetime.datetime]]:
+        """
+        The method that removes and returns the members that should be delivered by the given time
+        together with the time when they should have been delivered
+
+        The members are received and removed atomically, so each of them is returned only once
+        """
+
+        members_with_scores = self.pop_due_members_script(keys=[self.name, self.load_name, self.weights_name],
+                                                          args=[datetime_.timestamp(), count])
+        return [(member, datetime.datetime.fromtimestamp(float(timestamp)))
+                for member, timestamp in zip(members_with_scores[::2], members_with_scores[1::2])]
+
+    def pop_due(self, datetime_: datetime.datetime, count: int) -> list[str]:
+        """The method that removes and returns the members that should be delivered by the given time"""
+
+        return [member for member, _ in self.pop_due_with_datetimes(datetime_, count)]
+
+    def pop_due_with_values(self, datetime_: datetime.datetime, count: int,
+                            values_prefix: str) -> list[tuple[str, str | None]]:
+        """
+        The method that removes and returns the members that should be delivered by the given time
+        together with the values of the keys that are named by the prefix and the member, and deletes these keys
+
+        The members and the values are received and removed atomically, so the value that is set
+        after the member is popped belongs to the member that is added after it
+        """
+
+        members, values = self.pop_due_members_with_values_script(keys=[self.name],
+                                                                  args=[datetime_.timestamp(), count, values_prefix])
+        return list(zip(members, values))
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import threading
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Coroutine, Any, TypeVar
+
+Item = TypeVar('Item')
+Result = TypeVar('Result')
+
+_STOP = object()
+
+
+async def fan_out(items: AsyncIterable[Item],
+                  handler: Callable[[Item], Awaitable[Result]],
+                  concurrency: int) -> list[Result]:
+    """
+    The function that processes the items by the fixed number of concurrent workers
+    and returns the results of the handler in the order of completion
+
+    The next item is pulled from the iterable only when there is free space in the queue,
+    so no more than twice the concurrency of items is kept in memory at the same time
+    """
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    results: list[Result] = []
+
+    async def produce() -> None:
+        async for item in items:
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(_STOP)
+
+    async def work() -> None:
+        while (item := await queue.get()) is not _STOP:
+            results.append(await handler(item))
+
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return results
+
+
+async def batch(items: AsyncIterable[Item], size: int) -> AsyncIterator[list[Item]]:
+    """The function that groups the items into lists of the given size, the last list may be shorter"""
+
+    items_batch: list[Item] = []
+    async for item in items:
+        items_batch.append(item)
+        if len(items_batch) == size:
+            yield items_batch
+            items_batch = []
+
+    if items_batch:
+        yield items_batch
+
+
+class EventLoopThread:
+    """
+    The class that runs the long-lived event loop in the separate thread of the worker
+
+    Coroutines of all tasks of the worker are executed in this loop, so they share
+    the pools of database and SMTP connections and their I/O overlaps.
+    The thread doesn't survive the fork, so the process that is forked from the one with the started loop,
+    such as the child of the prefork pool, starts its own loop when it runs the first coroutine
+    """
+
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.pid: int | None = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        """The method that starts the event loop"""
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='notifications-event-loop', daemon=True)
+        self.thread.start()
+        self.pid = os.getpid()
+
+    def stop(self) -> None:
+        """The method that stops the event loop, if it is started, and waits for the thread to finish"""
+
+        if self.loop is None:
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()  # type: ignore
+        self.loop.close()
+        self.loop, self.thread, self.pid = None, None, None
+
+    def run(self, coroutine: Coroutine[Any, Any, Result]) -> Result:
+        """
+        The method that executes the coroutine in the event loop and returns its result
+
+        If the event loop isn't started (outside the worker), the coroutine is executed in the current event loop
+        """
+
+        if self.loop is None:
+            return asyncio.get_event_loop().run_until_complete(coroutine)
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+
+event_loop_thread = EventLoopThread()
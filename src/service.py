@@ -1,8 +1,8 @@
 import json
 import uuid as uuid_pkg
-from typing import Any, TypeVar
+from email.message import Message
+from typing import Any, TypeVar, Sequence
 
-import aiosmtplib
 from fastapi_filter.contrib.sqlalchemy import Filter
 from pydantic import BaseModel
 from sqlalchemy import select, update, delete
@@ -11,8 +11,7 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql.elements import BinaryExpression
 from sqlmodel import SQLModel
 
-import src
-from src import database, config
+from src import database, config, smtp_, metrics
 from src.redis_ import redis_engine
 from src.sfp import SortingFilteringPaging
 from src.utils import EmailMessage
@@ -88,12 +87,24 @@ def is_user_in_blacklist(user_id: int) -> bool:
     return redis_engine.sismember(config.USERS_BLACKLIST_NAME, user_id)
 
 
-async def send_email(message: EmailMessage) -> None:
-    """The function that sends email"""
+async def send_email(message: EmailMessage | Message, recipients: Sequence[str] | None = None) -> None:
+    """
+    The function that sends email through the pool of SMTP connections and measures the time of sending
+
+    If the recipients aren't given, they are taken from the headers of the message
+    """
+
+    if isinstance(message, EmailMessage):
+        message = message.create()
+
+    try:
+        with metrics.smtp_send_duration.time():
+            await smtp_.smtp_pool.send_message(message, recipients)
+    except Exception:
+        metrics.emails_sent.labels('failed').inc()
+        raise
 
-    async with aiosmtplib.SMTP(hostname=src.config.EMAIL_HOST, port=src.config.EMAIL_PORT) as server:
-        await server.login(src.config.EMAIL_LOCAL_ADDRESS, src.config.EMAIL_PASSWORD)
-        await server.send_message(message.create())
+    metrics.emails_sent.labels('sent').inc()
 
 
 def set_unconfirmed_email_data(confirmation_uuid: uuid_pkg.UUID, data: SQLModelSubClass) -> None:
@@ -0,0 +1,257 @@
+import asyncio
+import contextlib
+import itertools
+import time
+from email.message import Message
+from typing import AsyncIterator, Sequence
+
+import aiosmtplib
+
+from src import config, metrics
+from src.redis_ import redis_engine
+
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated_at, 0) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return {tostring(math.max(-tokens, 0) / rate), tostring(tokens)}
+"""
+
+
+class TokenBucket:
+    """
+    The class that paces sending messages through the relay by the token bucket in redis shared by all workers
+
+    The bucket is refilled at the sustained rate up to the burst size. Each message takes the token,
+    and if the bucket is empty, the token is reserved and the sender waits until it is refilled,
+    so the waiting senders are served in the order of reservation
+    """
+
+    def __init__(self, relay: str, rate: float, burst: int) -> None:
+        self.relay = relay
+        self.name = f'{config.SMTP_RATE_LIMIT_NAME}:{relay}'
+        self.rate = rate
+        self.burst = burst
+        self.take_token_script = redis_engine.register_script(TAKE_TOKEN_SCRIPT)
+
+    def take_token(self) -> float:
+        """The method that takes the token and returns the number of seconds to wait until it is available"""
+
+        delay, tokens = self.take_token_script(keys=[self.name], args=[self.rate, self.burst])
+        metrics.smtp_rate_limit_tokens.labels(self.relay).set(float(tokens))
+        return float(delay)
+
+    async def acquire(self) -> None:
+        """
+        The method that waits until the token is available
+
+        The token is taken in the thread of the default executor, so the event loop isn't blocked by redis
+        """
+
+        delay = await asyncio.get_running_loop().run_in_executor(None, self.take_token)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SMTPConnection:
+    """The class that represents the authenticated connection to the SMTP relay"""
+
+    def __init__(self, hostname: str, port: int) -> None:
+        self.hostname = hostname
+        self.port = port
+        self.client = aiosmtplib.SMTP(hostname=hostname, port=port)
+        self.messages_count = 0
+        self.last_used_at = 0.0
+
+    @property
+    def is_exhausted(self) -> bool:
+        """The property that shows that the connection has sent the maximum number of messages"""
+
+        return self.messages_count >= config.SMTP_MAX_MESSAGES_PER_CONNECTION
+
+    async def open(self) -> None:
+        """The method that connects to the relay and logs in"""
+
+        await self.client.connect()
+        await self.client.login(config.EMAIL_LOCAL_ADDRESS, config.EMAIL_PASSWORD)  # type: ignore
+        self.last_used_at = time.monotonic()
+
+    async def close(self) -> None:
+        """The method that closes the connection, if possible, politely"""
+
+        try:
+            await self.client.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            self.client.close()
+
+    async def is_healthy(self) -> bool:
+        """
+        The method that checks that the connection can still be used
+
+        The relay is asked only if the connection has been idle for a long time
+        """
+
+        if not self.client.is_connected:
+            return False
+        if time.monotonic() - self.last_used_at < config.SMTP_HEALTH_CHECK_INTERVAL:
+            return True
+
+        try:
+            await self.client.noop()
+        except (aiosmtplib.SMTPException, OSError):
+            return False
+        return True
+
+    @property
+    def host(self) -> tuple[str, int]:
+        """The property that returns the address of the relay of the connection"""
+
+        return self.hostname, self.port
+
+    async def send_message(self, message: Message, recipients: Sequence[str] | None = None) -> None:
+        """The method that sends the message through this connection"""
+
+        await self.client.send_message(message, recipients=recipients)
+        self.messages_count += 1
+        self.last_used_at = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    The class that keeps a bounded number of long-lived authenticated connections to the SMTP relays
+
+    Messages are sent through the relays in turn, so the load is spread between them
+    and the unavailable relay is skipped. Sending through each relay is limited by its own token bucket.
+    The number of open connections, both idle and lent, doesn't exceed the size of the pool
+    """
+
+    def __init__(self, hosts: list[tuple[str, int]], size: int) -> None:
+        self.hosts = hosts
+        self.buckets = {(hostname, port): TokenBucket(f'{hostname}:{port}', config.SMTP_RATE, config.SMTP_BURST)
+                        for hostname, port in hosts}
+        self.size = size
+        self.idle_connections: list[SMTPConnection] = []
+        self.lent_connections_count = 0
+        self.semaphore = asyncio.Semaphore(size)
+        self.hosts_cycle = itertools.cycle(hosts)
+
+    async def open_connection(self, host: tuple[str, int]) -> SMTPConnection:
+        """The method that opens the connection to the given relay or, if it is unavailable, to the next available"""
+
+        error: Exception | None = None
+        index = self.hosts.index(host)
+        for available_host in self.hosts[index:] + self.hosts[:index]:
+            connection = SMTPConnection(*available_host)
+            try:
+                await connection.open()
+            except (aiosmtplib.SMTPException, OSError) as e:
+                connection.client.close()
+                error = e
+            else:
+                return connection
+
+        raise error  # type: ignore
+
+    async def receive_connection(self, host: tuple[str, int]) -> SMTPConnection:
+        """
+        The method that returns the healthy idle connection to the relay or opens a new one
+
+        The oldest idle connection to another relay is closed if there is no room for the new one
+        """
+
+        while idle_connection := next((connection for connection in reversed(self.idle_connections)
+                                       if connection.host == host), None):
+            self.idle_connections.remove(idle_connection)
+            if await idle_connection.is_healthy():
+                return idle_connection
+            idle_connection.client.close()
+
+        if self.idle_connections and len(self.idle_connections) + self.lent_connections_count > self.size:
+            await self.idle_connections.pop(0).close()
+        return await self.open_connection(host)
+
+    @contextlib.asynccontextmanager
+    async def connection(self, host: tuple[str, int]) -> AsyncIterator[SMTPConnection]:
+        """
+        The method that lends the connection to the relay from the pool
+
+        The connection is not returned to the pool if an error has occurred while using it
+        or if it has sent the maximum number of messages
+        """
+
+        async with self.semaphore:
+            self.lent_connections_count += 1
+            try:
+                connection = await self.receive_connection(host)
+                try:
+                    yield connection
+                except BaseException:
+                    connection.client.close()
+                    raise
+            finally:
+                self.lent_connections_count -= 1
+
+            if connection.is_exhausted:
+                await connection.close()
+            else:
+                self.idle_connections.append(connection)
+
+    async def send_message(self, message: Message, recipients: Sequence[str] | None = None) -> None:
+        """
+        The method that sends the message through one of the pooled connections to the next relay
+        at the rate allowed by this relay
+
+        The token is taken before the connection is borrowed, so the senders that wait for the token
+        don't hold the connections. If the relay has dropped the connection, the message is sent
+        once again through another one without taking another token
+        """
+
+        host = next(self.hosts_cycle)
+        await self.buckets[host].acquire()
+        try:
+            async with self.connection(host) as connection:
+                await connection.send_message(message, recipients)
+        except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+            async with self.connection(host) as connection:
+                await connection.send_message(message, recipients)
+
+    async def close(self) -> None:
+        """The method that closes all idle connections"""
+
+        connections, self.idle_connections = self.idle_connections, []
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+
+def parse_hosts(hosts: str) -> list[tuple[str, int]]:
+    """The function that parses the comma-separated addresses of the relays in the form of 'host:port'"""
+
+    parsed_hosts = []
+    for address in hosts.split(','):
+        hostname, port = address.strip().rsplit(':', 1)
+        parsed_hosts.append((hostname, int(port)))
+
+    return parsed_hosts
+
+
+smtp_pool: SMTPConnectionPool = None  # type: ignore
+
+
+def smtp_start_up() -> None:
+    """The function that processes the start of the SMTP interaction"""
+
+    global smtp_pool
+    hosts = config.EMAIL_HOSTS or f'{config.EMAIL_HOST}:{config.EMAIL_PORT}'
+    smtp_pool = SMTPConnectionPool(parse_hosts(hosts), config.SMTP_POOL_SIZE)
+
+
+async def smtp_shut_down() -> None:
+    """The function that processes the stop of the SMTP interaction"""
+
+    await smtp_pool.close()
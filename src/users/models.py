@@ -1,6 +1,8 @@
+import datetime
 import re
 
 from pydantic import validator, EmailStr
+from sqlalchemy import Column, ForeignKey, Integer
 from sqlmodel import SQLModel, Field
 
 from src.users.utils import get_random_string, hash_password
@@ -52,6 +54,7 @@ class User(UserBaseWithEmail, UserBaseWithPassword, table=True):
     id: int | None = Field(default=None, primary_key=True)
     is_government_worker: bool = False
     email: EmailStr = Field(unique=True)
+    notifications_digest: bool = False
 
 
 class UserCreate(UserBaseWithEmail, UserBaseWithPassword, UserValidator):
@@ -68,10 +71,42 @@ class UserRead(UserBaseWithEmail):
     """The model that represents the fields which will be returned by API"""
 
     is_government_worker: bool
+    notifications_digest: bool
 
 
 class UserUpdate(UserBaseWithPassword, UserValidator, ChangesAreNotEmptyMixin):
-    """The model that represents the fields needed to change the user"""
+    """
+    The model that represents the fields needed to change the user
+
+    The user who enables the 'notifications_digest' receives reminders about the events
+    of the day in one email instead of separate notifications
+    """
 
     __annotations__ = {k: v | None for k, v in
-                       (UserBase.__annotations__ | UserBaseWithPassword.__annotations__).items()}
+                       (UserBase.__annotations__ | UserBaseWithPassword.__annotations__
+                        | {'notifications_digest': bool}).items()}
+
+
+class UserReminderOptOut(SQLModel, table=True):
+    """
+    The model that represents the refusal of the user to receive the reminders with the offset in the database
+
+    The offset is the number of seconds between the reminder and the event. It goes first in the primary key,
+    so the refusals of the reminders that are sent at the same time before the events are stored in one range
+    of the index, and the recipients of the reminder are filtered by this range without loading the refused users.
+    The refusals of one user are received by the separate index on the user id
+    """
+
+    reminder_offset: int = Field(sa_column=Column(Integer, primary_key=True))
+    user_id: int = Field(
+        sa_column=Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True, index=True))
+
+
+class ReminderPreference(SQLModel):
+    """
+    The model that represents the choice of the user whether to receive the reminders,
+    which are sent the offset before the events
+    """
+
+    offset: datetime.timedelta
+    is_enabled: bool
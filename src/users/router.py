@@ -2,17 +2,19 @@ import uuid as uuid_pkg
 from typing import Annotated
 
 from asyncpg.exceptions import UniqueViolationError
-from fastapi import APIRouter, HTTPException, status, Depends, Body, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Request
 from pydantic import EmailStr
 
 from src.dependencies import authorize_user
+from src.notifications.celery_ import TransactionalEmailSender
+from src.notifications.service import REMINDERS
 from src.service import update_models, delete_models, create_model, receive_model, receive_unconfirmed_email_data, \
-    set_unconfirmed_email_data, send_email, delete_unconfirmed_email_data
+    set_unconfirmed_email_data, delete_unconfirmed_email_data
 from src.users import config
 from src.users.email_messages import ConfirmUserEmailEmailMessage, RecoveryPasswordEmailMessage
-from src.users.models import UserCreate, User, UserRead, UserUpdate
+from src.users.models import UserCreate, User, UserRead, UserUpdate, ReminderPreference
 from src.users.service import add_user_to_blacklist, set_password_recovery_data, receive_password_recovery_data, \
-    delete_password_recovery_data
+    delete_password_recovery_data, receive_user_reminders_opt_outs_from_db, update_user_reminders_opt_outs_in_db
 
 users_router = APIRouter(
     prefix='/users',
@@ -23,7 +25,7 @@ AuthorizeUserDep = Annotated[int, Depends(authorize_user())]
 
 
 @users_router.post('/', status_code=status.HTTP_204_NO_CONTENT)
-async def create_user(user_data: UserCreate, background_task: BackgroundTasks) -> None:
+async def create_user(user_data: UserCreate) -> None:
     """
     The view that processes creation the user (registration)
 
@@ -43,7 +45,8 @@ async def create_user(user_data: UserCreate, background_task: BackgroundTasks) -
 
     confirmation_uuid = uuid_pkg.uuid4()
     set_unconfirmed_email_data(confirmation_uuid, user)
-    background_task.add_task(send_email, ConfirmUserEmailEmailMessage(user, confirmation_uuid))
+    message = ConfirmUserEmailEmailMessage(user, confirmation_uuid)
+    TransactionalEmailSender.apply_async(args=(message.create().as_string(),))
 
 
 @users_router.get('/self/')
@@ -70,6 +73,41 @@ async def delete_user(user_id: AuthorizeUserDep) -> None:
     add_user_to_blacklist(user_id)
 
 
+@users_router.get('/self/reminders/')
+async def receive_reminders_preferences(user_id: AuthorizeUserDep) -> list[ReminderPreference]:
+    """The view that processes getting the choice of the user for each of the reminders"""
+
+    refused_offsets = await receive_user_reminders_opt_outs_from_db(user_id)
+    return [ReminderPreference(offset=offset, is_enabled=int(offset.total_seconds()) not in refused_offsets)
+            for _, offset in REMINDERS]
+
+
+@users_router.patch('/self/reminders/')
+async def update_reminders_preferences(preferences: list[ReminderPreference],
+                                       user_id: AuthorizeUserDep) -> list[ReminderPreference]:
+    """
+    The view that processes changing the choice of the user for the given reminders
+
+    The reminders that aren't given keep the previous choice
+    """
+
+    offsets = {offset for _, offset in REMINDERS}
+    for index, preference in enumerate(preferences):
+        if preference.offset not in offsets:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=[{'loc': ['body', index, 'offset'],
+                                         'msg': 'there is no reminder with this offset',
+                                         'type': 'value_error'}])
+
+    await update_user_reminders_opt_outs_in_db(
+        user_id,
+        refused_offsets=[int(preference.offset.total_seconds()) for preference in preferences
+                         if not preference.is_enabled],
+        accepted_offsets=[int(preference.offset.total_seconds()) for preference in preferences
+                          if preference.is_enabled])
+    return await receive_reminders_preferences(user_id)
+
+
 @users_router.post('/email-confirmation/', status_code=status.HTTP_201_CREATED)
 async def confirm_email(confirmation_uuid: Annotated[uuid_pkg.UUID, Body(embed=True)]) -> UserRead:
     """The view that processes email confirmation and, if successful, creates the user"""
@@ -93,9 +131,7 @@ async def confirm_email(confirmation_uuid: Annotated[uuid_pkg.UUID, Body(embed=T
 
 
 @users_router.post('/password-recovery/', status_code=status.HTTP_204_NO_CONTENT)
-async def send_recovery_uuid(email: Annotated[EmailStr, Body(embed=True)],
-                             background_task: BackgroundTasks,
-                             request: Request) -> None:
+async def send_recovery_uuid(email: Annotated[EmailStr, Body(embed=True)], request: Request) -> None:
     """The view that processes password recovery sends the email message with the recovery link"""
 
     user = await receive_model(User, User.email == email)  # type: ignore
@@ -108,7 +144,8 @@ async def send_recovery_uuid(email: Annotated[EmailStr, Body(embed=True)],
     set_password_recovery_data(recovery_uuid, user.id)  # type: ignore
 
     recovery_url = str(request.url) + str(recovery_uuid) + '/'
-    background_task.add_task(send_email, RecoveryPasswordEmailMessage(user, recovery_url))
+    message = RecoveryPasswordEmailMessage(user, recovery_url)
+    TransactionalEmailSender.apply_async(args=(message.create().as_string(),))
 
 
 @users_router.post('/password-recovery/{recovery_uuid}/', status_code=status.HTTP_204_NO_CONTENT)
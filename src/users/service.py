@@ -1,7 +1,12 @@
 import uuid as uuid_pkg
+from typing import Iterable
 
-from src import config
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from src import config, database
 from src.redis_ import redis_engine
+from src.users.models import UserReminderOptOut
 
 
 def add_user_to_blacklist(user_id: int) -> None:
@@ -31,3 +36,31 @@ def delete_password_recovery_data(recovery_uuid: uuid_pkg.UUID) -> None:
     """The function that deletes the user id for password recovery from redis"""
 
     redis_engine.delete(str(recovery_uuid))
+
+
+async def receive_user_reminders_opt_outs_from_db(user_id: int) -> set[int]:
+    """The function that returns the offsets in seconds of the reminders which the user has refused"""
+
+    query = select(UserReminderOptOut.reminder_offset).where(UserReminderOptOut.user_id == user_id)
+    async with database.Session() as session:
+        return set((await session.scalars(query)).all())
+
+
+async def update_user_reminders_opt_outs_in_db(user_id: int, refused_offsets: Iterable[int],
+                                               accepted_offsets: Iterable[int]) -> None:
+    """
+    The function that records the refusals of the user to receive the reminders with the refused offsets in seconds
+    and removes the refusals of the reminders with the accepted ones in one transaction
+    """
+
+    refused_offsets, accepted_offsets = list(refused_offsets), list(accepted_offsets)
+    async with database.Session() as session, session.begin():
+        if accepted_offsets:
+            await session.execute(delete(UserReminderOptOut)
+                                  .where(UserReminderOptOut.user_id == user_id,
+                                         UserReminderOptOut.reminder_offset.in_(accepted_offsets)))  # type: ignore
+        if refused_offsets:
+            await session.execute(insert(UserReminderOptOut)
+                                  .values([{'reminder_offset': offset, 'user_id': user_id}
+                                           for offset in refused_offsets])
+                                  .on_conflict_do_nothing())
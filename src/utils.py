@@ -27,6 +27,53 @@ class ChangesAreNotEmptyMixin(SQLModel):
         return values
 
 
+class Recipient(typing.Protocol):
+    """
+    The protocol of the recipient of the email, such as the user or the row of the user with only the columns
+    needed to create the message
+    """
+
+    @property
+    def email(self) -> str: ...
+
+    @property
+    def first_name(self) -> str: ...
+
+    @property
+    def patronymic(self) -> str: ...
+
+
+def create_welcome_message(user: Recipient | None) -> str:
+    """The function that creates the greeting of the email for the given user"""
+
+    if user is None:
+        return f'Здравствуйте!\n'
+    return f'Здравствуйте, {user.first_name} {user.patronymic}!\n'
+
+
+class EmailMessageTemplate:
+    """
+    The class that represents the part of the email that doesn't depend on the recipient
+
+    This allows to render the payload once and to send it to many users
+    """
+
+    def __init__(self, subject: str, payload: str) -> None:
+        self.subject = subject
+        self.payload = payload
+
+    def create(self, user: Recipient | None) -> MIMEText:
+        """The method that creates a message for the given user ready to be sent"""
+
+        message = MIMEText(create_welcome_message(user) + self.payload)
+        message['Subject'] = self.subject
+        message['From'] = src.config.EMAIL_LOCAL_ADDRESS
+        if user is not None:
+            message['To'] = user.email
+
+        return message
+
+
 class EmailMessage(ABC):
     """The base class that processes the creation of the email"""
 
@@ -35,24 +82,18 @@ class EmailMessage(ABC):
         self.subject = subject
 
     def create_welcome_message(self) -> str:
-        if self.user is None:
-            return f'Здравствуйте!\n'
-        return f'Здравствуйте, {self.user.first_name} {self.user.patronymic}!\n'
+        return create_welcome_message(self.user)
 
     @abstractmethod
     def create_payload(self) -> str:
         """The method that creates the content of the message"""
 
-    def create(self) -> MIMEText:
-        """The method that creates a message ready to be sent"""
+    def create_template(self) -> EmailMessageTemplate:
+        """The method that creates the template of the message with the rendered payload"""
 
-        welcome_message = self.create_welcome_message()
-        payload = welcome_message + self.create_payload()
+        return EmailMessageTemplate(self.subject, self.create_payload())
 
-        message = MIMEText(payload)
-        message['Subject'] = self.subject
-        message['From'] = src.config.EMAIL_LOCAL_ADDRESS
-        if self.user is not None:
-            message['To'] = self.user.email
+    def create(self) -> MIMEText:
+        """The method that creates a message ready to be sent"""
 
-        return message
+        return self.create_template().create(self.user)
@@ -1,16 +1,20 @@
 import json
 import uuid as uuid_pkg
+from email.mime.text import MIMEText
 
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import patch, AsyncMock
 
 from asyncpg import UniqueViolationError
+from prometheus_client import REGISTRY
 from sqlalchemy import insert, select, text
 from sqlmodel import SQLModel
 
 from src.events.models import Event
 from src.redis_ import redis_engine
 from src.service import execute_db_query, create_model, receive_model, update_models, delete_models, \
-    is_user_in_blacklist, set_unconfirmed_email_data, receive_unconfirmed_email_data, delete_unconfirmed_email_data
+    is_user_in_blacklist, set_unconfirmed_email_data, receive_unconfirmed_email_data, delete_unconfirmed_email_data, \
+    send_email
 from src.users.models import User, UserUpdate
 from tests import config
 from tests.service import DBProcessedIsolatedAsyncTestCase
@@ -167,3 +171,15 @@ class TestDeleteUnconfirmedEmailData(TestCase):
 
         result = redis_engine.get(f'{confirmation_uuid}-User')
         self.assertIsNone(result)
+
+
+class TestSendEmail(IsolatedAsyncioTestCase):
+
+    async def test_failed_sending_is_counted(self) -> None:
+        failed_count = REGISTRY.get_sample_value('emails_sent_total', {'status': 'failed'}) or 0
+        with patch('src.service.smtp_.smtp_pool') as mock:
+            mock.send_message = AsyncMock(side_effect=ConnectionError)
+            with self.assertRaises(ConnectionError):
+                await send_email(MIMEText('payload'))
+
+        self.assertEqual(REGISTRY.get_sample_value('emails_sent_total', {'status': 'failed'}), failed_count + 1)
@@ -0,0 +1,148 @@
+from email.mime.text import MIMEText
+from typing import Any
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import aiosmtplib
+from prometheus_client import REGISTRY
+
+from src.redis_ import redis_engine
+from src.smtp_ import SMTPConnectionPool, parse_hosts, TokenBucket
+
+
+def create_smtp_client_mock(*args: Any, **kwargs: Any) -> MagicMock:
+    client = MagicMock()
+    client.connect = AsyncMock()
+    client.login = AsyncMock()
+    client.quit = AsyncMock()
+    client.noop = AsyncMock()
+    client.send_message = AsyncMock()
+    client.is_connected = True
+    return client
+
+
+class TestSMTPConnectionPool(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.message = MIMEText('payload')
+
+    async def test_connection_is_reused(self) -> None:
+        pool = SMTPConnectionPool([('localhost', 25)], 2)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=create_smtp_client_mock) as mock:
+            await pool.send_message(self.message)
+            await pool.send_message(self.message)
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(len(pool.idle_connections), 1)
+        self.assertEqual(pool.idle_connections[0].messages_count, 2)
+
+    async def test_exhausted_connection_is_closed(self) -> None:
+        pool = SMTPConnectionPool([('localhost', 25)], 2)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=create_smtp_client_mock) as mock, \
+                patch('src.smtp_.config.SMTP_MAX_MESSAGES_PER_CONNECTION', 1):
+            await pool.send_message(self.message)
+            await pool.send_message(self.message)
+
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(pool.idle_connections, [])
+
+    async def test_reconnection_after_disconnect(self) -> None:
+        clients = [create_smtp_client_mock(), create_smtp_client_mock()]
+        clients[0].send_message.side_effect = aiosmtplib.SMTPServerDisconnected('disconnected')
+        pool = SMTPConnectionPool([('localhost', 25)], 2)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=clients):
+            await pool.send_message(self.message)
+
+        self.assertTrue(clients[0].close.called)
+        self.assertTrue(clients[1].send_message.called)
+        self.assertEqual(len(pool.idle_connections), 1)
+
+    async def test_token_is_taken_once_before_borrowing_connection(self) -> None:
+        clients = [create_smtp_client_mock(), create_smtp_client_mock()]
+        clients[0].send_message.side_effect = aiosmtplib.SMTPServerDisconnected('disconnected')
+        pool = SMTPConnectionPool([('localhost', 25)], 2)
+        bucket = pool.buckets[('localhost', 25)]
+        with patch.object(bucket, 'acquire', side_effect=lambda: self.assertEqual(pool.semaphore._value, 2)) as mock, \
+                patch('src.smtp_.aiosmtplib.SMTP', side_effect=clients):
+            await pool.send_message(self.message)
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertTrue(clients[1].send_message.called)
+
+    async def test_idle_connection_to_other_relay_is_closed_if_pool_is_full(self) -> None:
+        pool = SMTPConnectionPool([('first', 25), ('second', 25)], 1)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=create_smtp_client_mock):
+            await pool.send_message(self.message)
+            with patch.object(pool.idle_connections[0].client, 'quit', new_callable=AsyncMock) as quit_mock:
+                await pool.send_message(self.message)
+
+        self.assertTrue(quit_mock.called)
+        self.assertEqual([connection.hostname for connection in pool.idle_connections], ['second'])
+
+    async def test_unhealthy_connection_is_replaced(self) -> None:
+        pool = SMTPConnectionPool([('localhost', 25)], 2)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=create_smtp_client_mock) as mock:
+            await pool.send_message(self.message)
+            with patch.object(pool.idle_connections[0].client, 'is_connected', False):
+                await pool.send_message(self.message)
+
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(len(pool.idle_connections), 1)
+
+    async def test_unavailable_host_is_skipped(self) -> None:
+        clients = [create_smtp_client_mock(), create_smtp_client_mock()]
+        clients[0].connect.side_effect = aiosmtplib.SMTPConnectError('unavailable')
+        pool = SMTPConnectionPool([('first', 25), ('second', 25)], 2)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=clients) as mock:
+            await pool.send_message(self.message)
+
+        self.assertEqual(mock.call_args_list[1].kwargs['hostname'], 'second')
+        self.assertEqual(pool.idle_connections[0].hostname, 'second')
+
+    async def test_closing(self) -> None:
+        pool = SMTPConnectionPool([('localhost', 25)], 2)
+        with patch('src.smtp_.aiosmtplib.SMTP', side_effect=create_smtp_client_mock):
+            await pool.send_message(self.message)
+            with patch.object(pool.idle_connections[0].client, 'quit', new_callable=AsyncMock) as quit_mock:
+                await pool.close()
+
+        self.assertTrue(quit_mock.called)
+        self.assertEqual(pool.idle_connections, [])
+
+
+class TestTokenBucket(TestCase):
+
+    def setUp(self) -> None:
+        self.bucket = TokenBucket('test:25', 1, 2)
+
+    def tearDown(self) -> None:
+        redis_engine.delete(self.bucket.name)
+
+    def test_burst_is_not_delayed(self) -> None:
+        self.assertEqual(self.bucket.take_token(), 0)
+        self.assertEqual(self.bucket.take_token(), 0)
+        tokens = REGISTRY.get_sample_value('smtp_rate_limit_tokens', {'relay': 'test:25'})
+        assert tokens is not None
+        self.assertAlmostEqual(tokens, 0, delta=0.1)
+
+    def test_empty_bucket_delays_at_sustained_rate(self) -> None:
+        for _ in range(2):
+            self.bucket.take_token()
+
+        self.assertAlmostEqual(self.bucket.take_token(), 1, delta=0.1)
+        self.assertAlmostEqual(self.bucket.take_token(), 2, delta=0.1)
+
+    def test_bucket_is_shared_by_name(self) -> None:
+        other_bucket = TokenBucket('test:25', 1, 2)
+        self.bucket.take_token()
+        other_bucket.take_token()
+
+        self.assertAlmostEqual(self.bucket.take_token(), 1, delta=0.1)
+
+
+class TestParseHosts(TestCase):
+
+    def test_parsing(self) -> None:
+        expected_result = [('smtp.example.com', 587), ('smtp2.example.com', 25)]
+        result = parse_hosts('smtp.example.com:587, smtp2.example.com:25')
+        self.assertEqual(result, expected_result)
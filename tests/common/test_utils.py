@@ -1,7 +1,7 @@
 from unittest import TestCase
 
 from src.users.models import User, UserUpdate
-from src.utils import ChangesAreNotEmptyMixin, EmailMessage
+from src.utils import ChangesAreNotEmptyMixin, EmailMessage, EmailMessageTemplate
 
 
 class TestChangeAreNotEmptyMixin(TestCase):
@@ -48,3 +48,21 @@ class TestEmailMessage(TestCase):
 
         result = message.create()['To']
         self.assertIsNotNone(result)
+
+
+class TestEmailMessageTemplate(TestCase):
+
+    def test_create_user_is_None(self) -> None:
+        message = EmailMessageTemplate('subject', 'payload').create(None)
+
+        self.assertIsNone(message['To'])
+        self.assertEqual(message.get_payload(decode=True).decode(), 'Здравствуйте!\npayload')
+
+    def test_create_user_is_not_None(self) -> None:
+        user = User(first_name='Имя', last_name='Фамилия', patronymic='Отчество',
+                    email='example@example1.com', password='Example123')
+        message = EmailMessageTemplate('subject', 'payload').create(user)
+
+        self.assertEqual(message['To'], 'example@example1.com')
+        self.assertEqual(message['Subject'], 'subject')
+        self.assertEqual(message.get_payload(decode=True).decode(), 'Здравствуйте, Имя Отчество!\npayload')
@@ -8,3 +8,13 @@ TEST_DATABASE_URL = f'postgresql+asyncpg://{TEST_DATABASE_USER}@{TEST_DATABASE_H
                     f'{TEST_DATABASE_PORT}/{TEST_DATABASE_NAME}'
 
 TEST_USERS_BLACKLIST_NAME = 'test_users_blacklist_name'
+TEST_SMTP_RATE_LIMIT_NAME = 'test_smtp_rate_limit'
+
+TEST_REMINDERS_TIMELINE_NAME = 'test_reminders_timeline'
+TEST_REMINDERS_RECONCILED_AT_NAME = 'test_reminders_reconciled_at'
+TEST_CHANGES_TIMELINE_NAME = 'test_event_changes_timeline'
+TEST_RETRIES_TIMELINE_NAME = 'test_retries_timeline'
+TEST_RETRIES_DEAD_LETTERS_NAME = 'test_retries_dead_letters'
+TEST_SCHEDULER_LEASE_NAME = 'test_scheduler_leader'
+TEST_SCHEDULER_LAST_RUNS_NAME = 'test_scheduler_last_runs'
+TEST_DELIVERY_LOG_NAME = 'test_notifications_delivery_log'
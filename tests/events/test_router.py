@@ -2,6 +2,7 @@ import datetime
 import uuid as uuid_pkg
 from unittest.mock import patch
 
+import redis  # type: ignore
 from fastapi_jwt_auth import AuthJWT
 from sqlalchemy import insert, select, delete, update
 from starlette.testclient import TestClient
@@ -25,7 +26,7 @@ class TestCreateEvent(DBProcessedIsolatedAsyncTestCase):
             await session.execute(insert(GovStructure).values(uuid=uuid, name='gov structure',
                                                               email='example@gmail.com'))
 
-        with TestClient(app=app) as client:
+        with patch('src.events.router.schedule_reminders_for_event') as mock, TestClient(app=app) as client:
             response = client.post('/events/', headers={'Authorization': f'Bearer {self.token}'},
                                    json={'name': 'event',
                                          'datetime': '2020-01-01T00:00:00',
@@ -55,6 +56,26 @@ class TestCreateEvent(DBProcessedIsolatedAsyncTestCase):
         async with self.Session() as session:
             event = await session.scalar(select(Event).where(Event.uuid == event_uuid))
         self.assertIsNotNone(event)
+        self.assertEqual(str(mock.call_args.args[0].uuid), event_uuid)
+
+    async def test_scheduling_error_doesnt_fail_creating(self) -> None:
+        uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+
+        with patch('src.events.router.schedule_reminders_for_event', side_effect=redis.ConnectionError), \
+                patch('src.events.router.logger') as logger_mock, TestClient(app=app) as client:
+            response = client.post('/events/', headers={'Authorization': f'Bearer {self.token}'},
+                                   json={'name': 'event',
+                                         'datetime': '2020-01-01T00:00:00',
+                                         'gov_structure_uuid': str(uuid)})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(logger_mock.exception.called)
+        async with self.Session() as session:
+            event = await session.scalar(select(Event).where(Event.uuid == response.json()['uuid']))
+        self.assertIsNotNone(event)
 
     async def test_defunct_government_structure(self) -> None:
         with TestClient(app=app) as client:
@@ -223,21 +244,31 @@ class TestUpdateEvent(DBProcessedIsolatedAsyncTestCase):
         self.assertEqual(event_name, event_name_expected)
 
     async def test_updating_datetime(self) -> None:
-        with patch('src.events.router.EmailNotificationsSender.apply_async') as mock, \
+        with patch('src.events.router.debounce_event_changes') as mock, \
+                patch('src.events.router.cancel_reminders_for_event') as cancel_mock, \
+                patch('src.events.router.schedule_reminders_for_event') as schedule_mock, \
                 TestClient(app=app) as client:
             response = client.patch(f'/events/{self.event_uuid}/', headers={'Authorization': f'Bearer {self.token}'},
                                     json={'datetime': '2020-03-01T00:00:00'})
 
         self.assertTrue(mock.called)
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(cancel_mock.call_args.args[0].datetime, datetime.datetime(year=2020, month=1, day=1))
+        self.assertEqual(schedule_mock.call_args.args[0].datetime, datetime.datetime(year=2020, month=3, day=1))
+
+        async with self.Session() as session:
+            event = await session.scalar(select(Event).where(Event.uuid == self.event_uuid))
+        self.assertAlmostEqual(event.updated_at, datetime.datetime.now(), delta=datetime.timedelta(seconds=5))
 
     async def test_updating_address(self) -> None:
-        with patch('src.events.router.EmailNotificationsSender.apply_async') as mock, \
+        with patch('src.events.router.debounce_event_changes') as mock, \
+                patch('src.events.router.schedule_reminders_for_event') as schedule_mock, \
                 TestClient(app=app) as client:
             response = client.patch(f'/events/{self.event_uuid}/', headers={'Authorization': f'Bearer {self.token}'},
-                                    json={'datetime': '2020-03-01T00:00:00'})
+                                    json={'address': 'Новый адрес'})
 
         self.assertTrue(mock.called)
+        self.assertFalse(schedule_mock.called)
         self.assertEqual(response.status_code, 200)
 
     async def test_event_doesnt_exist(self) -> None:
@@ -272,12 +303,15 @@ class TestChangeEventActivity(DBProcessedIsolatedAsyncTestCase):
         async with self.Session() as session, session.begin():
             await session.execute(update(Event).values(is_active=False).where(Event.uuid == self.event_uuid))
 
-        with patch('src.events.router.EmailNotificationsSender.apply_async') as mock, TestClient(app=app) as client:
+        with patch('src.events.router.EmailNotificationsSender.apply_async') as mock, \
+                patch('src.events.router.schedule_reminders_for_event') as schedule_mock, \
+                TestClient(app=app) as client:
             response = client.post(f'/events/{self.event_uuid}/activity-change/',
                                    headers={'Authorization': f'Bearer {self.token}'},
                                    json={'is_active': True})
 
         self.assertIn('HostingEventEmailMessage', mock.call_args_list[0].kwargs['args'])
+        self.assertEqual(schedule_mock.call_args.args[0].uuid, self.event_uuid)
         self.assertEqual(response.status_code, 204)
 
         async with self.Session() as session:
@@ -285,12 +319,15 @@ class TestChangeEventActivity(DBProcessedIsolatedAsyncTestCase):
         self.assertTrue(event_activity)
 
     async def test_change_true_to_false(self) -> None:
-        with patch('src.events.router.EmailNotificationsSender.apply_async') as mock, TestClient(app=app) as client:
+        with patch('src.events.router.EmailNotificationsSender.apply_async') as mock, \
+                patch('src.events.router.cancel_reminders_for_event') as cancel_mock, \
+                TestClient(app=app) as client:
             response = client.post(f'/events/{self.event_uuid}/activity-change/',
                                    headers={'Authorization': f'Bearer {self.token}'},
                                    json={'is_active': False})
 
         self.assertIn('EventCanceledEmailMessage', mock.call_args_list[0].kwargs['args'])
+        self.assertEqual(cancel_mock.call_args.args[0].uuid, self.event_uuid)
         self.assertEqual(response.status_code, 204)
 
         async with self.Session() as session:
@@ -511,21 +548,48 @@ class TestReceiveSubscribersToEvent(DBProcessedIsolatedAsyncTestCase):
                 "first_name": "Имя",
                 "last_name": "Фамилия",
                 "patronymic": "Отчество",
-                "email": "email1@email.com",
-                "is_government_worker": False
+                "email": "email@email.com",
+                "is_government_worker": False,
+                "notifications_digest": False
             },
             {
                 "first_name": "Имя",
                 "last_name": "Фамилия",
                 "patronymic": "Отчество",
-                "email": "email@email.com",
-                "is_government_worker": False
+                "email": "email1@email.com",
+                "is_government_worker": False,
+                "notifications_digest": False
             }
         ]
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), expected_result)
 
+    async def test_users_with_same_names_are_sorted_by_ids(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(uuid=event_uuid, name='event',
+                                                       gov_structure_uuid=gov_structure_uuid,
+                                                       datetime=datetime.datetime(year=2020, month=1, day=1)))
+            for id_ in (762, 761, 763):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(EventSubscription).values(event_uuid=event_uuid, user_id=id_))
+
+        token = AuthJWT().create_access_token(subject=800, user_claims={'is_government_worker': True})
+        with TestClient(app=app) as client:
+            responses = [client.get(f'/events/{event_uuid}/subscribers/', params={'page': page, 'size': 1},
+                                    headers={'Authorization': f'Bearer {token}'})
+                         for page in range(3)]
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200])
+        self.assertEqual([user['email'] for response in responses for user in response.json()],
+                         ['email761@email.com', 'email762@email.com', 'email763@email.com'])
+
     async def test_event_doesnt_exist(self) -> None:
         uuid = uuid_pkg.uuid4()
         token = AuthJWT().create_access_token(subject=800, user_claims={'is_government_worker': True})
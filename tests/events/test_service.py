@@ -1,10 +1,12 @@
 import datetime
 import uuid as uuid_pkg
 
-from sqlalchemy import insert, delete, text
+from sqlalchemy import insert, delete, text, select, update
 
-from src.events.models import Event, EventSubscription
-from src.events.service import does_user_is_sub_to_event_by_sub_to_gov_structure, receive_subs_to_event_from_db
+from src.events.models import Event, EventSubscription, EventEffectiveSubscription
+from src.events.service import does_user_is_sub_to_event_by_sub_to_gov_structure, receive_subs_to_event_from_db, \
+    receive_subs_to_event_ids_boundaries_from_db, create_receiving_subs_to_event_recipients_query_from_db, \
+    receive_subs_to_event_count_from_db
 from src.gov_structures.models import GovStructure, GovStructureSubscription
 from src.sfp import UsersSFP
 from src.users.models import User
@@ -54,6 +56,31 @@ class TestDoesUserIsSubToEventBySubToGovStructure(DBProcessedIsolatedAsyncTestCa
         self.assertEqual(result, expected_result)
 
 
+class TestCreateReceivingSubsToEventRecipientsQueryFromDb(DBProcessedIsolatedAsyncTestCase):
+
+    async def test_receiving(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(uuid=event_uuid, name='event',
+                                                       gov_structure_uuid=gov_structure_uuid,
+                                                       datetime=datetime.datetime(year=2020, month=1, day=1)))
+            for id_ in (1120, 1121):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(EventSubscription).values(event_uuid=event_uuid, user_id=id_))
+
+        query = create_receiving_subs_to_event_recipients_query_from_db(event_uuid, User.id > 1120)  # type: ignore
+        async with self.Session() as session:
+            rows = (await session.execute(query)).all()
+
+        self.assertEqual(rows, [(1121, 'email1121@email.com', 'Имя', 'Отчество')])
+        self.assertEqual(rows[0].email, 'email1121@email.com')
+
+
 class TestReceiveSubsToEventFromDb(DBProcessedIsolatedAsyncTestCase):
 
     async def test_receiving(self) -> None:
@@ -82,5 +109,100 @@ class TestReceiveSubsToEventFromDb(DBProcessedIsolatedAsyncTestCase):
                                                                    user_id=user2_id))
 
         expected_result = [user1, user2]
-        result = await receive_subs_to_event_from_db(event_uuid, gov_structure_uuid, UsersSFP(page=0, size=100))
+        result = await receive_subs_to_event_from_db(event_uuid, UsersSFP(page=0, size=100))
         self.assertEqual(result, expected_result)
+
+
+class TestReceiveSubsToEventIdsBoundariesFromDb(DBProcessedIsolatedAsyncTestCase):
+
+    async def test_receiving(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(uuid=event_uuid, name='event',
+                                                       gov_structure_uuid=gov_structure_uuid,
+                                                       datetime=datetime.datetime(year=2020, month=1, day=1)))
+            for id_ in (101, 102, 103, 104, 105):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+            await session.execute(insert(EventSubscription).values(event_uuid=event_uuid, user_id=103))
+
+        result = await receive_subs_to_event_ids_boundaries_from_db(event_uuid, 2)
+        self.assertEqual(result, [101, 103, 105])
+
+
+class TestReceiveSubsToEventCountFromDb(DBProcessedIsolatedAsyncTestCase):
+
+    async def test_receiving(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(uuid=event_uuid, name='event',
+                                                       gov_structure_uuid=gov_structure_uuid,
+                                                       datetime=datetime.datetime(year=2020, month=1, day=1)))
+            for id_ in (101, 102, 103):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+            await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                          user_id=101))
+            await session.execute(insert(EventSubscription).values(event_uuid=event_uuid, user_id=101))
+            await session.execute(insert(EventSubscription).values(event_uuid=event_uuid, user_id=102))
+
+        self.assertEqual(await receive_subs_to_event_count_from_db(event_uuid), 2)
+        self.assertEqual(await receive_subs_to_event_count_from_db(uuid_pkg.uuid4()), 0)
+
+
+class TestEventEffectiveSubscriptions(DBProcessedIsolatedAsyncTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.gov_structure_uuid = uuid_pkg.uuid4()
+        self.event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=self.gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(User).values({'id': 1301, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                       'patronymic': 'Отчество', 'email': 'email@email.com',
+                                                       'password': 'Password123'}))
+            await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=self.gov_structure_uuid,
+                                                                          user_id=1301))
+            await session.execute(insert(Event).values(uuid=self.event_uuid, name='event',
+                                                       gov_structure_uuid=self.gov_structure_uuid,
+                                                       datetime=datetime.datetime(year=2020, month=1, day=1)))
+            await session.execute(insert(EventSubscription).values(event_uuid=self.event_uuid, user_id=1301))
+
+    async def receive_sources(self) -> list[str]:
+        async with self.Session() as session:
+            query = select(EventEffectiveSubscription.source) \
+                .where(EventEffectiveSubscription.event_uuid == self.event_uuid,
+                       EventEffectiveSubscription.user_id == 1301)
+            return sorted((await session.scalars(query)).all())
+
+    async def test_subscribing(self) -> None:
+        self.assertEqual(await self.receive_sources(), ['event', 'gov_structure'])
+
+    async def test_unsubscribing(self) -> None:
+        async with self.Session() as session, session.begin():
+            await session.execute(delete(GovStructureSubscription))
+        self.assertEqual(await self.receive_sources(), ['event'])
+
+        async with self.Session() as session, session.begin():
+            await session.execute(delete(EventSubscription))
+        self.assertEqual(await self.receive_sources(), [])
+
+    async def test_changing_gov_structure(self) -> None:
+        other_gov_structure_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=other_gov_structure_uuid, name='other',
+                                                              email='example1@gmail.com'))
+            await session.execute(update(Event).values(gov_structure_uuid=other_gov_structure_uuid)
+                                  .where(Event.uuid == self.event_uuid))
+        self.assertEqual(await self.receive_sources(), ['event'])
@@ -17,7 +17,8 @@ class TestCreateGovStructure(DBProcessedIsolatedAsyncTestCase):
 
     async def test_creating(self) -> None:
         token = AuthJWT().create_access_token(subject=1010, user_claims={'is_government_worker': True})
-        with patch('src.gov_structures.router.BackgroundTasks.add_task') as mock, TestClient(app=app) as client:
+        with patch('src.gov_structures.router.TransactionalEmailSender.apply_async') as mock, \
+                TestClient(app=app) as client:
             response = client.post('/government-structures/',
                                    headers={'Authorization': f'Bearer {token}'},
                                    json={'name': 'Government Structure',
@@ -307,14 +308,16 @@ class TestReceiveSubscribersToGovStructure(DBProcessedIsolatedAsyncTestCase):
                 "last_name": "Фамилия",
                 "patronymic": "Отчество",
                 "email": "email@email.com",
-                "is_government_worker": False
+                "is_government_worker": False,
+                "notifications_digest": False
             },
             {
                 "first_name": "Имя",
                 "last_name": "Фамилия",
                 "patronymic": "Отчество",
                 "email": "email1@email.com",
-                "is_government_worker": False
+                "is_government_worker": False,
+                "notifications_digest": False
             }
         ]
 
@@ -1,62 +1,97 @@
+import asyncio
 import datetime
-import uuid as uuid_pkg
-from unittest.mock import patch
-
-from sqlalchemy import insert
-
-from src.events.models import Event
-from src.gov_structures.models import GovStructure
-from src.notifications.celery_ import schedule_notifications, schedule_notifications_on_start_up
-from tests.service import DBProcessedIsolatedAsyncTestCase
-
-
-class ScheduleNotifications(DBProcessedIsolatedAsyncTestCase):
-
-    async def asyncSetUp(self) -> None:
-        await super().asyncSetUp()
-        gov_structure_uuid = uuid_pkg.uuid4()
-        async with self.Session() as session, session.begin():
-            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
-                                                              email='example@gmail.com'))
-            await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=7)))
-            await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=1)))
-
-    def test_scheduling(self):
-        with patch('src.notifications.celery_.schedule_notifications_for_event') as mock:
-            schedule_notifications()
-
-        self.assertEqual(mock.call_count, 3)
-        self.assertEqual(mock.mock_calls[0].args[3], datetime.timedelta(days=7))
-        self.assertEqual(mock.mock_calls[1].args[3], datetime.timedelta(days=1))
-        self.assertEqual(mock.mock_calls[2].args[3], datetime.timedelta(hours=5))
-
-
-class TestScheduleNotificationsOnStartUp(DBProcessedIsolatedAsyncTestCase):
-
-    async def asyncSetUp(self) -> None:
-        await super().asyncSetUp()
-        gov_structure_uuid = uuid_pkg.uuid4()
-        async with self.Session() as session, session.begin():
-            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
-                                                              email='example@gmail.com'))
-            await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now()))
-            await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=1)))
-            await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=3)))
-
-    def test_scheduling(self) -> None:
-        with patch('src.notifications.celery_.schedule_notifications_for_event') as mock:
-            schedule_notifications_on_start_up()
+from unittest import TestCase
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from celery.beat import ScheduleEntry
+from celery.schedules import crontab
+
+from src.notifications import config
+from src.notifications.celery_ import app, TransactionalEmailSender, LeaderScheduler, is_transactional_worker, \
+    reconcile_notifications
+from src.redis_ import redis_engine
+from tests.config import TEST_SCHEDULER_LEASE_NAME, TEST_SCHEDULER_LAST_RUNS_NAME
+
+
+class TestTaskRoutes(TestCase):
+
+    def test_transactional_emails_are_routed_to_separate_queue(self) -> None:
+        route = app.amqp.router.route({}, TransactionalEmailSender.name)
+        self.assertEqual(route['queue'].name, config.TRANSACTIONAL_QUEUE)
+
+
+class TestReconcileNotifications(TestCase):
+
+    @patch('src.notifications.celery_.logger')
+    def test_scheduled_reminders_are_reported(self, logger_mock: MagicMock) -> None:
+        for count in (0, 3):
+            with patch('src.notifications.celery_.reconcile_reminders', new=AsyncMock(return_value=count)), \
+                    patch('src.notifications.celery_.event_loop_thread.run', side_effect=asyncio.run):
+                reconcile_notifications()
+
+        self.assertEqual(logger_mock.warning.call_count, 1)
+        self.assertEqual(logger_mock.warning.call_args.args[1], 3)
+
+
+class TestIsTransactionalWorker(TestCase):
+
+    def test_checking(self) -> None:
+        worker = MagicMock()
+        for consume_from, expected in ((None, False),
+                                       ({'celery': None}, False),
+                                       ({'celery': None, config.TRANSACTIONAL_QUEUE: None}, False),
+                                       ({config.TRANSACTIONAL_QUEUE: None}, True)):
+            with self.subTest(consume_from=consume_from):
+                worker.app.amqp.queues.consume_from = consume_from
+                self.assertEqual(is_transactional_worker(worker), expected)
+
+
+@patch('src.notifications.celery_.PersistentScheduler.tick', return_value=60)
+@patch.object(LeaderScheduler, 'schedule', {})
+class TestLeaderScheduler(TestCase):
+
+    def setUp(self) -> None:
+        self.scheduler = LeaderScheduler(app, lazy=True)
+        self.other_scheduler = LeaderScheduler(app, lazy=True)
+
+    def tearDown(self) -> None:
+        redis_engine.delete(TEST_SCHEDULER_LEASE_NAME, TEST_SCHEDULER_LAST_RUNS_NAME)
+
+    def test_only_leader_sends_tasks(self, tick_mock: MagicMock) -> None:
+        with patch('src.notifications.celery_.reconcile_notifications.delay') as mock:
+            interval = self.scheduler.tick()
+            other_interval = self.other_scheduler.tick()
+            self.scheduler.tick()
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(tick_mock.call_count, 2)
+        self.assertEqual(interval, config.SCHEDULER_LEASE_RENEW_INTERVAL)
+        self.assertEqual(other_interval, config.SCHEDULER_LEASE_RENEW_INTERVAL)
+        self.assertTrue(self.scheduler.is_leader)
+        self.assertFalse(self.other_scheduler.is_leader)
+
+    def test_failover(self, tick_mock: MagicMock) -> None:
+        with patch('src.notifications.celery_.reconcile_notifications.delay') as mock:
+            self.scheduler.tick()
+            redis_engine.delete(TEST_SCHEDULER_LEASE_NAME)
+            self.other_scheduler.tick()
+            self.scheduler.tick()
 
         self.assertEqual(mock.call_count, 2)
-        self.assertEqual(mock.mock_calls[0].args[3], datetime.timedelta(days=1))
-        self.assertEqual(mock.mock_calls[1].args[3], datetime.timedelta(hours=5))
+        self.assertFalse(self.scheduler.is_leader)
+        self.assertTrue(self.other_scheduler.is_leader)
+
+    def test_new_leader_continues_schedule(self, tick_mock: MagicMock) -> None:
+        last_run_at = self.scheduler.app.now() - datetime.timedelta(days=1)
+        self.scheduler.schedule['digests'] = ScheduleEntry(name='digests', task='digests', app=app,
+                                                           schedule=crontab(hour=9, minute=0), last_run_at=last_run_at)
+        self.scheduler.schedule['other'] = ScheduleEntry(name='other', task='other', app=app, schedule=60)
+        self.scheduler.reserve(self.scheduler.schedule['digests'])
+        shared_last_run_at = self.scheduler.schedule['digests'].last_run_at
+        self.scheduler.schedule['digests'].last_run_at = last_run_at
+
+        with patch('src.notifications.celery_.reconcile_notifications.delay'):
+            self.other_scheduler.tick()
+
+        self.assertEqual(self.other_scheduler.schedule['digests'].last_run_at, shared_last_run_at)
+        self.assertGreater(self.other_scheduler.schedule['other'].last_run_at, last_run_at)
@@ -0,0 +1,75 @@
+import uuid as uuid_pkg
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.notifications import config
+from src.notifications.delivery_log import DeliveryLog
+from src.redis_ import redis_engine
+
+
+class TestDeliveryLog(TestCase):
+
+    def setUp(self) -> None:
+        self.event_uuid = uuid_pkg.uuid4()
+        self.log = DeliveryLog(self.event_uuid, 'OneDayBeforeEmailMessage', 'task')
+
+    def tearDown(self) -> None:
+        redis_engine.delete(self.log.name, self.log.checkpoint_name, self.log.first_user_id_name,
+                            self.log.sharded_name)
+
+    def test_checkpoint_is_moved_after_all_previous_users(self) -> None:
+        self.log.pending_users_ids.extend([10, 20, 30])
+        self.log.mark_delivered([20])
+        self.log.flush()
+        self.assertIsNone(redis_engine.get(self.log.checkpoint_name))
+
+        self.log.mark_delivered([10])
+        self.log.flush()
+        self.assertEqual(redis_engine.get(self.log.checkpoint_name), '20')
+        self.assertEqual(list(self.log.pending_users_ids), [30])
+        self.assertGreater(redis_engine.ttl(self.log.name), 0)
+
+    def test_resuming(self) -> None:
+        self.log.pending_users_ids.extend([10, 20, 30, 40])
+        self.log.mark_delivered([10, 30])
+        self.log.flush()
+
+        log = DeliveryLog(self.event_uuid, 'OneDayBeforeEmailMessage', 'task')
+        self.assertEqual(log.resume(), 10)
+        self.assertEqual([log.is_delivered(user_id) for user_id in (20, 30, 40, 1000)], [False, True, False, False])
+
+    def test_marks_are_written_by_batches(self) -> None:
+        self.log.pending_users_ids.extend([10, 20, 30])
+        with patch.object(config, 'DELIVERY_LOG_FLUSH_SIZE', 2):
+            self.log.mark_delivered([10])
+            self.assertFalse(redis_engine.exists(self.log.name))
+
+            self.log.mark_delivered([20])
+            self.assertEqual(redis_engine.get(self.log.checkpoint_name), '20')
+
+    def test_bitmap_is_relative_to_first_user(self) -> None:
+        self.log.pending_users_ids.extend([10_000_000, 10_000_001])
+        self.log.mark_delivered([10_000_001])
+        self.log.flush()
+
+        self.assertEqual(redis_engine.strlen(self.log.name), 1)
+        log = DeliveryLog(self.event_uuid, 'OneDayBeforeEmailMessage', 'task')
+        self.assertIsNone(log.resume())
+        self.assertEqual([log.is_delivered(user_id) for user_id in (10_000_000, 10_000_001)], [False, True])
+
+    def test_resuming_without_previous_attempt(self) -> None:
+        self.assertIsNone(self.log.resume())
+        self.assertFalse(self.log.is_delivered(10))
+
+    def test_logs_of_other_runs_are_separate(self) -> None:
+        self.log.pending_users_ids.append(10)
+        self.log.mark_delivered([10])
+        self.log.flush()
+
+        log = DeliveryLog(self.event_uuid, 'OneDayBeforeEmailMessage', 'other task')
+        self.assertIsNone(log.resume())
+
+    def test_marking_sharded(self) -> None:
+        self.assertFalse(self.log.is_sharded())
+        self.log.mark_sharded()
+        self.assertTrue(self.log.is_sharded())
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from src.notifications.lease import RedisLease
+from src.redis_ import redis_engine
+
+
+class TestRedisLease(TestCase):
+
+    def setUp(self) -> None:
+        self.lease = RedisLease('test_lease', 10)
+        self.other_lease = RedisLease('test_lease', 10)
+
+    def tearDown(self) -> None:
+        redis_engine.delete('test_lease')
+
+    def test_acquiring(self) -> None:
+        self.assertTrue(self.lease.acquire())
+        self.assertFalse(self.other_lease.acquire())
+        self.assertEqual(redis_engine.get('test_lease'), self.lease.holder)
+
+    def test_renewing(self) -> None:
+        self.lease.acquire()
+        redis_engine.pexpire('test_lease', 100)
+
+        self.assertTrue(self.lease.acquire())
+        self.assertGreater(redis_engine.pttl('test_lease'), 100)
+
+    def test_expired_lease_is_taken_over(self) -> None:
+        self.lease.acquire()
+        redis_engine.delete('test_lease')
+
+        self.assertTrue(self.other_lease.acquire())
+        self.assertFalse(self.lease.acquire())
+
+    def test_releasing(self) -> None:
+        self.lease.acquire()
+        self.other_lease.release()
+        self.assertFalse(self.other_lease.acquire())
+
+        self.lease.release()
+        self.assertTrue(self.other_lease.acquire())
@@ -0,0 +1,52 @@
+import datetime
+import os
+import time
+import uuid as uuid_pkg
+from unittest import TestCase
+from unittest.mock import patch
+
+from kombu.serialization import dumps, loads
+
+from src.events.models import Event
+from src.notifications import config
+from src.notifications.payloads import dump_event, load_event
+
+
+class TestEventPayload(TestCase):
+
+    def setUp(self) -> None:
+        self.event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=uuid_pkg.uuid4(),
+                           description='description' * 1000, address='address',
+                           datetime=datetime.datetime(year=2020, month=1, day=1, hour=12),
+                           updated_at=datetime.datetime(year=2019, month=12, day=1))
+
+    def test_dumping_and_loading(self) -> None:
+        content_type, content_encoding, data = dumps(dump_event(self.event), serializer=config.TASK_SERIALIZER)
+        event = loads(data, content_type, content_encoding, accept=[content_type])
+
+        result = load_event(event)
+        self.assertEqual((result.uuid, result.name, result.address, result.datetime, result.updated_at),
+                         (self.event.uuid, self.event.name, self.event.address, self.event.datetime,
+                          self.event.updated_at))
+        self.assertIsNone(result.description)
+        self.assertLess(len(data), 100)
+
+    def test_datetimes_around_daylight_saving_time_transitions(self) -> None:
+        ambiguous_datetime = datetime.datetime(year=2020, month=11, day=1, hour=1, minute=30)
+        skipped_datetime = datetime.datetime(year=2020, month=3, day=8, hour=2, minute=30)
+        try:
+            with patch.dict(os.environ, {'TZ': 'America/New_York'}):
+                time.tzset()
+                result = [load_event(dump_event(Event(**(self.event.dict() | {'datetime': datetime_}))))
+                          for datetime_ in (ambiguous_datetime, skipped_datetime)]
+        finally:
+            time.tzset()
+
+        self.assertEqual([event.datetime for event in result], [ambiguous_datetime, skipped_datetime])
+
+    def test_unsupported_schema_version(self) -> None:
+        payload = dump_event(self.event)
+        payload[0] = config.EVENT_PAYLOAD_SCHEMA_VERSION + 1
+
+        with self.assertRaises(ValueError):
+            load_event(payload)
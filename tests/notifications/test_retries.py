@@ -0,0 +1,120 @@
+import datetime
+import json
+import uuid as uuid_pkg
+from email.mime.text import MIMEText
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from sqlalchemy import insert
+
+from src.events.models import Event
+from src.gov_structures.models import GovStructure
+from src.notifications import config
+from src.notifications.retries import schedule_retry, retries_timeline, create_retry, retry_sending
+from src.redis_ import redis_engine
+from tests.config import TEST_RETRIES_DEAD_LETTERS_NAME
+from tests.service import clear_timeline, DBProcessedIsolatedAsyncTestCase
+
+
+class TestScheduleRetry(TestCase):
+
+    def setUp(self) -> None:
+        self.message = MIMEText('payload')
+
+    def tearDown(self) -> None:
+        clear_timeline(retries_timeline)
+        redis_engine.delete(TEST_RETRIES_DEAD_LETTERS_NAME)
+
+    def test_scheduling(self) -> None:
+        self.assertTrue(schedule_retry(self.message, 3, OSError()))
+
+        result = retries_timeline.receive_datetime(create_retry(self.message.as_string(), 3))
+        assert result is not None
+        expected_delay = datetime.timedelta(seconds=config.RETRIES_BASE_DELAY * 4)
+        self.assertAlmostEqual(result, datetime.datetime.now() + expected_delay, delta=datetime.timedelta(seconds=5))
+
+    def test_attempts_are_over(self) -> None:
+        self.assertFalse(schedule_retry(self.message, config.RETRIES_MAX_ATTEMPTS + 1, OSError('error')))
+
+        self.assertEqual(redis_engine.zcard(retries_timeline.name), 0)
+        message, attempts, error, recipients = json.loads(redis_engine.lindex(TEST_RETRIES_DEAD_LETTERS_NAME, 0))
+        self.assertEqual((message, attempts, error, recipients),
+                         (self.message.as_string(), config.RETRIES_MAX_ATTEMPTS, "OSError('error')", None))
+
+
+class TestRetrySending(IsolatedAsyncioTestCase):
+
+    def tearDown(self) -> None:
+        clear_timeline(retries_timeline)
+
+    async def test_sending(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        retries_timeline.add(create_retry(MIMEText('first').as_string(), 1), datetime_)
+        retries_timeline.add(create_retry(MIMEText('second').as_string(), 2), datetime_)
+
+        with patch('src.notifications.retries.send_email', side_effect=[None, OSError()]) as mock:
+            result = await retry_sending(datetime_)
+
+        self.assertEqual(result, 1)
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(redis_engine.zcard(retries_timeline.name), 1)
+        retry = redis_engine.zrange(retries_timeline.name, 0, 0)[0]
+        self.assertEqual(json.loads(retry)[1], 3)
+
+    async def test_sending_to_recipients(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        recipients = ['email@email.com', 'email1@email.com']
+        retries_timeline.add(create_retry(MIMEText('payload').as_string(), 1, recipients), datetime_)
+
+        with patch('src.notifications.retries.send_email') as mock:
+            result = await retry_sending(datetime_)
+
+        self.assertEqual(result, 1)
+        self.assertEqual(mock.call_args.args[1], recipients)
+
+
+class TestRetrySendingAboutEvent(DBProcessedIsolatedAsyncTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        gov_structure_uuid = uuid_pkg.uuid4()
+        self.datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        self.events = [Event(uuid=uuid_pkg.uuid4(), name=name, gov_structure_uuid=gov_structure_uuid,
+                             datetime=self.datetime_, is_active=is_active)
+                       for name, is_active in (('unchanged', True), ('canceled', False), ('rescheduled', True))]
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            for event in self.events:
+                await session.execute(insert(Event).values(event.dict()))
+
+    async def asyncTearDown(self) -> None:
+        clear_timeline(retries_timeline)
+        await super().asyncTearDown()
+
+    async def test_outdated_retries_are_dropped(self) -> None:
+        rescheduled_event = self.events[2].copy(update={'datetime': self.datetime_ - datetime.timedelta(hours=1)})
+        deleted_event = Event(uuid=uuid_pkg.uuid4(), name='deleted', gov_structure_uuid=uuid_pkg.uuid4(),
+                              datetime=self.datetime_)
+        for event in (self.events[0], self.events[1], rescheduled_event, deleted_event):
+            retries_timeline.add(create_retry(MIMEText(event.name).as_string(), 1, event=event), self.datetime_)
+
+        with patch('src.notifications.retries.send_email', side_effect=OSError()) as mock:
+            result = await retry_sending(self.datetime_)
+
+        self.assertEqual(result, 0)
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(mock.call_args.args[0].get_payload(), 'unchanged')
+        self.assertEqual(redis_engine.zcard(retries_timeline.name), 1)
+        message, attempt, recipients, event_data = json.loads(redis_engine.zrange(retries_timeline.name, 0, 0)[0])
+        self.assertEqual((attempt, event_data[0]), (2, str(self.events[0].uuid)))
+
+    async def test_retries_without_event_are_sent(self) -> None:
+        retries_timeline.add(create_retry(MIMEText('new').as_string(), 1), self.datetime_)
+        retries_timeline.add(json.dumps([MIMEText('old').as_string(), 1, None]), self.datetime_)
+
+        with patch('src.notifications.retries.send_email') as mock:
+            result = await retry_sending(self.datetime_)
+
+        self.assertEqual(result, 2)
+        self.assertEqual(mock.call_count, 2)
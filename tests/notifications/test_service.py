@@ -1,94 +1,360 @@
-import uuid as uuid_pkg
 import datetime
+import json
+import uuid as uuid_pkg
 from unittest import TestCase
 from unittest.mock import patch
 
 from sqlalchemy import insert
 
-from src.events.models import Event
-from src.gov_structures.models import GovStructure
-from src.notifications.email_messages import EventChangedEmailMessage
-from src.notifications.service import receive_events_that_in_few_days_time, receive_events_for_this_and_next_day, \
-    get_countdown, schedule_notifications_for_event
-from tests.service import DBProcessedIsolatedAsyncTestCase
+from src.events.models import Event, EventSubscription
+from src.gov_structures.models import GovStructure, GovStructureSubscription
+from src.notifications.email_messages import EventChangedEmailMessage, OneDayBeforeEmailMessage, \
+    FiveHoursBeforeEmailMessage, OneWeekBeforeEmailMessage
+from src.notifications import config
+from src.notifications.payloads import load_event
+from src.notifications.service import schedule_notifications_for_event, cancel_notifications_for_event, \
+    create_reminder, dispatch_notifications, reminders_timeline, receive_digests, send_digests, changes_timeline, \
+    debounce_event_changes, create_original_event_key, flush_event_changes, schedule_reminders_for_event, \
+    schedule_reminders_for_events, cancel_reminders_for_event, reconcile_reminders
+from src.redis_ import redis_engine
+from src.users.models import User
+from tests.config import TEST_REMINDERS_RECONCILED_AT_NAME
+from tests.service import DBProcessedIsolatedAsyncTestCase, clear_timeline
 
 
-class TestReceiveEventsThatInFewDaysTime(DBProcessedIsolatedAsyncTestCase):
+class TestReceiveDigests(DBProcessedIsolatedAsyncTestCase):
 
-    async def test_receiving(self) -> None:
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
         gov_structure_uuid = uuid_pkg.uuid4()
-        expected_event_uuid = uuid_pkg.uuid4()
+        self.today = datetime.datetime(year=2030, month=1, day=1, hour=9)
         async with self.Session() as session, session.begin():
             await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
                                                               email='example@gmail.com'))
+            for name, days_count in (('week', 7), ('day', 1), ('two days', 2)):
+                await session.execute(insert(Event).values(
+                    uuid=uuid_pkg.uuid4(), name=name, gov_structure_uuid=gov_structure_uuid,
+                    datetime=self.today + datetime.timedelta(days=days_count)))
+            for id_, notifications_digest in ((1201, True), (1202, False)):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123',
+                                                           'notifications_digest': notifications_digest}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+            other_gov_structure_uuid = uuid_pkg.uuid4()
+            await session.execute(insert(GovStructure).values(uuid=other_gov_structure_uuid, name='other',
+                                                              email='example1@gmail.com'))
+            event_uuid = uuid_pkg.uuid4()
+            await session.execute(insert(Event).values(uuid=event_uuid, name='subscribed',
+                                                       gov_structure_uuid=other_gov_structure_uuid,
+                                                       datetime=self.today + datetime.timedelta(days=1, hours=1)))
+            await session.execute(insert(EventSubscription).values(event_uuid=event_uuid, user_id=1201))
+
+    async def test_receiving(self) -> None:
+        digests = [digest async for digest in receive_digests([1, 7], self.today)]
+
+        self.assertEqual(len(digests), 1)
+        user, events_names, events_datetimes = digests[0]
+        self.assertEqual(user.id, 1201)
+        self.assertEqual(events_names, ['day', 'subscribed', 'week'])
+        self.assertEqual(events_datetimes, sorted(events_datetimes))
+
+    async def test_sending(self) -> None:
+        with patch('src.notifications.service.send_email') as mock:
+            results = await send_digests([1, 7], self.today)
+
+        self.assertEqual([result.email for result in results], ['email1201@email.com'])
+        self.assertIn('"subscribed"', mock.call_args.args[0].get_payload(decode=True).decode())
+
+
+class TestScheduleNotificationsForEvent(TestCase):
+
+    def tearDown(self) -> None:
+        clear_timeline(reminders_timeline)
+
+    def test_scheduling(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=3))
+        schedule_notifications_for_event(event, EventChangedEmailMessage, datetime.timedelta(days=1))
+
+        reminder = json.dumps([str(event.uuid), 'EventChangedEmailMessage', '2020-01-03T00:00:00'])
+        expected_result = datetime.datetime(year=2020, month=1, day=2)
+        result = reminders_timeline.receive_datetime(reminder)
+        self.assertEqual(result, expected_result)
+
+    def test_scheduling_twice(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime.now() + datetime.timedelta(days=3))
+        self.assertTrue(schedule_notifications_for_event(event, OneDayBeforeEmailMessage, datetime.timedelta(days=1)))
+
+        reminder = create_reminder(event.uuid, OneDayBeforeEmailMessage, event.datetime)
+        reminders_timeline.pop_due(event.datetime, 10)
+        self.assertFalse(schedule_notifications_for_event(event, OneDayBeforeEmailMessage, datetime.timedelta(days=1)))
+        self.assertIsNone(reminders_timeline.receive_datetime(reminder))
+
+
+class TestCancelNotificationsForEvent(TestCase):
+
+    def tearDown(self) -> None:
+        clear_timeline(reminders_timeline)
+
+    def test_canceling(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=3))
+        schedule_notifications_for_event(event, EventChangedEmailMessage, datetime.timedelta(days=1))
+        cancel_notifications_for_event(event, EventChangedEmailMessage)
+
+        result = reminders_timeline.receive_datetime(create_reminder(event.uuid, EventChangedEmailMessage,
+                                                                     event.datetime))
+        self.assertIsNone(result)
+
+
+class TestScheduleRemindersForEvent(DBProcessedIsolatedAsyncTestCase):
+
+    async def asyncTearDown(self) -> None:
+        await super().asyncTearDown()
+        clear_timeline(reminders_timeline)
+
+    async def test_scheduling(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=3, hour=12))
+
+        with patch('src.notifications.service.config.REMINDERS_SPREAD_TOLERANCE', 0):
+            result = await schedule_reminders_for_event(event, datetime.datetime(year=2020, month=1, day=1, hour=12))
+
+        self.assertEqual(result, 2)
+        self.assertIsNone(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, OneWeekBeforeEmailMessage, event.datetime)))
+        self.assertEqual(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, OneDayBeforeEmailMessage, event.datetime)),
+            datetime.datetime(year=2020, month=1, day=2, hour=12))
+        self.assertEqual(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, FiveHoursBeforeEmailMessage, event.datetime)),
+            datetime.datetime(year=2020, month=1, day=3, hour=7))
+
+    async def test_canceling(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime.now() + datetime.timedelta(days=10))
+        await schedule_reminders_for_event(event, datetime.datetime.now())
+        cancel_reminders_for_event(event)
+
+        self.assertEqual(redis_engine.zcard(reminders_timeline.name), 0)
+        self.assertEqual(await schedule_reminders_for_event(event, datetime.datetime.now()), 3)
+
+
+class TestScheduleRemindersForEvents(TestCase):
+
+    def tearDown(self) -> None:
+        clear_timeline(reminders_timeline)
+
+    def test_scheduling(self) -> None:
+        events = [Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                        datetime=datetime.datetime.now() + datetime.timedelta(days=days_count))
+                  for days_count in (3, 10)]
+        schedule_notifications_for_event(events[1], OneWeekBeforeEmailMessage, datetime.timedelta(days=7))
+
+        result = schedule_reminders_for_events(events, [1, 1], datetime.datetime.now())
+
+        self.assertEqual(result, 4)
+        self.assertEqual(redis_engine.zcard(reminders_timeline.name), 5)
+
+    def test_spreading(self) -> None:
+        datetime_ = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=3)
+        events = [Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(), datetime=datetime_)
+                  for _ in range(3)]
+
+        with patch('src.notifications.service.config.REMINDERS_SPREAD_TOLERANCE', 600), \
+                patch('src.notifications.service.config.REMINDERS_SPREAD_SLOT', 30):
+            schedule_reminders_for_events(events, [1000, 10, 0], datetime.datetime.now())
+
+        reminders_datetimes = [reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, FiveHoursBeforeEmailMessage, datetime_)) for event in events]
+        self.assertEqual(reminders_datetimes[0], datetime_ - datetime.timedelta(hours=5))
+        self.assertEqual(len(set(reminders_datetimes)), 3)
+        for reminder_datetime in reminders_datetimes:
+            assert reminder_datetime is not None
+            self.assertLessEqual(abs(reminder_datetime - (datetime_ - datetime.timedelta(hours=5))),
+                                 datetime.timedelta(seconds=600))
+
+    def test_scheduling_without_reminders(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime.now() + datetime.timedelta(hours=1))
+
+        self.assertEqual(schedule_reminders_for_events([event], [1], datetime.datetime.now()), 0)
+
+
+class TestReconcileReminders(DBProcessedIsolatedAsyncTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.gov_structure_uuid = uuid_pkg.uuid4()
+        self.event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=self.gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(uuid=self.event_uuid, name='event',
+                                                       gov_structure_uuid=self.gov_structure_uuid,
+                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=3),
+                                                       updated_at=datetime.datetime.now() - datetime.timedelta(days=1)))
             await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=1)))
-            await session.execute(insert(Event).values(uuid=expected_event_uuid, name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=2)))
+                                                       gov_structure_uuid=self.gov_structure_uuid,
+                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=3),
+                                                       is_active=False))
+
+    async def asyncTearDown(self) -> None:
+        await super().asyncTearDown()
+        clear_timeline(reminders_timeline)
+        redis_engine.delete(TEST_REMINDERS_RECONCILED_AT_NAME)
+
+    async def test_first_reconciliation(self) -> None:
+        result = await reconcile_reminders(datetime.datetime.now())
+
+        self.assertEqual(result, 2)
+        self.assertIsNotNone(redis_engine.get(TEST_REMINDERS_RECONCILED_AT_NAME))
+
+    async def test_only_changed_events_are_reconciled(self) -> None:
+        redis_engine.set(TEST_REMINDERS_RECONCILED_AT_NAME, datetime.datetime.now().isoformat())
+        changed_event_uuid = uuid_pkg.uuid4()
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(Event).values(uuid=changed_event_uuid, name='event',
+                                                       gov_structure_uuid=self.gov_structure_uuid,
+                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=8)))
+
+        with patch('src.notifications.service.schedule_reminders_for_events', return_value=3) as mock:
+            result = await reconcile_reminders(datetime.datetime.now())
+
+        self.assertEqual(result, 3)
+        self.assertEqual([event.uuid for event in mock.call_args.args[0]], [changed_event_uuid])
+        self.assertEqual(mock.call_args.args[1], [0])
+
+    async def test_reconciliation_by_batches(self) -> None:
+        async with self.Session() as session, session.begin():
             await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
+                                                       gov_structure_uuid=self.gov_structure_uuid,
                                                        datetime=datetime.datetime.now() + datetime.timedelta(days=3)))
 
-        events = await receive_events_that_in_few_days_time(2, datetime.datetime.now())
-        self.assertEqual(len(events), 1)
-        self.assertEqual(events[0].uuid, expected_event_uuid)
+        with patch('src.notifications.service.reminders_timeline.add_many_once',
+                   side_effect=reminders_timeline.add_many_once) as mock:
+            result = await reconcile_reminders(datetime.datetime.now())
 
+        self.assertEqual(result, 4)
+        self.assertEqual(mock.call_count, 1)
 
-class TestReceiveEventsForThisAndNextDay(DBProcessedIsolatedAsyncTestCase):
 
-    async def test_receiving(self) -> None:
+class TestDispatchNotifications(TestCase):
+
+    def tearDown(self) -> None:
+        clear_timeline(reminders_timeline)
+
+    def test_dispatching(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=3))
+        schedule_notifications_for_event(event, OneDayBeforeEmailMessage, datetime.timedelta(days=1))
+        schedule_notifications_for_event(event, FiveHoursBeforeEmailMessage, datetime.timedelta(hours=5))
+
+        with patch('src.notifications.celery_.EmailNotificationsSender.apply_async') as mock:
+            result = dispatch_notifications(datetime.datetime(year=2020, month=1, day=2, hour=12))
+
+        self.assertEqual(result, 1)
+        self.assertEqual(mock.call_args_list[0].kwargs['args'],
+                         [str(event.uuid), 'OneDayBeforeEmailMessage', '2020-01-03T00:00:00'])
+        self.assertEqual(mock.call_args_list[0].kwargs['kwargs'], {'planned_at': '2020-01-02T00:00:00'})
+        self.assertIsNotNone(mock.call_args_list[0].kwargs['producer'])
+        self.assertIsNotNone(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, FiveHoursBeforeEmailMessage, event.datetime)))
+
+    def test_unpublished_notifications_are_returned(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=3))
+        schedule_notifications_for_event(event, OneWeekBeforeEmailMessage, datetime.timedelta(days=7))
+        schedule_notifications_for_event(event, OneDayBeforeEmailMessage, datetime.timedelta(days=1))
+        schedule_notifications_for_event(event, FiveHoursBeforeEmailMessage, datetime.timedelta(hours=5))
+
+        with patch('src.notifications.celery_.EmailNotificationsSender.apply_async',
+                   side_effect=[None, OSError()]), self.assertRaises(OSError):
+            dispatch_notifications(datetime.datetime(year=2020, month=1, day=3))
+
+        self.assertIsNone(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, OneWeekBeforeEmailMessage, event.datetime)))
+        self.assertEqual(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, OneDayBeforeEmailMessage, event.datetime)), datetime.datetime(2020, 1, 2))
+        self.assertEqual(reminders_timeline.receive_datetime(
+            create_reminder(event.uuid, FiveHoursBeforeEmailMessage, event.datetime)),
+            datetime.datetime(2020, 1, 2, hour=19))
+
+
+class TestDebounceEventChanges(TestCase):
+
+    def tearDown(self) -> None:
+        clear_timeline(changes_timeline)
+        redis_engine.delete(create_original_event_key(self.event.uuid))
+
+    def test_debouncing(self) -> None:
+        self.event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(), address='first',
+                           datetime=datetime.datetime(year=2020, month=1, day=3))
+        debounce_event_changes(self.event)
+        first_datetime = changes_timeline.receive_datetime(str(self.event.uuid))
+        debounce_event_changes(Event(**(self.event.dict() | {'address': 'second'})))
+
+        second_datetime = changes_timeline.receive_datetime(str(self.event.uuid))
+        assert first_datetime is not None and second_datetime is not None
+        self.assertGreaterEqual(second_datetime, first_datetime)
+        original_event = json.loads(redis_engine.get(create_original_event_key(self.event.uuid)))
+        self.assertEqual(original_event['address'], 'first')
+
+
+class TestFlushEventChanges(DBProcessedIsolatedAsyncTestCase):
+
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
         gov_structure_uuid = uuid_pkg.uuid4()
-        expected_event_uuid1 = uuid_pkg.uuid4()
-        expected_event_uuid2 = uuid_pkg.uuid4()
+        self.event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                           address='address', datetime=datetime.datetime(year=2020, month=1, day=3))
         async with self.Session() as session, session.begin():
             await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
                                                               email='example@gmail.com'))
-            await session.execute(insert(Event).values(uuid=expected_event_uuid1, name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(hours=1)))
-            await session.execute(insert(Event).values(uuid=expected_event_uuid2, name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=1)))
-            await session.execute(insert(Event).values(uuid=uuid_pkg.uuid4(), name='event',
-                                                       gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime.now() + datetime.timedelta(days=2)))
+            await session.execute(insert(Event).values(self.event.dict()))
 
-        events = await receive_events_for_this_and_next_day(datetime.datetime.now())
-        self.assertEqual(len(events), 2)
-        self.assertEqual(events[0].uuid, expected_event_uuid1)
-        self.assertEqual(events[1].uuid, expected_event_uuid2)
+    async def asyncTearDown(self) -> None:
+        await super().asyncTearDown()
+        clear_timeline(changes_timeline)
+        redis_engine.delete(create_original_event_key(self.event.uuid))
 
+    async def test_flushing(self) -> None:
+        debounce_event_changes(Event(**(self.event.dict() | {'address': 'original address'})))
 
-class TestGetCountdown(TestCase):
+        with patch('src.notifications.celery_.EmailNotificationsSender.apply_async') as mock:
+            result = await flush_event_changes(datetime.datetime.now() + datetime.timedelta(days=1))
 
-    def test_start_is_greater_than_end(self) -> None:
-        start = datetime.datetime(year=2022, month=1, day=1)
-        end = datetime.datetime(year=2020, month=1, day=1)
+        self.assertEqual(result, 1)
+        self.assertEqual(mock.call_args.kwargs['kwargs']['event_changes'], {'address': 'address'})
+        self.assertIsNone(redis_engine.get(create_original_event_key(self.event.uuid)))
 
-        expected_result = 0
-        result = get_countdown(start, end)
-        self.assertEqual(result, expected_result)
+    async def test_flushing_datetime(self) -> None:
+        original_datetime = datetime.datetime(year=2020, month=1, day=1)
+        debounce_event_changes(Event(**(self.event.dict() | {'datetime': original_datetime})))
 
-    def test_end_is_greater_than_or_equal_to_start(self) -> None:
-        start = datetime.datetime(year=2020, month=1, day=1)
-        end = datetime.datetime(year=2020, month=1, day=2)
+        with patch('src.notifications.celery_.EmailNotificationsSender.apply_async') as mock:
+            await flush_event_changes(datetime.datetime.now() + datetime.timedelta(days=1))
 
-        expected_result = int(datetime.timedelta(days=1).total_seconds())
-        result = get_countdown(start, end)
-        self.assertEqual(result, expected_result)
+        self.assertEqual(mock.call_args.kwargs['kwargs']['event_changes'], {'datetime': '2020-01-03T00:00:00'})
+        self.assertEqual(load_event(mock.call_args.kwargs['args'][0]).datetime, original_datetime)
 
+    async def test_changes_are_empty(self) -> None:
+        debounce_event_changes(self.event)
 
-class TestScheduleNotificationsForEvent(TestCase):
+        with patch('src.notifications.celery_.EmailNotificationsSender.apply_async') as mock:
+            result = await flush_event_changes(datetime.datetime.now() + datetime.timedelta(days=1))
+
+        self.assertEqual(result, 0)
+        self.assertFalse(mock.called)
+
+    async def test_window_has_not_passed(self) -> None:
+        debounce_event_changes(Event(**(self.event.dict() | {'address': 'original address'})))
 
-    def test_scheduling(self) -> None:
-        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(),
-                      datetime=datetime.datetime(year=2020, month=1, day=3))
         with patch('src.notifications.celery_.EmailNotificationsSender.apply_async') as mock:
-            schedule_notifications_for_event(event, EventChangedEmailMessage,
-                                             datetime.datetime(year=2020, month=1, day=1), datetime.timedelta(days=1))
+            result = await flush_event_changes(datetime.datetime.now())
 
-        self.assertEqual(mock.call_args_list[0].kwargs['args'],
-                         (event.uuid, 'EventChangedEmailMessage', event.datetime))
-        self.assertEqual(mock.call_args_list[0].kwargs['countdown'], 86400)
+        self.assertEqual(result, 0)
+        self.assertFalse(mock.called)
@@ -1,27 +1,57 @@
 import datetime
 import uuid as uuid_pkg
+from email.mime.text import MIMEText
+from typing import NamedTuple
+from unittest import TestCase, IsolatedAsyncioTestCase
 from unittest.mock import patch
 
 from sqlalchemy import insert, select
 
 from src.events.models import Event, EventSubscription
-from src.gov_structures.models import GovStructure
-from src.notifications.tasks import EmailNotificationsSender
-from src.notifications.email_messages import FiveHoursBeforeEmailMessage
-from src.users.models import User
+from src.gov_structures.models import GovStructure, GovStructureSubscription
+from src.notifications.delivery_log import DeliveryLog
+from src.notifications.payloads import dump_event
+from src.notifications.tasks import EmailNotificationsSender, NotificationResult, NotificationsResultsCombiner, \
+    TransactionalEmailSender
+from src.notifications.email_messages import FiveHoursBeforeEmailMessage, OneDayBeforeEmailMessage, \
+    EventCanceledEmailMessage
+from src.redis_ import redis_engine
+from src.users.models import User, UserReminderOptOut
 from tests.service import DBProcessedIsolatedAsyncTestCase
 
 
+class UserRow(NamedTuple):
+    id: int
+    email: str
+    first_name: str
+    patronymic: str
+
+
 class TestSendNotificationEmailNotificationsSender(DBProcessedIsolatedAsyncTestCase):
 
     async def test_sending(self) -> None:
         event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(), datetime=datetime.datetime.now())
-        user = User(id=100, first_name='аааа', last_name='аааа', patronymic='aaaa',
-                    email='example@gmail.com', password='Example123')
+        user = UserRow(id=100, email='example@gmail.com', first_name='аааа', patronymic='aaaa')
+        template = FiveHoursBeforeEmailMessage(event, None).create_template()
         with patch('src.notifications.tasks.send_email') as mock:
-            await EmailNotificationsSender(event).send_notification(user, FiveHoursBeforeEmailMessage)
+            result = await EmailNotificationsSender().send_notification(user, template)
 
         self.assertTrue(mock.called)
+        self.assertEqual(result, NotificationResult('example@gmail.com'))
+
+    async def test_failed_sending(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), gov_structure_uuid=uuid_pkg.uuid4(), datetime=datetime.datetime.now())
+        user = UserRow(id=100, email='example@gmail.com', first_name='аааа', patronymic='aaaa')
+        template = FiveHoursBeforeEmailMessage(event, None).create_template()
+        error = OSError()
+        with patch('src.notifications.tasks.send_email', side_effect=error), \
+                patch('src.notifications.tasks.schedule_retry') as mock:
+            result = await EmailNotificationsSender().send_notification(user, template, event)
+
+        self.assertEqual(result, NotificationResult('example@gmail.com', error))
+        self.assertEqual(mock.call_args.args[0]['To'], 'example@gmail.com')
+        self.assertEqual(mock.call_args.args[1:], (1, error))
+        self.assertIs(mock.call_args.kwargs['event'], event)
 
 
 class TestSendNotificationsEmailNotificationsSender(DBProcessedIsolatedAsyncTestCase):
@@ -47,10 +77,190 @@ class TestSendNotificationsEmailNotificationsSender(DBProcessedIsolatedAsyncTest
                                                                    user_id=222))
 
             event = await session.scalar(select(Event).where(Event.uuid == event_uuid))
-        with patch('src.notifications.tasks.EmailNotificationsSender.send_notification') as mock:
-            await EmailNotificationsSender(event).send_notifications(FiveHoursBeforeEmailMessage)
+        with patch('src.notifications.tasks.send_email') as mock:
+            results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage)
 
         self.assertEqual(mock.call_count, 2)
+        expected_results = [NotificationResult('email1@email.com'), NotificationResult('email@email.com')]
+        self.assertEqual(sorted(results), expected_results)
+
+    async def test_payload_is_rendered_once(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            for id_ in (333, 444):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+
+        with patch('src.notifications.tasks.send_email'), \
+                patch.object(FiveHoursBeforeEmailMessage, 'create_payload', return_value='payload') as mock:
+            await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage)
+
+        self.assertEqual(mock.call_count, 1)
+
+    async def test_digest_users_are_skipped(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            for id_, notifications_digest in ((888, True), (999, False)):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123',
+                                                           'notifications_digest': notifications_digest}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+
+        with patch('src.notifications.tasks.send_email'):
+            digested_results = await EmailNotificationsSender().send_notifications(event, OneDayBeforeEmailMessage)
+            results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage)
+
+        self.assertEqual(digested_results, [NotificationResult('email999@email.com')])
+        self.assertEqual(sorted(results), [NotificationResult('email888@email.com'),
+                                           NotificationResult('email999@email.com')])
+
+    async def test_refused_reminders_users_are_skipped(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            for id_ in (888, 999):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+            await session.execute(insert(UserReminderOptOut).values(reminder_offset=18000, user_id=888))
+
+        with patch('src.notifications.tasks.send_email'):
+            refused_results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage)
+            results = await EmailNotificationsSender().send_notifications(event, OneDayBeforeEmailMessage)
+            not_reminder_results = await EmailNotificationsSender().send_notifications(event,
+                                                                                      EventCanceledEmailMessage)
+
+        self.assertEqual(refused_results, [NotificationResult('email999@email.com')])
+        self.assertEqual(sorted(results), [NotificationResult('email888@email.com'),
+                                           NotificationResult('email999@email.com')])
+        self.assertEqual(sorted(not_reminder_results), [NotificationResult('email888@email.com'),
+                                                        NotificationResult('email999@email.com')])
+
+    async def test_sending_to_users_range(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            for id_ in (555, 666, 777):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+
+        with patch('src.notifications.tasks.send_email'):
+            results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage,
+                                                                          users_range=(600, 777))
+            last_results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage,
+                                                                               users_range=(777, None))
+
+        self.assertEqual(results, [NotificationResult('email666@email.com')])
+        self.assertEqual(last_results, [NotificationResult('email777@email.com')])
+
+    async def test_broadcasting(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            for id_ in (1111, 2222, 3333):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+
+        with patch('src.notifications.tasks.send_email', side_effect=[None, OSError()]) as mock, \
+                patch('src.notifications.tasks.schedule_retry') as retry_mock, \
+                patch('src.notifications.tasks.config.NOTIFICATIONS_BROADCAST', True), \
+                patch('src.notifications.tasks.config.BROADCAST_BATCH_SIZE', 2), \
+                patch('src.notifications.tasks.config.NOTIFICATIONS_CONCURRENCY', 1):
+            results = await EmailNotificationsSender().send_notifications(event, EventCanceledEmailMessage)
+
+        self.assertEqual(mock.call_count, 2)
+        self.assertNotIn('Имя', mock.call_args.args[0].get_payload(decode=True).decode())
+        self.assertEqual([call.args[1] for call in mock.call_args_list],
+                         [['email1111@email.com', 'email2222@email.com'], ['email3333@email.com']])
+        self.assertEqual(retry_mock.call_args.args[3:], (['email3333@email.com'], event))
+        self.assertEqual(sorted(result.email for result in results if result.error is None),
+                         ['email1111@email.com', 'email2222@email.com'])
+
+    async def test_not_broadcastable_message_is_personalized(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            await session.execute(insert(User).values({'id': 4444, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                       'patronymic': 'Отчество', 'email': 'email4444@email.com',
+                                                       'password': 'Password123'}))
+            await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                          user_id=4444))
+
+        with patch('src.notifications.tasks.send_email') as mock, \
+                patch('src.notifications.tasks.config.NOTIFICATIONS_BROADCAST', True):
+            await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage)
+
+        self.assertEqual(mock.call_args.args[0]['To'], 'email4444@email.com')
+
+    async def test_resuming_by_delivery_log(self) -> None:
+        gov_structure_uuid = uuid_pkg.uuid4()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=gov_structure_uuid,
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
+                                                              email='example@gmail.com'))
+            await session.execute(insert(Event).values(event.dict()))
+            for id_ in (5551, 5552, 5553, 5554):
+                await session.execute(insert(User).values({'id': id_, 'first_name': 'Имя', 'last_name': 'Фамилия',
+                                                           'patronymic': 'Отчество', 'email': f'email{id_}@email.com',
+                                                           'password': 'Password123'}))
+                await session.execute(insert(GovStructureSubscription).values(gov_structure_uuid=gov_structure_uuid,
+                                                                              user_id=id_))
+
+        failed_log = DeliveryLog(event.uuid, FiveHoursBeforeEmailMessage.__name__, 'task')
+        failed_log.pending_users_ids.extend([5551, 5552, 5553])
+        failed_log.mark_delivered([5551, 5553])
+        failed_log.flush()
+
+        delivery_log = DeliveryLog(event.uuid, FiveHoursBeforeEmailMessage.__name__, 'task')
+        try:
+            with patch('src.notifications.tasks.send_email'):
+                results = await EmailNotificationsSender().send_notifications(event, FiveHoursBeforeEmailMessage,
+                                                                              delivery_log=delivery_log)
+            self.assertEqual(sorted(results), [NotificationResult('email5552@email.com'),
+                                               NotificationResult('email5554@email.com')])
+            self.assertEqual(redis_engine.get(delivery_log.checkpoint_name), '5554')
+        finally:
+            redis_engine.delete(delivery_log.name, delivery_log.checkpoint_name, delivery_log.first_user_id_name)
 
 
 class TestRunEmailNotificationsSender(DBProcessedIsolatedAsyncTestCase):
@@ -58,23 +268,108 @@ class TestRunEmailNotificationsSender(DBProcessedIsolatedAsyncTestCase):
     async def asyncSetUp(self) -> None:
         await super().asyncSetUp()
         self.event_uuid = uuid_pkg.uuid4()
+        self.updated_at = datetime.datetime(year=2020, month=12, day=1)
         gov_structure_uuid = uuid_pkg.uuid4()
         async with self.Session() as session, session.begin():
             await session.execute(insert(GovStructure).values(uuid=gov_structure_uuid, name='gov structure',
                                                               email='example@gmail.com'))
             await session.execute(insert(Event).values(uuid=self.event_uuid, name='event',
                                                        gov_structure_uuid=gov_structure_uuid,
-                                                       datetime=datetime.datetime(year=2021, month=1, day=1),
-                                                       is_active=False))
+                                                       datetime=datetime.datetime(year=2100, month=1, day=1),
+                                                       is_active=False, updated_at=self.updated_at))
+
+    def test_event_payload(self) -> None:
+        sender = EmailNotificationsSender()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        with patch('src.notifications.tasks.EmailNotificationsSender.send_notifications') as mock:
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__)
+
+        sent_event, message_class = mock.call_args.args
+        self.assertEqual((sent_event.uuid, sent_event.name, sent_event.datetime), (event.uuid, 'event', event.datetime))
+        self.assertEqual(message_class, FiveHoursBeforeEmailMessage)
+
+    def test_sharding(self) -> None:
+        sender = EmailNotificationsSender()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        with patch('src.notifications.tasks.receive_subs_to_event_ids_boundaries_from_db', return_value=[1, 10]), \
+                patch('src.notifications.tasks.chord') as chord_mock, \
+                patch('src.notifications.tasks.EmailNotificationsSender.send_notifications') as mock:
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__)
+
+        self.assertFalse(mock.called)
+        chunks = chord_mock.call_args.args[0]
+        self.assertEqual([chunk.kwargs['users_range'] for chunk in chunks], [(1, 10), (10, None)])
+        self.assertEqual(chunks[0].args[0], dump_event(event))
+        self.assertTrue(chord_mock.return_value.called)
+
+    def test_sharding_once_by_task(self) -> None:
+        sender = EmailNotificationsSender()
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        delivery_log = DeliveryLog(event.uuid, FiveHoursBeforeEmailMessage.__name__, 'task')
+        sender.push_request(id='task')
+        with patch('src.notifications.tasks.receive_subs_to_event_ids_boundaries_from_db', return_value=[1, 10]), \
+                patch('src.notifications.tasks.chord') as chord_mock:
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__)
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__)
+        sender.pop_request()
+        redis_engine.delete(delivery_log.sharded_name)
 
-    def test_event_is_json(self) -> None:
+        self.assertEqual(chord_mock.call_count, 1)
+        chunks = chord_mock.call_args.args[0]
+        self.assertEqual([chunk.options['task_id'] for chunk in chunks], ['task:0', 'task:1'])
+
+    def test_sharding_again_if_chunks_arent_sent(self) -> None:
         sender = EmailNotificationsSender()
         event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=uuid_pkg.uuid4(),
-                      datetime_=datetime.datetime.now())
+                      datetime=datetime.datetime(year=2020, month=1, day=1))
+        delivery_log = DeliveryLog(event.uuid, FiveHoursBeforeEmailMessage.__name__, 'task')
+        sender.push_request(id='task')
+        with patch('src.notifications.tasks.receive_subs_to_event_ids_boundaries_from_db', return_value=[1, 10]), \
+                patch('src.notifications.tasks.chord') as chord_mock:
+            chord_mock.return_value.side_effect = ConnectionError
+            with self.assertRaises(ConnectionError):
+                sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__)
+            chord_mock.return_value.side_effect = None
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__)
+        sender.pop_request()
+        redis_engine.delete(delivery_log.sharded_name)
+
+        self.assertEqual(chord_mock.return_value.call_count, 2)
+
+    def test_fresh_reminder_payload(self) -> None:
+        sender = EmailNotificationsSender()
+        event = Event(uuid=self.event_uuid, name='event', datetime=datetime.datetime(year=2100, month=1, day=1),
+                      updated_at=self.updated_at)
+        with patch('src.notifications.tasks.EmailNotificationsSender.send_notifications') as mock:
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__, '2100-01-01T00:00:00',
+                       users_range=(1, None))
+
+        self.assertTrue(mock.called)
+
+    def test_stale_reminder_payload(self) -> None:
+        sender = EmailNotificationsSender()
+        event = Event(uuid=self.event_uuid, name='event', datetime=datetime.datetime(year=2100, month=1, day=1),
+                      updated_at=self.updated_at - datetime.timedelta(minutes=1))
         with patch('src.notifications.tasks.EmailNotificationsSender.send_notifications') as mock:
-            sender.run(event.json(), FiveHoursBeforeEmailMessage.__name__, is_json=True)
+            sender.run(dump_event(event), FiveHoursBeforeEmailMessage.__name__, '2100-01-01T00:00:00',
+                       users_range=(1, None))
 
-        self.assertEqual(sender.event, event)
+        self.assertFalse(mock.called)
+
+    async def test_event_has_started(self) -> None:
+        event = Event(uuid=uuid_pkg.uuid4(), name='event', gov_structure_uuid=uuid_pkg.uuid4(),
+                      datetime=datetime.datetime.now() - datetime.timedelta(minutes=1))
+        sender = EmailNotificationsSender()
+        with patch('src.notifications.tasks.receive_event_for_notifications_from_db', return_value=event), \
+                patch('src.notifications.tasks.receive_event_version_from_db', return_value=event.updated_at):
+            result = await sender.receive_event(str(event.uuid), event.datetime.isoformat())
+            payload_result = await sender.receive_event(dump_event(event), event.datetime.isoformat())
+
+        self.assertIsNone(result)
+        self.assertIsNone(payload_result)
 
     def test_datetimes_are_different(self) -> None:
         sender = EmailNotificationsSender()
@@ -97,3 +392,23 @@ class TestRunEmailNotificationsSender(DBProcessedIsolatedAsyncTestCase):
             sender.run(str(self.event_uuid), FiveHoursBeforeEmailMessage.__name__)
 
         self.assertFalse(mock.called)
+
+
+class TestRunNotificationsResultsCombiner(TestCase):
+
+    def test_combining(self) -> None:
+        result = NotificationsResultsCombiner().run([{'sent': 2, 'failed': 1}, {'sent': 3, 'failed': 0}],
+                                                    str(uuid_pkg.uuid4()), FiveHoursBeforeEmailMessage.__name__)
+        self.assertEqual(result, {'sent': 5, 'failed': 1})
+
+
+class TestProcessTransactionalEmailSender(IsolatedAsyncioTestCase):
+
+    async def test_sending(self) -> None:
+        message = MIMEText('payload')
+        message['To'] = 'example@gmail.com'
+        with patch('src.notifications.tasks.send_email') as mock:
+            await TransactionalEmailSender().process(message.as_string())
+
+        self.assertEqual(mock.call_args.args[0]['To'], 'example@gmail.com')
+        self.assertEqual(mock.call_args.args[0].get_payload(), 'payload')
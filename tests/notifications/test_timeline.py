@@ -0,0 +1,149 @@
+import datetime
+from unittest import TestCase
+
+from src.notifications.timeline import RedisTimeline
+from src.redis_ import redis_engine
+from tests.service import clear_timeline
+
+
+class TestRedisTimeline(TestCase):
+
+    def setUp(self) -> None:
+        self.timeline = RedisTimeline('test_timeline')
+
+    def tearDown(self) -> None:
+        clear_timeline(self.timeline)
+
+    def test_adding(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        self.timeline.add('member', datetime_)
+
+        result = self.timeline.receive_datetime('member')
+        self.assertEqual(result, datetime_)
+
+    def test_moving(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=2)
+        self.timeline.add('member', datetime.datetime(year=2020, month=1, day=1))
+        self.timeline.add('member', datetime_)
+
+        result = self.timeline.receive_datetime('member')
+        self.assertEqual(result, datetime_)
+        self.assertEqual(redis_engine.zcard(self.timeline.name), 1)
+
+    def test_adding_once(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        self.assertTrue(self.timeline.add_once('member', datetime_, 60))
+        self.assertEqual(self.timeline.pop_due(datetime_, 10), ['member'])
+
+        self.assertFalse(self.timeline.add_once('member', datetime_, 60))
+        self.assertIsNone(self.timeline.receive_datetime('member'))
+
+    def test_adding_many_once(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        self.timeline.add_once('first', datetime_, 60)
+
+        result = self.timeline.add_many_once([('first', datetime_, 60, 1), ('second', datetime_, 60, 1)])
+        self.assertEqual(result, [False, True])
+        self.assertEqual(redis_engine.zcard(self.timeline.name), 2)
+
+    def test_spreading(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1, hour=12)
+        self.timeline.add_many_once([('first', datetime_, 60, 100), ('second', datetime_, 60, 10),
+                                     ('third', datetime_, 60, 1)], tolerance=60, slot=30)
+        self.timeline.add_many_once([('fourth', datetime_, 60, 1)], tolerance=60, slot=30)
+
+        self.assertEqual(self.timeline.receive_datetime('first'), datetime_)
+        self.assertEqual(self.timeline.receive_datetime('second'), datetime_ - datetime.timedelta(seconds=30))
+        self.assertEqual(self.timeline.receive_datetime('third'), datetime_ + datetime.timedelta(seconds=30))
+        self.assertEqual(self.timeline.receive_datetime('fourth'), datetime_ - datetime.timedelta(seconds=60))
+        self.assertEqual(int(redis_engine.hget(self.timeline.load_name, int(datetime_.timestamp()))), 100)
+
+    def test_spreading_to_least_loaded_slot(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1, hour=12)
+        self.timeline.add_many_once([(str(number), datetime_, 60, 10) for number in range(5)],
+                                    tolerance=60, slot=30)
+        self.timeline.add_many_once([('light', datetime_, 60, 1), ('heavy', datetime_, 60, 1)],
+                                    tolerance=60, slot=30)
+
+        self.assertEqual(self.timeline.receive_datetime('light'), datetime_)
+        self.assertEqual(self.timeline.receive_datetime('heavy'), datetime_ - datetime.timedelta(seconds=30))
+
+    def test_load_is_forgotten(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1, hour=12)
+        self.timeline.add_many_once([('first', datetime_, 60, 1), ('second', datetime_, 60, 1)],
+                                    tolerance=30, slot=30)
+        self.timeline.remove('first')
+        self.timeline.pop_due(datetime_ + datetime.timedelta(seconds=30), 10)
+
+        self.assertEqual(redis_engine.hlen(self.timeline.load_name), 0)
+
+    def test_weight_of_removed_member_is_subtracted(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1, hour=12)
+        self.timeline.add_many_once([('first', datetime_, 60, 5), ('second', datetime_, 60, 1),
+                                     ('third', datetime_, 60, 1), ('fourth', datetime_, 60, 2)],
+                                    tolerance=30, slot=30)
+        datetime_of_fourth = self.timeline.receive_datetime('fourth')
+        assert datetime_of_fourth is not None
+        score = int(datetime_of_fourth.timestamp())
+        self.assertEqual(int(redis_engine.hget(self.timeline.load_name, score)), 3)
+
+        self.timeline.remove('fourth')
+
+        self.assertEqual(int(redis_engine.hget(self.timeline.load_name, score)), 1)
+        self.assertFalse(redis_engine.hexists(self.timeline.weights_name, 'fourth'))
+
+    def test_adding_once_after_removing(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1)
+        self.timeline.add_once('member', datetime_, 60)
+        self.timeline.remove('member')
+
+        self.assertTrue(self.timeline.add_once('member', datetime_, 60))
+        self.assertEqual(self.timeline.receive_datetime('member'), datetime_)
+
+    def test_removing(self) -> None:
+        self.timeline.add('member', datetime.datetime(year=2020, month=1, day=1))
+        self.timeline.remove('member')
+
+        result = self.timeline.receive_datetime('member')
+        self.assertIsNone(result)
+
+    def test_popping_due(self) -> None:
+        self.timeline.add('second', datetime.datetime(year=2020, month=1, day=2))
+        self.timeline.add('first', datetime.datetime(year=2020, month=1, day=1))
+        self.timeline.add('third', datetime.datetime(year=2020, month=1, day=3))
+
+        expected_result = ['first', 'second']
+        result = self.timeline.pop_due(datetime.datetime(year=2020, month=1, day=2), 10)
+        self.assertEqual(result, expected_result)
+
+        result = self.timeline.pop_due(datetime.datetime(year=2020, month=1, day=2), 10)
+        self.assertEqual(result, [])
+        self.assertIsNotNone(self.timeline.receive_datetime('third'))
+
+    def test_popping_due_with_count(self) -> None:
+        self.timeline.add('first', datetime.datetime(year=2020, month=1, day=1))
+        self.timeline.add('second', datetime.datetime(year=2020, month=1, day=2))
+
+        result = self.timeline.pop_due(datetime.datetime(year=2020, month=1, day=2), 1)
+        self.assertEqual(result, ['first'])
+
+    def test_popping_due_with_datetimes(self) -> None:
+        datetime_ = datetime.datetime(year=2020, month=1, day=1, hour=5)
+        self.timeline.add('first', datetime_)
+
+        result = self.timeline.pop_due_with_datetimes(datetime.datetime(year=2020, month=1, day=2), 10)
+        self.assertEqual(result, [('first', datetime_)])
+
+    def test_popping_due_with_values(self) -> None:
+        self.timeline.add('first', datetime.datetime(year=2020, month=1, day=1))
+        self.timeline.add('second', datetime.datetime(year=2020, month=1, day=1, hour=1))
+        self.timeline.add('third', datetime.datetime(year=2020, month=1, day=3))
+        redis_engine.set('test_value:first', 'value')
+        redis_engine.set('test_value:third', 'value')
+
+        result = self.timeline.pop_due_with_values(datetime.datetime(year=2020, month=1, day=2), 10, 'test_value:')
+        redis_engine.delete('test_value:third')
+
+        self.assertEqual(result, [('first', 'value'), ('second', None)])
+        self.assertIsNone(redis_engine.get('test_value:first'))
+        self.assertIsNone(self.timeline.receive_datetime('first'))
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from typing import AsyncIterator
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from src.notifications.utils import fan_out, EventLoopThread, batch
+
+
+async def generate_numbers(count: int) -> AsyncIterator[int]:
+    for number in range(count):
+        yield number
+
+
+class TestFanOut(IsolatedAsyncioTestCase):
+
+    async def test_processing(self) -> None:
+        async def double(number: int) -> int:
+            return number * 2
+
+        expected_result = [number * 2 for number in range(100)]
+        result = await fan_out(generate_numbers(100), double, 10)
+        self.assertEqual(sorted(result), expected_result)
+
+    async def test_concurrency_is_limited(self) -> None:
+        running = 0
+        max_running = 0
+
+        async def handle(number: int) -> None:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0)
+            running -= 1
+
+        await fan_out(generate_numbers(100), handle, 5)
+        self.assertEqual(max_running, 5)
+
+    async def test_handler_error(self) -> None:
+        async def handle(number: int) -> None:
+            if number == 50:
+                raise ValueError
+
+        with self.assertRaises(ValueError):
+            await fan_out(generate_numbers(100), handle, 5)
+
+
+class TestBatch(IsolatedAsyncioTestCase):
+
+    async def test_batching(self) -> None:
+        expected_result = [[0, 1, 2], [3, 4, 5], [6]]
+        result = [items_batch async for items_batch in batch(generate_numbers(7), 3)]
+        self.assertEqual(result, expected_result)
+
+
+class TestEventLoopThread(TestCase):
+
+    def test_running_in_started_loop(self) -> None:
+        async def receive_thread_name() -> str:
+            return threading.current_thread().name
+
+        event_loop_thread = EventLoopThread()
+        event_loop_thread.start()
+        try:
+            result = event_loop_thread.run(receive_thread_name())
+        finally:
+            event_loop_thread.stop()
+
+        self.assertEqual(result, 'notifications-event-loop')
+        self.assertIsNone(event_loop_thread.loop)
+
+    def test_running_after_fork(self) -> None:
+        async def receive_loop() -> asyncio.AbstractEventLoop:
+            return asyncio.get_running_loop()
+
+        event_loop_thread = EventLoopThread()
+        event_loop_thread.start()
+        parent_loop = event_loop_thread.loop
+        try:
+            with patch('src.notifications.utils.os.getpid', return_value=-1):
+                result = event_loop_thread.run(receive_loop())
+                self.assertEqual(event_loop_thread.run(receive_loop()), result)
+        finally:
+            event_loop_thread.stop()
+            parent_loop.call_soon_threadsafe(parent_loop.stop)  # type: ignore
+
+        self.assertIsNot(result, parent_loop)
+
+    def test_running_without_started_loop(self) -> None:
+        async def receive_thread_name() -> str:
+            return threading.current_thread().name
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            result = EventLoopThread().run(receive_thread_name())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertEqual(result, threading.current_thread().name)
@@ -12,6 +12,7 @@ import src.auth.models
 import src.config
 import src.events.models
 import src.gov_structures.models
+import src.notifications.config
 import src.users.models
 from tests import config
 from tests.config import TEST_USERS_BLACKLIST_NAME, TEST_DATABASE_URL
@@ -21,8 +22,19 @@ alembicArgs = ['upgrade', 'head']
 
 def set_up() -> None:
     src.config.USERS_BLACKLIST_NAME = TEST_USERS_BLACKLIST_NAME
+    src.config.SMTP_RATE_LIMIT_NAME = config.TEST_SMTP_RATE_LIMIT_NAME
     src.config.DATABASE_URL = TEST_DATABASE_URL
 
+    # the names are replaced before the tests are imported, so the timelines of the tests are built with them
+    src.notifications.config.REMINDERS_TIMELINE_NAME = config.TEST_REMINDERS_TIMELINE_NAME
+    src.notifications.config.REMINDERS_RECONCILED_AT_NAME = config.TEST_REMINDERS_RECONCILED_AT_NAME
+    src.notifications.config.CHANGES_TIMELINE_NAME = config.TEST_CHANGES_TIMELINE_NAME
+    src.notifications.config.RETRIES_TIMELINE_NAME = config.TEST_RETRIES_TIMELINE_NAME
+    src.notifications.config.RETRIES_DEAD_LETTERS_NAME = config.TEST_RETRIES_DEAD_LETTERS_NAME
+    src.notifications.config.SCHEDULER_LEASE_NAME = config.TEST_SCHEDULER_LEASE_NAME
+    src.notifications.config.SCHEDULER_LAST_RUNS_NAME = config.TEST_SCHEDULER_LAST_RUNS_NAME
+    src.notifications.config.DELIVERY_LOG_NAME = config.TEST_DELIVERY_LOG_NAME
+
     alembic.config.main(argv=alembicArgs)
 
 
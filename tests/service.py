@@ -5,9 +5,18 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from src import database
+from src.notifications.timeline import RedisTimeline
+from src.redis_ import redis_engine
 from tests.config import TEST_DATABASE_URL
 
 
+def clear_timeline(timeline: RedisTimeline) -> None:
+    """The function that deletes the timeline, its ledger, the load of its slots and the weights from redis"""
+
+    redis_engine.delete(timeline.name, timeline.load_name, timeline.weights_name,
+                        *redis_engine.keys(timeline.create_ledger_key('*')))
+
+
 class DBProcessedIsolatedAsyncTestCase(unittest.IsolatedAsyncioTestCase):
     tables = ('user', 'refreshtoken', 'event', 'govstructure')
     test_endpoint = False
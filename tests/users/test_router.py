@@ -8,7 +8,7 @@ from sqlalchemy import insert, select
 from src.main import app
 from src.redis_ import redis_engine
 from src.users import config
-from src.users.models import User
+from src.users.models import User, UserReminderOptOut
 from tests.service import DBProcessedIsolatedAsyncTestCase
 
 
@@ -22,7 +22,7 @@ class TestCreateUser(DBProcessedIsolatedAsyncTestCase):
         cls.basic_request_data = cls.basic | {'password': 'Password123'}
 
     async def test_user_is_not_gov_worker(self) -> None:
-        with patch('src.users.router.BackgroundTasks.add_task') as mock, TestClient(app=app) as client:
+        with patch('src.users.router.TransactionalEmailSender.apply_async') as mock, TestClient(app=app) as client:
             response = client.post('/users/', json=self.basic_request_data)
 
         self.assertTrue(mock.called)
@@ -33,7 +33,7 @@ class TestCreateUser(DBProcessedIsolatedAsyncTestCase):
         self.assertIsNone(user)
 
     async def test_incorrect_government_key(self) -> None:
-        with patch('src.users.router.BackgroundTasks.add_task') as mock, TestClient(app=app) as client:
+        with patch('src.users.router.TransactionalEmailSender.apply_async') as mock, TestClient(app=app) as client:
             response = client.post('/users/', json=self.basic_request_data | {'government_key': '321'})
 
         self.assertTrue(mock.called)
@@ -44,7 +44,7 @@ class TestCreateUser(DBProcessedIsolatedAsyncTestCase):
         self.assertIsNone(user)
 
     async def test_correct_government_key(self) -> None:
-        with patch('src.users.router.BackgroundTasks.add_task') as mock, TestClient(app=app) as client:
+        with patch('src.users.router.TransactionalEmailSender.apply_async') as mock, TestClient(app=app) as client:
             response = client.post('/users/', json=self.basic_request_data | {'government_key': config.GOVERNMENT_KEY})
 
         self.assertTrue(mock.called)
@@ -83,7 +83,8 @@ class TestReceiveUser(DBProcessedIsolatedAsyncTestCase):
             response = client.get('/users/self/', headers={'Authorization': f'Bearer {token}'})
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), self.basic | {'is_government_worker': False})
+        self.assertEqual(response.json(), self.basic | {'is_government_worker': False,
+                                                        'notifications_digest': False})
 
 
 class TestUpdateUser(DBProcessedIsolatedAsyncTestCase):
@@ -102,7 +103,8 @@ class TestUpdateUser(DBProcessedIsolatedAsyncTestCase):
                                     headers={'Authorization': f'Bearer {token}'})
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), self.basic | {'is_government_worker': False, 'first_name': 'Изменненоеимя'})
+        self.assertEqual(response.json(), self.basic | {'is_government_worker': False, 'notifications_digest': False,
+                                                        'first_name': 'Изменненоеимя'})
 
         expected_result = 'Изменненоеимя'
         async with self.Session() as session:
@@ -114,6 +116,72 @@ class TestUpdateUser(DBProcessedIsolatedAsyncTestCase):
         self.assertIsNotNone(user)
 
 
+class TestReceiveRemindersPreferences(DBProcessedIsolatedAsyncTestCase):
+    test_endpoint = True
+
+    basic = {'first_name': 'Имя', 'last_name': 'Фамилия',
+             'patronymic': 'Отчество', 'email': 'email@email.com'}
+
+    async def test_receiving(self) -> None:
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(User).values(self.basic | {'id': 9500, 'password': 'Password123'}))
+            await session.execute(insert(UserReminderOptOut).values(reminder_offset=86400, user_id=9500))
+        token = AuthJWT().create_access_token(subject=9500, user_claims={'is_government_worker': False})
+
+        with TestClient(app=app) as client:
+            response = client.get('/users/self/reminders/', headers={'Authorization': f'Bearer {token}'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'offset': 604800.0, 'is_enabled': True},
+                                           {'offset': 86400.0, 'is_enabled': False},
+                                           {'offset': 18000.0, 'is_enabled': True}])
+
+
+class TestUpdateRemindersPreferences(DBProcessedIsolatedAsyncTestCase):
+    test_endpoint = True
+
+    basic = {'first_name': 'Имя', 'last_name': 'Фамилия',
+             'patronymic': 'Отчество', 'email': 'email@email.com'}
+
+    async def test_successful_changing(self) -> None:
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(User).values(self.basic | {'id': 9600, 'password': 'Password123'}))
+            await session.execute(insert(UserReminderOptOut).values(reminder_offset=86400, user_id=9600))
+        token = AuthJWT().create_access_token(subject=9600, user_claims={'is_government_worker': False})
+
+        with TestClient(app=app) as client:
+            response = client.patch('/users/self/reminders/',
+                                    json=[{'offset': 86400, 'is_enabled': True},
+                                          {'offset': 'PT5H', 'is_enabled': False}],
+                                    headers={'Authorization': f'Bearer {token}'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'offset': 604800.0, 'is_enabled': True},
+                                           {'offset': 86400.0, 'is_enabled': True},
+                                           {'offset': 18000.0, 'is_enabled': False}])
+
+        async with self.Session() as session:
+            result = (await session.scalars(select(UserReminderOptOut.reminder_offset)
+                                            .where(UserReminderOptOut.user_id == 9600))).all()
+        self.assertEqual(result, [18000])
+
+    async def test_reminder_doesnt_exist(self) -> None:
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(User).values(self.basic | {'id': 9700, 'password': 'Password123'}))
+        token = AuthJWT().create_access_token(subject=9700, user_claims={'is_government_worker': False})
+
+        with TestClient(app=app) as client:
+            response = client.patch('/users/self/reminders/', json=[{'offset': 60, 'is_enabled': False}],
+                                    headers={'Authorization': f'Bearer {token}'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['detail'][0]['loc'], ['body', 0, 'offset'])
+
+        async with self.Session() as session:
+            result = (await session.scalars(select(UserReminderOptOut))).all()
+        self.assertEqual(result, [])
+
+
 class TestDeleteUser(DBProcessedIsolatedAsyncTestCase):
     test_endpoint = True
 
@@ -151,7 +219,7 @@ class TestConfirmEmail(DBProcessedIsolatedAsyncTestCase):
 
         expected_result = {'first_name': 'Имя', 'last_name': 'Фамилия',
                            'patronymic': 'Отчество', 'email': 'example@example1.com',
-                           'is_government_worker': False}
+                           'is_government_worker': False, 'notifications_digest': False}
 
         self.assertEqual(response.json(), expected_result)
 
@@ -197,7 +265,7 @@ class TestSendRecoveryUUID(DBProcessedIsolatedAsyncTestCase):
                                                        'patronymic': 'Отчество', 'email': 'example@gmail.com',
                                                        'password': 'password', 'is_government_worker': False}))
 
-        with patch('src.users.router.BackgroundTasks.add_task') as mock, TestClient(app=app) as client:
+        with patch('src.users.router.TransactionalEmailSender.apply_async') as mock, TestClient(app=app) as client:
             response = client.post('/users/password-recovery/', json={'email': 'example@gmail.com'})
 
         self.assertTrue(mock.called)
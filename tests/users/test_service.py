@@ -1,8 +1,13 @@
 from unittest import TestCase
 
+from sqlalchemy import insert
+
 from src.redis_ import redis_engine
-from src.users.service import add_user_to_blacklist
+from src.users.models import User, UserReminderOptOut
+from src.users.service import add_user_to_blacklist, receive_user_reminders_opt_outs_from_db, \
+    update_user_reminders_opt_outs_in_db
 from tests import config
+from tests.service import DBProcessedIsolatedAsyncTestCase
 
 
 class TestAddUserToBlacklist(TestCase):
@@ -16,3 +21,20 @@ class TestAddUserToBlacklist(TestCase):
         expected_result = True
         result = redis_engine.sismember(config.TEST_USERS_BLACKLIST_NAME, 10)
         self.assertEqual(result, expected_result)
+
+
+class TestUpdateUserRemindersOptOutsInDB(DBProcessedIsolatedAsyncTestCase):
+
+    async def test_updating(self) -> None:
+        async with self.Session() as session, session.begin():
+            await session.execute(insert(User).values(id=9800, first_name='Имя', last_name='Фамилия',
+                                                      patronymic='Отчество', email='email@email.com',
+                                                      password='Password123'))
+            await session.execute(insert(UserReminderOptOut), [{'reminder_offset': 86400, 'user_id': 9800},
+                                                               {'reminder_offset': 18000, 'user_id': 9800}])
+
+        await update_user_reminders_opt_outs_in_db(9800, refused_offsets=[18000, 604800], accepted_offsets=[86400])
+
+        expected_result = {18000, 604800}
+        result = await receive_user_reminders_opt_outs_from_db(9800)
+        self.assertEqual(result, expected_result)